@@ -1,20 +1,53 @@
 import streamlit as st
 import os
+import time
 from dotenv import load_dotenv
-import subprocess
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from utils.supabase_client import get_supabase_client
-from utils.email_sender import send_email, EmailConfigError
+from utils.repository import BACKEND_SUPABASE, get_repository
+from utils.email_outbox import (
+    STATUS_FAILED, STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_UNCERTAIN,
+    enqueue_messages, letters_campaign, outbox_status, retry_failed,
+)
+from utils.email_worker import get_email_worker, start_email_worker
+from utils.draw_service import run_draw
+from utils.derangement import MODE_UNIFORM, MODE_CYCLE
+from utils.seeded_draw import MODE_SEEDED
+from utils.config_loader import get_draw_settings, get_current_year
+from utils.letter_data import fetch_letter_data
+from utils.recipient_plan import plan_recipients
+from utils.rendered_letters import load_stored_letters
+from utils.stats_service import get_stats, invalidate_stats
+from utils.query_cache import cache_stats
 
 # Load environment variables
 load_dotenv()
 
+# Seconds between refreshes of the email progress while the worker runs
+EMAIL_PROGRESS_REFRESH_SECONDS = 2
+
+# Shown instead of the draw and email actions on the SQLite backend
+SUPABASE_ONLY_MESSAGE = "El sorteo y el envío de cartas solo están disponibles con Supabase."
+
+# Stages measured while sending the letters
+STAGE_LABELS = {
+    'mime': "construcción MIME",
+    'transmit': "envío SMTP",
+}
+
+DRAW_MODE_LABELS = {
+    MODE_UNIFORM: "Aleatorio uniforme",
+    MODE_CYCLE: "Una sola cadena de regalos",
+    MODE_SEEDED: "Cadena con semilla (reproducible)",
+}
+
 
 class AdminPage:
     def __init__(self):
-        # Get Supabase client
-        self.supabase = get_supabase_client()
+        # Data access (Supabase, or SQLite with DATA_BACKEND=sqlite)
+        self.repo = get_repository()
+        self._supabase = None
 
         # CSS para estilos personalizados
         st.markdown("""
@@ -42,207 +75,266 @@ class AdminPage:
         </style>
         """, unsafe_allow_html=True)
 
+    @property
+    def runs_on_supabase(self) -> bool:
+        return self.repo.backend == BACKEND_SUPABASE
+
+    @property
+    def supabase(self):
+        """Supabase client for the draw and the letter emails, which only run on Supabase."""
+        if self._supabase is None:
+            self._supabase = get_supabase_client()
+        return self._supabase
+
     def get_stats(self):
-        """Get statistics about users and assignments."""
+        """Get statistics about users and assignments (cached a few seconds, see utils/stats_service.py)."""
         try:
-            # Count total users
-            users_response = self.supabase.table('users').select('*', count='exact').execute()
-            total_users = users_response.count if users_response.count is not None else len(users_response.data)
-            
-            # Count assigned friends
-            friends_response = self.supabase.table('secret_friends').select('*', count='exact').execute()
-            total_assignments = friends_response.count if friends_response.count is not None else len(friends_response.data)
-            
-            # Check if wishes are locked
-            # We check the first user as the lock status is global (applied to all users)
-            lock_response = self.supabase.table('users').select('wishes_locked').limit(1).execute()
-            wishes_locked = False
-            if lock_response.data and len(lock_response.data) > 0:
-                wishes_locked = lock_response.data[0]['wishes_locked']
-            
-            return {
-                'total_users': total_users,
-                'total_assignments': total_assignments,
-                'wishes_locked': wishes_locked
-            }
+            return get_stats(self.repo)
         except Exception as e:
             st.error(f"Error fetching stats: {e}")
             return None
 
-    def assign_friends(self):
-        """Run the assign_friends.py script."""
-        # Note: assign_friends.py might need to be updated to use Supabase API as well
-        # For now, we'll assume it's updated or we should update it.
-        # Given the user request, we should probably update it too, but let's stick to the pages first.
-        try:
-            result = subprocess.run(
-                ['python3', 'utils/assign_friends.py'],
-                capture_output=True,
-                text=True,
-                cwd=os.path.dirname(os.path.dirname(__file__))
-            )
-            if result.returncode == 0:
-                st.success("✅ Amigos secretos asignados exitosamente!")
-                return True
-            else:
-                st.error(f"❌ Error al asignar amigos: {result.stderr}")
-                return False
-        except Exception as e:
-            st.error(f"❌ Error ejecutando script: {e}")
-            return False
+    def assign_friends(self, mode: str = MODE_UNIFORM, incremental: bool = False, by_group: bool = False):
+        """Run the draw in-process on the shared Supabase client."""
+        progress_bar = st.progress(0.0, text="Preparando sorteo...")
+
+        def on_progress(fraction: float, message: str):
+            progress_bar.progress(min(max(fraction, 0.0), 1.0), text=message)
+
+        result = run_draw(self.supabase, mode=mode, incremental=incremental,
+                          progress=on_progress, by_group=by_group)
+        invalidate_stats()
+        return result
+
+    def render_draw_result(self, result: dict):
+        """Show the outcome of the last draw (kept across reruns)."""
+        for warning in result['warnings']:
+            st.warning(warning)
+        if not result['ok']:
+            st.error(f"❌ Error al asignar amigos: {result['error']}")
+            return
+
+        summary = f"✅ Amigos secretos asignados exitosamente! {result['rows_written']} asignaciones guardadas"
+        if result['rows_deleted']:
+            summary += f", {result['rows_deleted']} eliminadas"
+        st.success(f"{summary} en {result['timings']['total']:.2f} s.")
+
+        with st.expander("⏱️ Detalles del último sorteo"):
+            st.json({
+                'participantes': result['users'],
+                'grupos': result['groups'],
+                'asignaciones_guardadas': result['rows_written'],
+                'asignaciones_eliminadas': result['rows_deleted'],
+                'filas_por_segundo': result['rows_per_sec'],
+                'semilla': result['seed'],
+                'verificacion': result['verification'],
+                'cartas_generadas': result['letters_rendered'],
+                'tiempos_s': result['timings'],
+            })
 
     def toggle_wishes_lock(self, lock: bool):
-        """Lock or unlock wishes editing for all users."""
+        """Lock or unlock wishes editing for all users (one settings row, see utils/event_settings.py)."""
         try:
-            # Update all users
-            # Supabase update without where clause is blocked by default for safety
-            # But we can use a condition that is always true or iterate
-            # Or better, we can use a specific RPC function if we had one.
-            # For now, let's try to update where id > 0 which should cover all users
-            response = self.supabase.table('users').update({'wishes_locked': lock}).gt('id', 0).execute()
-            
-            if response.data:
-                status = "bloqueados" if lock else "desbloqueados"
-                st.success(f"✅ Deseos {status} exitosamente!")
-                return True
-            return False
+            self.repo.set_wishes_locked(lock)
+            invalidate_stats()
+            status = "bloqueados" if lock else "desbloqueados"
+            st.success(f"✅ Deseos {status} exitosamente!")
+            return True
         except Exception as e:
             st.error(f"Error updating wishes lock: {e}")
             return False
 
-    def build_letter_html(self, santa_name: str, friend: dict) -> str:
-        """Build the HTML body for the secret friend wishes letter."""
-        # Helper to format each wish block
-        def format_wish(wish: str, link: str | None, idx: int) -> str:
-            if not wish:
-                return ""
-            html = f"<div style='margin-left:20px;margin-bottom:15px;'>"
-            html += f"Para ver la magia del deseo #{idx}:<br>"
-            html += f"<span style='color:#c0392b;font-weight:bold;'>{wish}</span>"
-            if link:
-                html += f" <a href='{link}' target='_blank' style='color:#d35400;text-decoration:none;'>(Ver referencia 🔗)</a>"
-            html += "</div>"
-            return html
-
-        wishes_html = ""
-        wishes_html += "<p><strong>Como primera opción (mi favorito 😍):</strong></p>"
-        wishes_html += format_wish(friend.get("friend_deseo1", ""), friend.get("friend_link_deseo1"), 1)
-
-        wishes_html += "<p><strong>También me encantaría:</strong></p>"
-        wishes_html += format_wish(friend.get("friend_deseo2", ""), friend.get("friend_link_deseo2"), 2)
-
-        if friend.get("friend_deseo3") and friend.get("friend_deseo3") != "SIN DESEO":
-            wishes_html += "<p><strong>Y si te sientes muy generoso 😇:</strong></p>"
-            wishes_html += format_wish(friend.get("friend_deseo3", ""), friend.get("friend_link_deseo3"), 3)
-
-        comentarios = ""
-        if friend.get("friend_comentarios_generales"):
-            comentarios = (
-                "<p><strong>P.D. (Notas importantes 📝):</strong><br>"
-                f"{friend['friend_comentarios_generales']}</p>"
-            )
-
-        html = f"""
-        <div style="background-color:#f8f9fa;color:#2c3e50;padding:40px;border-radius:10px;
-                    font-family:'Courier New',Courier,monospace;line-height:1.6;
-                    box-shadow:0 4px 8px rgba(0,0,0,0.1);border:2px solid #e0e0e0;">
-            <div style="font-size:1.5em;font-weight:bold;margin-bottom:20px;">
-                Querido Santa (osea tú, {santa_name}) 🎅,
-            </div>
-            <div style="font-size:1.2em;">
-                <p>Este año me he portado EXTRAORDINARIAMENTE bien (créeme 😉).
-                Para esta Navidad, me haría la persona más feliz del mundo recibir
-                alguno de estos regalitos:</p>
-                {wishes_html}
-                {comentarios}
-                <div style="margin-top:40px;text-align:right;font-size:1.3em;font-style:italic;">
-                    Con cariño y esperanza,<br>
-                    {friend.get('friend_character_name', '')} 🎄
-                </div>
-            </div>
-        </div>
-        """
-        return html
-
-    def send_wishes_emails(self):
-        """Send secret friend wishes by email to all users with assignments.
+    def send_wishes_emails(self, resend: bool = False):
+        """Queue the letter emails and start the background sender.
 
         For each record in secret_friends, the user (Santa) receives an email
-        with the wishes of their assigned friend.
+        with the wishes of their assigned friend. The letters are queued in
+        the email outbox (utils/email_outbox.py), which only sends the ones
+        not delivered yet, and a background worker (utils/email_worker.py)
+        sends them, so the page stays responsive during the campaign.
+
+        The letters rendered after the draw (utils/rendered_letters.py) are
+        reused; they are built from the assignments when some are missing or
+        do not match the current draw.
+        Letters for the same address are merged into one email and emails
+        are grouped by domain first (utils/recipient_plan.py).
+
+        :param resend: Also send again letters that changed after being delivered
+        :return: Tuple (data, queue) with the letter data and enqueue counts
+                 (plus 'render_seconds', 'merged' and 'domains')
         """
         try:
-            assignments_resp = self.supabase.table('secret_friends').select('user_id, id_secret_friend').execute()
+            data = load_stored_letters(self.supabase)
+        except Exception:
+            # rendered_letters not migrated yet (utils/rendered_letters.sql)
+            data = None
+        try:
+            # Letters missing or from another draw: build them all from the assignments
+            if not data or not data['letters'] or data['outdated']:
+                data = fetch_letter_data(self.supabase)
         except Exception as e:
             st.error(f"Error obteniendo asignaciones: {e}")
-            return 0, 0
+            return None, None
 
-        assignments = assignments_resp.data or []
-        if not assignments:
+        letters = data['letters']
+        if not letters:
             st.info("No hay asignaciones de Amigo Secreto para enviar.")
-            return 0, 0
-
-        sent_ok = 0
-        sent_error = 0
-
-        for row in assignments:
-            user_id = row.get('user_id')
-            friend_id = row.get('id_secret_friend')
-            if user_id is None or friend_id is None:
-                continue
-
-            try:
-                # Get Santa (recipient) info
-                santa_resp = self.supabase.table('users').select('email, character_name').eq('id', user_id).execute()
-                if not santa_resp.data:
-                    continue
-                santa = santa_resp.data[0]
-                to_email = santa.get('email')
-                santa_name = santa.get('character_name') or santa.get('nombre', '')
-                if not to_email:
-                    continue
-
-                # Get friend (wishes owner) info
-                friend_resp = self.supabase.table('users').select(
-                    'character_name, deseo1, link_deseo1, '
-                    'deseo2, link_deseo2, deseo3, link_deseo3, comentarios_generales'
-                ).eq('id', friend_id).execute()
-
-                if not friend_resp.data:
-                    continue
-
-                friend_row = friend_resp.data[0]
-                friend_info = {
-                    'friend_character_name': friend_row.get('character_name', ''),
-                    'friend_deseo1': friend_row.get('deseo1', ''),
-                    'friend_link_deseo1': friend_row.get('link_deseo1', ''),
-                    'friend_deseo2': friend_row.get('deseo2', ''),
-                    'friend_link_deseo2': friend_row.get('link_deseo2', ''),
-                    'friend_deseo3': friend_row.get('deseo3', ''),
-                    'friend_link_deseo3': friend_row.get('link_deseo3', ''),
-                    'friend_comentarios_generales': friend_row.get('comentarios_generales', ''),
+            return data, None
+
+        campaign = letters_campaign(get_current_year())
+        try:
+            start = time.perf_counter()
+            plan = plan_recipients(letters)
+            render_seconds = time.perf_counter() - start
+            queue = enqueue_messages(self.supabase, campaign, plan['messages'], resend=resend)
+            queue['render_seconds'] = render_seconds
+            queue['merged'] = plan['merged']
+            queue['domains'] = len(plan['domains'])
+        except Exception as e:
+            st.error(f"Error preparando la cola de correos: {e}")
+            return data, None
+
+        start_email_worker(self.supabase, campaign)
+        return data, queue
+
+    def render_email_progress(self):
+        """Show the progress of the email worker, polling while it runs."""
+        worker = get_email_worker(letters_campaign(get_current_year()))
+        if worker is None:
+            return
+        if worker.running:
+            st.fragment(run_every=EMAIL_PROGRESS_REFRESH_SECONDS)(self._render_worker_status)(worker)
+        else:
+            self._render_worker_status(worker)
+
+    def _render_worker_status(self, worker):
+        status = worker.status()
+        if not status['running'] and st.session_state.get('email_worker_running'):
+            # The campaign just finished: refresh the whole page once
+            st.session_state.email_worker_running = False
+            st.rerun()
+        st.session_state.email_worker_running = status['running']
+
+        done = status['sent'] + status['failed']
+        total = done + status['queued']
+        if status['running']:
+            st.progress(done / total if total else 0.0, text=f"Enviando cartas... {done}/{total}")
+            if st.button("⏹️ Detener envío", use_container_width=True):
+                worker.stop()
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Enviados", status['sent'])
+        col2.metric("Fallidos", status['failed'])
+        col3.metric("En cola", status['queued'])
+
+        eta = status['eta_seconds']
+        st.caption(
+            f"{status['messages_per_sec']:.1f} correos/s en {status['seconds']:.0f} s"
+            + (f", tiempo restante estimado: {eta / 60:.1f} min." if status['running'] and eta is not None else ".")
+        )
+        timings = status['timings']
+        if timings:
+            st.caption("Tiempo medio por correo: " + ", ".join(
+                f"{STAGE_LABELS.get(stage, stage)} {t['avg_ms']:.1f} ms" for stage, t in timings.items()
+            ))
+        if status['error']:
+            st.error(f"El envío se ha detenido por un error: {status['error']}")
+        elif status['aborted']:
+            st.error("Error de autenticación SMTP: se ha detenido el envío. Los correos pendientes siguen en la cola.")
+        elif not status['running'] and status['retrying']:
+            st.info(f"{status['retrying']} correos se reintentarán más tarde.")
+
+    def render_outbox_status(self):
+        """Show the email outbox counters and the retry action."""
+        campaign = letters_campaign(get_current_year())
+        try:
+            status = outbox_status(self.supabase, campaign)
+        except Exception as e:
+            st.warning(f"No se pudo leer la cola de correos: {e}")
+            return
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Enviados", status[STATUS_SENT])
+        col2.metric("En cola", status[STATUS_PENDING] + status[STATUS_SENDING])
+        col3.metric("Fallidos", status[STATUS_FAILED])
+        col4.metric("Sin confirmar", status[STATUS_UNCERTAIN])
+
+        if status[STATUS_UNCERTAIN]:
+            st.caption(
+                "Los correos sin confirmar quedaron a medias tras una interrupción y puede que "
+                "ya se hayan entregado; solo se reenvían si lo pides expresamente."
+            )
+        if status[STATUS_FAILED] or status[STATUS_UNCERTAIN]:
+            include_uncertain = st.checkbox("Reintentar también los correos sin confirmar", value=False)
+            if st.button("🔁 Reintentar fallidos", use_container_width=True):
+                requeued = retry_failed(self.supabase, campaign, include_uncertain=include_uncertain)
+                st.success(f"{requeued} correos vuelven a la cola. Pulsa 'Enviar todas las cartas' para enviarlos.")
+
+    def render_cache_stats(self):
+        """Hit/miss metrics of the shared query cache (utils/query_cache.py)."""
+        stats = cache_stats()
+        if not stats:
+            return
+        with st.expander("🗄️ Caché de consultas"):
+            st.dataframe([
+                {
+                    'consulta': namespace,
+                    'aciertos': counters.get('hits', 0),
+                    'fallos': counters.get('misses', 0),
+                    'compartidas': counters.get('coalesced', 0),
+                    'tasa de aciertos': f"{counters['hit_rate']:.0%}" if counters['hit_rate'] is not None else "-",
+                    'entradas': counters['size'],
+                    'expiradas': counters.get('expired', 0),
+                    'desalojadas': counters.get('evictions', 0),
+                    'invalidadas': counters.get('invalidations', 0),
                 }
+                for namespace, counters in sorted(stats.items())
+            ], use_container_width=True, hide_index=True)
+
+    def render_draw_actions(self):
+        """Draw mode, full draw and incremental draw buttons and the last result."""
+        mode = st.selectbox(
+            "Modo de sorteo",
+            list(DRAW_MODE_LABELS),
+            format_func=DRAW_MODE_LABELS.get,
+        )
+        by_group = st.checkbox("Sortear cada grupo por separado", value=get_draw_settings()['by_group'])
+        if st.button("🎲 Ejecutar Sorteo", use_container_width=True, type="primary"):
+            st.session_state.last_draw_result = self.assign_friends(mode=mode, by_group=by_group)
+            st.rerun()
 
-                html_body = self.build_letter_html(santa_name, friend_info)
-                subject = f"🎅 Carta de tu Amigo Secreto - {friend_info['friend_character_name']}"
+        st.write("Añade a los inscritos tarde (y quita a los retirados) sin cambiar el amigo de los demás.")
+        if st.button("➕ Sorteo Incremental", use_container_width=True):
+            st.session_state.last_draw_result = self.assign_friends(incremental=True, by_group=by_group)
+            st.rerun()
 
-                # Simple text version
-                text_body = (
-                    f"Hola {santa_name},\n\n"
-                    f"Tu Amigo Secreto es: {friend_info['friend_character_name']}.\n"
-                    "Revisa la versión HTML de este correo para ver la carta completa y los detalles de los deseos.\n\n"
-                    "¡Felices fiestas!"
+        if st.session_state.get('last_draw_result'):
+            self.render_draw_result(st.session_state.last_draw_result)
+
+    def render_email_actions(self):
+        """Send button, worker progress and outbox counters of the letter emails."""
+        worker = get_email_worker(letters_campaign(get_current_year()))
+        sending = worker is not None and worker.running
+        resend = st.checkbox("Reenviar también las cartas ya enviadas que han cambiado", disabled=sending)
+        if st.button("📧 Enviar todas las cartas", use_container_width=True, disabled=sending):
+            with st.spinner("Preparando las cartas..."):
+                datos, cola = self.send_wishes_emails(resend=resend)
+            if datos:
+                st.caption(
+                    f"Datos cargados con {datos['queries']} consultas en {datos['seconds']:.2f} s"
+                    + (f" ({datos['skipped']} asignaciones sin correo o usuario)." if datos['skipped'] else ".")
+                )
+            if cola:
+                st.caption(
+                    f"Cartas generadas en {cola['render_seconds']:.2f} s. "
+                    f"Cola: {cola['queued']} nuevas, {cola['requeued']} actualizadas, "
+                    f"{cola['unchanged']} sin cambios, {cola['held']} cambiadas pero ya enviadas o en envío. "
+                    f"{cola['merged']} cartas agrupadas en correos compartidos, {cola['domains']} dominios."
                 )
 
-                send_email(to_email, subject, html_body, text_body)
-                sent_ok += 1
-            except EmailConfigError as e:
-                st.error(f"Error de configuración de correo: {e}")
-                return sent_ok, sent_error
-            except Exception as e:  # noqa: BLE001
-                sent_error += 1
-                st.warning(f"No se pudo enviar el correo a usuario {user_id}: {e}")
-
-        return sent_ok, sent_error
+        self.render_email_progress()
+        if not sending:
+            self.render_outbox_status()
 
     def render_dashboard(self):
         """Render the admin dashboard."""
@@ -263,6 +355,8 @@ class AdminPage:
                 lock_status = "🔒 Bloqueados" if stats['wishes_locked'] else "🔓 Desbloqueados"
                 st.metric("Deseos", lock_status)
 
+            self.render_cache_stats()
+
             st.markdown("---")
 
             # Admin actions
@@ -272,10 +366,10 @@ class AdminPage:
                 st.subheader("🎲 Asignar Amigos Secretos")
                 st.write("Ejecuta el sorteo y asigna un amigo secreto a cada participante.")
                 
-                if st.button("🎲 Ejecutar Sorteo", use_container_width=True, type="primary"):
-                    with st.spinner("Asignando amigos secretos..."):
-                        self.assign_friends()
-                        st.rerun()
+                if self.runs_on_supabase:
+                    self.render_draw_actions()
+                else:
+                    st.info(SUPABASE_ONLY_MESSAGE)
 
             with col2:
                 st.subheader("🔒 Control de Deseos")
@@ -295,12 +389,10 @@ class AdminPage:
             st.subheader("📧 Enviar cartas por correo")
             st.write("Envía a cada participante la carta de deseos de su Amigo Secreto por correo electrónico.")
 
-            if st.button("📧 Enviar todas las cartas", use_container_width=True):
-                with st.spinner("Enviando cartas a todos los participantes..."):
-                    enviados, errores = self.send_wishes_emails()
-                st.success(f"Correos enviados correctamente: {enviados}")
-                if errores:
-                    st.warning(f"No se pudieron enviar {errores} correos. Revisa los detalles en los mensajes de arriba.")
+            if self.runs_on_supabase:
+                self.render_email_actions()
+            else:
+                st.info(SUPABASE_ONLY_MESSAGE)
 
         st.markdown("---")
         
@@ -5,15 +5,15 @@ from dotenv import load_dotenv
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.supabase_client import get_supabase_client
+from utils.repository import get_repository
 
 # Load environment variables
 load_dotenv()
 
 class ChangePasswordPage:
     def __init__(self):
-        # Get Supabase client
-        self.supabase = get_supabase_client()
+        # Data access (Supabase, or SQLite with DATA_BACKEND=sqlite)
+        self.repo = get_repository()
 
         # Custom CSS (consistent with other pages)
         st.markdown("""
@@ -49,10 +49,7 @@ class ChangePasswordPage:
     def verify_user(self, character_name, email):
         """Verify if character name and email match a user."""
         try:
-            response = self.supabase.table('users').select('*').ilike('character_name', character_name).eq('email', email).execute()
-            if response.data and len(response.data) > 0:
-                return response.data[0]['id']
-            return None
+            return self.repo.find_user_id(character_name, email)
         except Exception as e:
             st.error(f"Error al verificar usuario: {e}")
             return None
@@ -60,7 +57,7 @@ class ChangePasswordPage:
     def update_password(self, user_id, new_password):
         """Update the user's password."""
         try:
-            self.supabase.table('users').update({'password': new_password}).eq('id', user_id).execute()
+            self.repo.set_password(user_id, new_password)
             return True
         except Exception as e:
             st.error(f"Error al actualizar la contraseña: {e}")
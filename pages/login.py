@@ -3,7 +3,7 @@ import os
 from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.supabase_client import get_supabase_client
+from utils.repository import get_repository
 
 # Cargar variables de entorno
 load_dotenv()
@@ -11,8 +11,8 @@ load_dotenv()
 
 class LoginPage:
     def __init__(self):
-        # Get Supabase client
-        self.supabase = get_supabase_client()
+        # Data access (Supabase, or SQLite with DATA_BACKEND=sqlite)
+        self.repo = get_repository()
 
         # Estilos CSS personalizados
         st.markdown("""
@@ -49,16 +49,13 @@ class LoginPage:
         """Verificar las credenciales del usuario en la base de datos."""
         try:
             # Check if admin
-            admin_response = self.supabase.table('admin').select('*').eq('username', username).eq('password', password).execute()
-            
-            if admin_response.data and len(admin_response.data) > 0:
+            if self.repo.find_admin(username, password):
                 return {'is_admin': True, 'username': username}
             
             # Check if regular user
-            user_response = self.supabase.table('users').select('*').ilike('character_name', username).eq('password', password).execute()
+            user = self.repo.find_user_login(username, password)
             
-            if user_response.data and len(user_response.data) > 0:
-                user = user_response.data[0]
+            if user:
                 return {
                     'is_admin': False, 
                     'username': user['character_name'],
@@ -3,7 +3,8 @@ import os
 from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.supabase_client import get_supabase_client
+from utils.repository import get_repository
+from utils.query_cache import USER_INFO, cached_query, on_user_updated
 
 # Load environment variables
 load_dotenv()
@@ -11,8 +12,8 @@ load_dotenv()
 
 class ProfilePage:
     def __init__(self):
-        # Get Supabase client
-        self.supabase = get_supabase_client()
+        # Data access (Supabase, or SQLite with DATA_BACKEND=sqlite)
+        self.repo = get_repository()
 
         # Estilos CSS personalizados
         st.markdown("""
@@ -46,14 +47,11 @@ class ProfilePage:
         """, unsafe_allow_html=True)
 
     def get_user_info(self, username):
-        """Fetch user information from the database."""
+        """Fetch user information from the database (cached, see utils/query_cache.py)."""
         try:
-            response = self.supabase.table('users').select(
-                'character_name, character_photo_url, deseo1, link_deseo1, deseo2, link_deseo2, deseo3, link_deseo3, comentarios_generales, wishes_locked'
-            ).eq('character_name', username).execute()
-            
-            if response.data and len(response.data) > 0:
-                user = response.data[0]
+            # The lock has its own, shorter cache (utils/event_settings.py)
+            user = cached_query(USER_INFO, username, lambda: self.repo.get_profile(username))
+            if user:
                 return (
                     user['character_name'],
                     user.get('character_photo_url'),
@@ -64,7 +62,7 @@ class ProfilePage:
                     user['deseo3'],
                     user['link_deseo3'],
                     user.get('comentarios_generales', ''),
-                    user['wishes_locked']
+                    self.repo.is_wishes_locked()
                 )
             return None
         except Exception as e:
@@ -74,7 +72,12 @@ class ProfilePage:
     def update_user_info(self, username, deseo1, link_deseo1, deseo2, link_deseo2, deseo3, link_deseo3, comentarios_generales):
         """Update user information in the database."""
         try:
-            response = self.supabase.table('users').update({
+            # The form may have been rendered before the admin locked the wishes
+            if self.repo.is_wishes_locked(max_age=0):
+                st.warning("⚠️ La edición de deseos está bloqueada por el administrador.")
+                return False
+            # Also marks the stored letter of this user's santa as stale
+            user = self.repo.update_wishes(username, {
                 'deseo1': deseo1,
                 'link_deseo1': link_deseo1,
                 'deseo2': deseo2,
@@ -82,9 +85,10 @@ class ProfilePage:
                 'deseo3': deseo3,
                 'link_deseo3': link_deseo3,
                 'comentarios_generales': comentarios_generales
-            }).eq('character_name', username).execute()
+            })
             
-            if response.data:
+            if user:
+                on_user_updated(username)
                 st.success("Información actualizada exitosamente.")
                 return True
             return False
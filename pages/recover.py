@@ -5,15 +5,15 @@ from dotenv import load_dotenv
 
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.supabase_client import get_supabase_client
+from utils.repository import get_repository
 
 # Load environment variables
 load_dotenv()
 
 class RecoverPage:
     def __init__(self):
-        # Get Supabase client
-        self.supabase = get_supabase_client()
+        # Data access (Supabase, or SQLite with DATA_BACKEND=sqlite)
+        self.repo = get_repository()
 
         # Custom CSS
         st.markdown("""
@@ -49,11 +49,7 @@ class RecoverPage:
     def get_character_by_email(self, email):
         """Fetch character name and photo by email."""
         try:
-            response = self.supabase.table('users').select('character_name, character_photo_url').eq('email', email).execute()
-            
-            if response.data and len(response.data) > 0:
-                return response.data[0]
-            return None
+            return self.repo.find_character_by_email(email)
         except Exception as e:
             st.error(f"Error al buscar el personaje: {e}")
             return None
@@ -4,7 +4,8 @@ import os
 from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.supabase_client import get_supabase_client
+from utils.repository import get_repository
+from utils.query_cache import SELECTED_CHARACTERS, cached_query, on_user_registered
 
 # Load environment variables
 load_dotenv()
@@ -12,8 +13,8 @@ load_dotenv()
 
 class RegisterPage:
     def __init__(self):
-        # Get Supabase client
-        self.supabase = get_supabase_client()
+        # Data access (Supabase, or SQLite with DATA_BACKEND=sqlite)
+        self.repo = get_repository()
 
         # Estilos CSS personalizados
         st.markdown("""
@@ -85,10 +86,7 @@ class RegisterPage:
     def get_selected_characters(self):
         """Retrieve already selected characters from the database."""
         try:
-            response = self.supabase.table('users').select('character_name').execute()
-            if response.data:
-                return [user['character_name'] for user in response.data]
-            return []
+            return cached_query(SELECTED_CHARACTERS, None, self.repo.character_names)
         except Exception as e:
             st.error(f"Error retrieving selected characters: {e}")
             return []
@@ -174,9 +172,8 @@ class RegisterPage:
                 'password': data[14]
             }
             
-            response = self.supabase.table('users').insert(user_data).execute()
-            
-            if response.data:
+            if self.repo.insert_user(user_data):
+                on_user_registered()
                 st.success("Registro guardado exitosamente.")
                 return True
             return False
@@ -3,7 +3,9 @@ import os
 from dotenv import load_dotenv
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.supabase_client import get_supabase_client
+from utils.repository import get_repository
+from utils.query_cache import FRIEND_INFO, cached_query
+from utils.letter_template import NO_WISH, render_letter_html
 
 # Load environment variables
 load_dotenv()
@@ -11,8 +13,8 @@ load_dotenv()
 
 class FriendPage:
     def __init__(self):
-        # Get Supabase client
-        self.supabase = get_supabase_client()
+        # Data access (Supabase, or SQLite with DATA_BACKEND=sqlite)
+        self.repo = get_repository()
 
         # Estilos CSS personalizados
         st.markdown("""
@@ -41,53 +43,40 @@ class FriendPage:
         """, unsafe_allow_html=True)
 
     def fetch_friend_info(self, user_id):
-        """Fetch secret friend information for a given user ID."""
+        """Fetch secret friend information for a given user ID (one request, see utils/friend_lookup.py)."""
         try:
-            # First, get the user's ID
-            user_response = self.supabase.table('users').select('id').eq('character_name', user_id).execute()
-            
-            if not user_response.data or len(user_response.data) == 0:
-                return None
-            
-            current_user_id = user_response.data[0]['id']
-            
-            # Get the secret friend assignment
-            assignment_response = self.supabase.table('secret_friends').select('id_secret_friend').eq('user_id', current_user_id).execute()
-            
-            if not assignment_response.data or len(assignment_response.data) == 0:
-                return None
-            
-            friend_id = assignment_response.data[0]['id_secret_friend']
-            
-            # Get the friend's information
-            friend_response = self.supabase.table('users').select(
-                'character_name, character_photo_url, deseo1, link_deseo1, imagen_deseo1, '
-                'deseo2, link_deseo2, imagen_deseo2, deseo3, link_deseo3, imagen_deseo3, comentarios_generales'
-            ).eq('id', friend_id).execute()
-            
-            if not friend_response.data or len(friend_response.data) == 0:
-                return None
-            
-            friend = friend_response.data[0]
-            
-            return {
-                "friend_character_name": friend['character_name'],
-                "friend_photo_url": friend['character_photo_url'] if friend['character_photo_url'] else "",
-                "friend_deseo1": friend['deseo1'] if friend['deseo1'] else "SIN DESEO",
-                "friend_link_deseo1": friend['link_deseo1'] if friend['link_deseo1'] else "",
-                "friend_imagen_deseo1": friend['imagen_deseo1'] if friend['imagen_deseo1'] else "",
-                "friend_deseo2": friend['deseo2'] if friend['deseo2'] else "SIN DESEO",
-                "friend_link_deseo2": friend['link_deseo2'] if friend['link_deseo2'] else "",
-                "friend_imagen_deseo2": friend['imagen_deseo2'] if friend['imagen_deseo2'] else "",
-                "friend_deseo3": friend['deseo3'] if friend['deseo3'] else "SIN DESEO",
-                "friend_link_deseo3": friend['link_deseo3'] if friend['link_deseo3'] else "",
-                "friend_imagen_deseo3": friend['imagen_deseo3'] if friend['imagen_deseo3'] else "",
-                "friend_comentarios_generales": friend.get('comentarios_generales', '')
-            }
+            return cached_query(FRIEND_INFO, user_id, lambda: self.repo.friend_card(user_id))
         except Exception as e:
             st.error(f"Error fetching friend information: {e}")
             return None
 
+    def fetch_letter_html(self, username, friend_info):
+        """Letter rendered after the draw, or built now if none is stored."""
+        letter = self.repo.stored_letter(friend_info['santa_id'], friend_info['friend_id'])
+        if letter:
+            return letter['html_body']
+        return render_letter_html(username, friend_info)
+
+    def render_wish_images(self, friend_info):
+        """Reference images of the wishes that have one."""
+        images = [
+            (number, friend_info[f'friend_imagen_deseo{number}'])
+            for number in (1, 2, 3)
+            if friend_info[f'friend_imagen_deseo{number}'] and friend_info[f'friend_deseo{number}'] != NO_WISH
+        ]
+        if not images:
+            return
+        st.markdown("---")
+        st.markdown("### 🖼️ Imágenes de Referencia")
+        for number, image in images:
+            # Validar que sea una URL o archivo existente
+            try:
+                st.image(image, caption=f"Imagen Referencia #{number}", width=300)
+            except Exception as e:
+                st.warning(f"No se pudo cargar la imagen de referencia. (Error: {str(e)})")
+                if "http" in str(image):
+                    st.write(f"Link de la imagen: {image}")
+
     def render_friend_page(self):
         """Render the secret friend page."""
         st.markdown("<h1 style='text-align: center; color: white;'>🎅🏻 Tu Amigo Secreto</h1>",
@@ -111,46 +100,12 @@ class FriendPage:
 
                 st.markdown("---")
                 
-                # Wishes Section
+                # Wishes, links and notes: the same letter that is sent by email
                 st.subheader("🎁 Lista de Deseos")
+                st.markdown(self.fetch_letter_html(username, friend_info), unsafe_allow_html=True)
 
-                # Helper to display a wish
-                def display_wish(number, title, wish, link, image, color_emoji):
-                   with st.container():
-                       st.markdown(f"### {color_emoji} {title}")
-                       st.write(wish)
-                       
-                       if link:
-                           st.link_button(f"Ver Referencia del Deseo #{number} 🔗", link)
-                       
-                       if image:
-                           # Validar que sea una URL o archivo existente
-                           try:
-                               st.image(image, caption=f"Imagen Referencia #{number}", width=300)
-                           except Exception as e:
-                               st.warning(f"No se pudo cargar la imagen de referencia. (Error: {str(e)})")
-                               if "http" in str(image):
-                                    st.write(f"Link de la imagen: {image}")
-
-                       st.markdown("---")
-
-                # Wish 1
-                display_wish(1, "Primera Opción (Favorito 😍)", friend_info['friend_deseo1'], 
-                             friend_info['friend_link_deseo1'], friend_info['friend_imagen_deseo1'], "🥇")
-
-                # Wish 2
-                display_wish(2, "Segunda Opción (Me encanta)", friend_info['friend_deseo2'],
-                             friend_info['friend_link_deseo2'], friend_info['friend_imagen_deseo2'], "🥈")
-
-                # Wish 3
-                if friend_info['friend_deseo3'] != "SIN DESEO":
-                     display_wish(3, "Tercera Opción (Si te sientes generoso 😇)", friend_info['friend_deseo3'],
-                             friend_info['friend_link_deseo3'], friend_info['friend_imagen_deseo3'], "🥉")
-
-                # General Comments
-                if friend_info['friend_comentarios_generales']:
-                    st.markdown("### 📝 Notas Importantes")
-                    st.warning(friend_info['friend_comentarios_generales'])
+                # The letter has no room for the reference images
+                self.render_wish_images(friend_info)
             
             else:
                 st.warning("Aún no se ha hecho el sorteo, Calma Tigre!.")
@@ -0,0 +1,167 @@
+"""
+In-memory stand-in for the supabase-py client used by the tests.
+Supports the query builder calls the utils modules make (select with
+count/head, insert, upsert, update, delete, eq/neq/gt/lt/in_/ilike filters,
+order, limit) and RPCs registered as Python functions.
+"""
+import copy
+import itertools
+
+
+class Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class Query:
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.operation = 'select'
+        self.columns = '*'
+        self.count = None
+        self.head = False
+        self.payload = None
+        self.on_conflict = None
+        self.filters = []
+        self.ordering = None
+        self.row_limit = None
+
+    def select(self, columns='*', count=None, head=False):
+        self.columns, self.count, self.head = columns, count, head
+        return self
+
+    def insert(self, rows):
+        self.operation, self.payload = 'insert', rows
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.operation, self.payload, self.on_conflict = 'upsert', rows, on_conflict
+        return self
+
+    def update(self, values):
+        self.operation, self.payload = 'update', values
+        return self
+
+    def delete(self):
+        self.operation = 'delete'
+        return self
+
+    def _filter(self, test):
+        self.filters.append(test)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def gt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] > value)
+
+    def lt(self, column, value):
+        return self._filter(lambda row: row.get(column) is not None and row[column] < value)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def ilike(self, column, value):
+        return self._filter(lambda row: (row.get(column) or '').lower() == value.lower())
+
+    def order(self, column, desc=False):
+        self.ordering = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def _matching(self):
+        rows = [row for row in self.db.rows(self.table) if all(test(row) for test in self.filters)]
+        if self.ordering:
+            rows.sort(key=lambda row: row.get(self.ordering[0]), reverse=self.ordering[1])
+        return rows
+
+    def _project(self, row):
+        if self.columns.strip() == '*':
+            return dict(row)
+        return {column.strip(): row.get(column.strip()) for column in self.columns.split(',')}
+
+    def _new_row(self, row):
+        row = copy.deepcopy(row)
+        if self.table in self.db.serial and 'id' not in row:
+            row['id'] = next(self.db.sequences[self.table])
+        return row
+
+    def execute(self):
+        self.db.requests.append((self.table, self.operation))
+        table = self.db.rows(self.table)
+        if self.operation == 'select':
+            rows = self._matching()
+            total = len(rows)
+            if self.row_limit is not None:
+                rows = rows[:self.row_limit]
+            return Response([] if self.head else [self._project(row) for row in rows],
+                            total if self.count else None)
+        if self.operation in ('insert', 'upsert'):
+            rows = self.payload if isinstance(self.payload, list) else [self.payload]
+            keys = [key.strip() for key in (self.on_conflict or 'id').split(',')]
+            written = []
+            for row in rows:
+                match = None
+                if self.operation == 'upsert':
+                    match = next((old for old in table if all(old.get(k) == row.get(k) for k in keys)), None)
+                if match is not None:
+                    match.update(copy.deepcopy(row))
+                    written.append(dict(match))
+                else:
+                    row = self._new_row(row)
+                    table.append(row)
+                    written.append(dict(row))
+            return Response(written)
+        if self.operation == 'update':
+            rows = self._matching()
+            for row in rows:
+                row.update(copy.deepcopy(self.payload))
+            return Response([dict(row) for row in rows])
+        if self.operation == 'delete':
+            rows = self._matching()
+            self.db.tables[self.table] = [row for row in table if not any(row is old for old in rows)]
+            return Response([dict(row) for row in rows])
+        raise ValueError(self.operation)
+
+
+class RPC:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params or {}
+
+    def execute(self):
+        self.db.requests.append(('rpc', self.name))
+        if self.name not in self.db.functions:
+            raise RuntimeError(f"function {self.name} does not exist")
+        return Response(self.db.functions[self.name](self.db, **self.params))
+
+
+class FakeSupabase:
+    """Tables are lists of dicts in `tables`; `serial` tables get an auto id."""
+
+    def __init__(self, serial=('users',)):
+        self.tables = {}
+        self.functions = {}
+        self.requests = []
+        self.serial = set(serial)
+        self.sequences = {}
+
+    def rows(self, table):
+        if table in self.serial:
+            self.sequences.setdefault(table, itertools.count(1))
+        return self.tables.setdefault(table, [])
+
+    def table(self, name):
+        return Query(self, name)
+
+    def rpc(self, name, params=None):
+        return RPC(self, name, params)
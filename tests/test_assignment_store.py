@@ -0,0 +1,76 @@
+import pytest
+
+from test_draw_service import swap_secret_friends
+from utils.assignment_store import STAGING_TABLE, iter_batches, save_assignments_atomic
+
+
+@pytest.fixture
+def db(supabase):
+    supabase.functions['swap_secret_friends'] = swap_secret_friends
+    supabase.tables['secret_friends'] = [{'user_id': 1, 'id_secret_friend': 2}, {'user_id': 2, 'id_secret_friend': 1}]
+    return supabase
+
+
+def ring(n):
+    return [{'user_id': i, 'id_secret_friend': i % n + 1} for i in range(1, n + 1)]
+
+
+def current(db):
+    return {row['user_id']: row['id_secret_friend'] for row in db.rows('secret_friends')}
+
+
+def test_batches_cover_every_row():
+    assert [len(batch) for batch in iter_batches(list(range(7)), 3)] == [3, 3, 1]
+    assert list(iter_batches([], 3)) == []
+    with pytest.raises(ValueError):
+        list(iter_batches([1], 0))
+
+
+def test_draw_is_staged_in_batches_then_swapped(db):
+    progress = []
+    db.requests.clear()
+    stats = save_assignments_atomic(db, ring(7), batch_size=3, draw_id='draw-1',
+                                    on_batch=lambda written, total: progress.append((written, total)))
+
+    assert db.requests == [(STAGING_TABLE, 'insert')] * 3 + [('rpc', 'swap_secret_friends')]
+    assert progress == [(3, 7), (6, 7), (7, 7)]
+    assert stats['draw_id'] == 'draw-1' and stats['rows'] == 7 and stats['batches'] == 3
+    assert current(db) == {row['user_id']: row['id_secret_friend'] for row in ring(7)}
+    assert db.rows(STAGING_TABLE) == []
+
+
+def test_failed_batch_discards_the_staged_rows(db, monkeypatch):
+    table = db.table
+    inserts = []
+
+    def flaky_table(name):
+        query = table(name)
+        execute = query.execute
+
+        def flaky_execute():
+            if name == STAGING_TABLE and query.operation == 'insert':
+                inserts.append(query.payload)
+                if len(inserts) == 2:
+                    raise ConnectionError("connection reset")
+            return execute()
+        query.execute = flaky_execute
+        return query
+
+    monkeypatch.setattr(db, 'table', flaky_table)
+    with pytest.raises(ConnectionError):
+        save_assignments_atomic(db, ring(7), batch_size=3, draw_id='draw-1')
+    assert db.rows(STAGING_TABLE) == []
+    assert current(db) == {1: 2, 2: 1}
+    assert ('rpc', 'swap_secret_friends') not in db.requests
+
+
+def test_failed_swap_keeps_the_current_draw(db):
+    def failing_swap(db, p_draw_id, p_expected_rows=None):
+        raise RuntimeError("Draw has 6 staged rows, expected 7")
+
+    db.functions['swap_secret_friends'] = failing_swap
+    with pytest.raises(RuntimeError):
+        save_assignments_atomic(db, ring(7), batch_size=3, draw_id='draw-1')
+    assert db.rows(STAGING_TABLE) == []
+    assert current(db) == {1: 2, 2: 1}
+    assert db.requests[-1] == (STAGING_TABLE, 'delete')
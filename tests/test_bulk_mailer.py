@@ -0,0 +1,30 @@
+from utils.bulk_mailer import _group_messages, send_bulk
+from utils.recipient_plan import email_domain
+from utils.smtp_sink import SMTPSink
+
+
+def messages(domains):
+    return [{'key': i, 'to_email': f"santa{i}@{domain}", 'subject': 'Carta', 'html_body': '<p>Hola</p>'}
+            for i, domain in enumerate(domains)]
+
+
+def test_large_domain_is_spread_over_the_workers():
+    batch = messages(['gmail.com'] * 10 + ['outlook.com'] * 2)
+    chunks = _group_messages(batch, email_domain, chunk_size=100, concurrency=4)
+    assert [len(chunk) for chunk in chunks] == [3, 3, 3, 1, 1, 1]
+    assert [message['key'] for chunk in chunks for message in chunk] == list(range(12))
+
+
+def test_chunks_respect_messages_per_connection():
+    chunks = _group_messages(messages(['gmail.com'] * 10), email_domain, chunk_size=2, concurrency=1)
+    assert [len(chunk) for chunk in chunks] == [2] * 5
+
+
+def test_grouped_send_delivers_every_message():
+    batch = messages(['gmail.com'] * 7 + ['example.org'] * 3)
+    with SMTPSink() as sink:
+        outcome = send_bulk(batch, concurrency=3, rate=0, config=sink.smtp_config(), group_by=email_domain)
+        assert outcome['sent'] == 10
+        assert sorted(result['key'] for result in outcome['results']) == list(range(10))
+        assert sink.stats()['messages'] == 10
+        assert outcome['connections'] <= 3
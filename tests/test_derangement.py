@@ -0,0 +1,63 @@
+import itertools
+import random
+from collections import Counter
+
+import pytest
+
+from utils.derangement import MODE_CYCLE, MODE_UNIFORM, derange, sattolo_cycle, uniform_derangement
+
+
+def is_derangement(p):
+    return sorted(p) == list(range(len(p))) and all(p[i] != i for i in range(len(p)))
+
+
+def cycle_lengths(p):
+    seen, lengths = set(), []
+    for start in range(len(p)):
+        length, i = 0, start
+        while i not in seen:
+            seen.add(i)
+            i = p[i]
+            length += 1
+        if length:
+            lengths.append(length)
+    return lengths
+
+
+@pytest.mark.parametrize('engine', [uniform_derangement, sattolo_cycle])
+@pytest.mark.parametrize('n', [2, 3, 5, 17, 200])
+def test_engines_return_derangements(engine, n):
+    rng = random.Random(n)
+    for _ in range(50):
+        assert is_derangement(engine(n, rng))
+
+
+def test_sattolo_is_a_single_cycle():
+    rng = random.Random(1)
+    assert all(cycle_lengths(sattolo_cycle(30, rng)) == [30] for _ in range(100))
+
+
+def test_uniform_derangement_covers_all_derangements_evenly():
+    # 44 derangements of 5 elements; chi-square with 43 degrees of freedom
+    n, draws = 5, 44_000
+    all_derangements = [p for p in itertools.permutations(range(n)) if is_derangement(p)]
+    assert len(all_derangements) == 44
+    rng = random.Random(2025)
+    counts = Counter(tuple(uniform_derangement(n, rng)) for _ in range(draws))
+    assert set(counts) == set(all_derangements)
+    expected = draws / len(all_derangements)
+    chi2 = sum((counts[p] - expected) ** 2 / expected for p in all_derangements)
+    # 99.9th percentile of chi-square(43) is about 77.4
+    assert chi2 < 77.4
+
+
+def test_derange_maps_user_ids():
+    ids = [10, 20, 30, 40]
+    for mode in (MODE_UNIFORM, MODE_CYCLE):
+        friend_of = derange(ids, mode=mode, rng=random.Random(3))
+        assert sorted(friend_of) == ids and sorted(friend_of.values()) == ids
+        assert all(giver != receiver for giver, receiver in friend_of.items())
+    with pytest.raises(ValueError):
+        derange([1])
+    with pytest.raises(ValueError):
+        derange(ids, mode='otro')
@@ -0,0 +1,131 @@
+import pytest
+
+from test_history import archive_secret_friends
+from test_incremental_draw import apply_incremental_draw_rpc
+from test_rendered_letters import add_users
+from utils.derangement import MODE_CYCLE
+from utils.draw_service import run_draw
+from utils.rendered_letters import RENDERED_TABLE
+from utils.seeded_draw import MODE_SEEDED, SEEDS_TABLE
+
+YEAR = 2025
+
+
+def swap_secret_friends(db, p_draw_id, p_expected_rows=None):
+    """Python version of swap_secret_friends (utils/secret_friends_staging.sql)."""
+    staged = [row for row in db.rows('secret_friends_staging') if row['draw_id'] == p_draw_id]
+    if p_expected_rows is not None and len(staged) != p_expected_rows:
+        raise RuntimeError(f"Draw {p_draw_id} has {len(staged)} staged rows, expected {p_expected_rows}")
+    db.tables['secret_friends'] = [
+        {'user_id': row['user_id'], 'id_secret_friend': row['id_secret_friend']} for row in staged
+    ]
+    db.tables['secret_friends_staging'] = [
+        row for row in db.rows('secret_friends_staging') if row['draw_id'] != p_draw_id
+    ]
+    return len(staged)
+
+
+@pytest.fixture
+def db(supabase):
+    supabase.functions['swap_secret_friends'] = swap_secret_friends
+    supabase.functions['archive_secret_friends'] = archive_secret_friends
+    supabase.functions['apply_incremental_draw'] = apply_incremental_draw_rpc
+    return supabase
+
+
+def draw_of(db):
+    return {row['user_id']: row['id_secret_friend'] for row in db.rows('secret_friends')}
+
+
+def assert_derangement(friend_of, ids):
+    assert sorted(friend_of) == sorted(ids)
+    assert sorted(friend_of.values()) == sorted(ids)
+    assert all(giver != friend for giver, friend in friend_of.items())
+
+
+def test_full_draw_saves_archives_and_renders(db):
+    add_users(db, 6)
+    progress = []
+    result = run_draw(db, mode=MODE_CYCLE, year=YEAR, by_group=False,
+                      progress=lambda fraction, message: progress.append(fraction))
+
+    assert result['ok'] and result['error'] is None
+    assert result['users'] == 6 and result['rows_written'] == 6
+    assert_derangement(draw_of(db), range(1, 7))
+    archived = {row['user_id']: row['id_secret_friend'] for row in db.rows('secret_friends_history')
+                if row['year'] == YEAR}
+    assert archived == draw_of(db)
+    assert result['letters_rendered'] == 6
+    assert {row['draw_version'] for row in db.rows(RENDERED_TABLE)} == {result['draw_id']}
+    assert db.rows('secret_friends_staging') == []
+    assert progress[0] == 0.0 and progress[-1] == 1.0
+    assert {'fetch_users', 'solve', 'save', 'archive', 'render_letters', 'total'} <= set(result['timings'])
+
+
+def test_incremental_draw_keeps_the_other_pairs(db):
+    add_users(db, 6)
+    run_draw(db, mode=MODE_CYCLE, year=YEAR, by_group=False)
+    before = draw_of(db)
+    db.tables['users'] = [row for row in db.rows('users') if row['id'] != 3]
+    add_users(db, 1)
+    db.requests.clear()
+
+    result = run_draw(db, incremental=True, year=YEAR, by_group=False)
+    assert result['ok']
+    assert result['rows_deleted'] == 1
+    assert ('rpc', 'swap_secret_friends') not in db.requests
+    after = draw_of(db)
+    assert_derangement(after, [1, 2, 4, 5, 6, 7])
+    changed = {giver for giver in after if before.get(giver) != after[giver]}
+    assert len(changed) == result['rows_written'] <= 3
+    assert result['letters_rendered'] == result['rows_written']
+    assert 3 not in {row['user_id'] for row in db.rows(RENDERED_TABLE)}
+
+
+def test_seeded_draw_stores_its_seed(db):
+    add_users(db, 5)
+    result = run_draw(db, mode=MODE_SEEDED, year=YEAR, by_group=False)
+    assert result['ok']
+    assert result['seed'] and result['verification']['ok']
+    assert [row['seed'] for row in db.rows(SEEDS_TABLE) if row['year'] == YEAR] == [result['seed']]
+    assert_derangement(draw_of(db), range(1, 6))
+
+
+def test_impossible_history_is_dropped_with_a_warning(db):
+    add_users(db, 3)
+    # Last year used every possible pair, so no draw can avoid them
+    db.tables['secret_friends_history'] = [
+        {'year': YEAR - 1, 'user_id': giver, 'id_secret_friend': friend}
+        for giver in (1, 2, 3) for friend in (1, 2, 3) if giver != friend
+    ]
+    result = run_draw(db, year=YEAR, by_group=False)
+    assert result['ok']
+    assert any('años anteriores' in warning for warning in result['warnings'])
+    assert_derangement(draw_of(db), [1, 2, 3])
+
+
+def test_seeded_draw_by_group_is_rejected(db):
+    add_users(db, 4)
+    result = run_draw(db, mode=MODE_SEEDED, year=YEAR, by_group=True)
+    assert not result['ok']
+    assert 'semilla' in result['error']
+    assert db.rows('secret_friends') == []
+
+
+@pytest.mark.parametrize('users, rules, message', [
+    (1, {}, 'No hay suficientes usuarios'),
+    (3, {1: 'a', 2: 'a'}, 'No es posible realizar el sorteo'),
+])
+def test_failed_draw_returns_the_error_shape(db, users, rules, message):
+    add_users(db, users)
+    for row in db.rows('users'):
+        row['equipo'] = rules.get(row['id'])
+    db.tables['secret_friends'] = [{'user_id': 9, 'id_secret_friend': 8}]
+
+    result = run_draw(db, year=YEAR, by_group=False)
+    assert result['ok'] is False
+    assert result['error'].startswith(message)
+    assert result['rows_written'] == 0 and result['draw_id'] is None
+    assert 'total' in result['timings']
+    # The current draw is left as it was
+    assert draw_of(db) == {9: 8}
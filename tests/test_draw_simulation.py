@@ -0,0 +1,33 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.draw_simulation import count_cycles, derangement_cycle_counts, simulate  # noqa: E402
+
+
+def test_cycle_counts_add_up_to_the_derangement_numbers():
+    assert [sum(derangement_cycle_counts(n)) for n in range(2, 9)] == [1, 2, 9, 44, 265, 1854, 14833]
+    assert derangement_cycle_counts(4) == [0, 6, 3, 0, 0]
+
+
+def test_count_cycles():
+    perms = np.array([[1, 2, 3, 0], [1, 0, 3, 2], [2, 3, 0, 1]])
+    assert count_cycles(perms).tolist() == [1, 2, 2]
+
+
+@pytest.mark.parametrize('engine', ['uniform', 'rejection'])
+def test_uniform_engines_pass(engine):
+    result = simulate(engine, 8, 50_000, seed=7)
+    assert result['fixed_points'] == 0
+    assert abs(result['chi2_z']) < 5
+    assert abs(result['cycles_z']) < 5
+
+
+def test_cycle_engine_is_told_apart_from_uniform():
+    result = simulate('cycle', 8, 50_000, seed=7)
+    assert result['fixed_points'] == 0
+    # Every friend is still about equally likely...
+    assert result['max_cell_deviation'] < 0.05
+    # ...but every draw is a single chain
+    assert result['cycles_per_draw'] == 1.0
+    assert result['cycles_z'] > 100
@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils import email_outbox as outbox
+from utils.email_outbox import (
+    STATUS_CANCELLED, STATUS_FAILED, STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_UNCERTAIN,
+)
+
+CAMPAIGN = 'cartas-2025'
+SETTINGS = {'max_attempts': 3, 'retry_base_seconds': 60, 'retry_max_seconds': 3600}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def enqueue_email_jobs(db, p_campaign, p_jobs, p_resend=False):
+    """Python version of enqueue_email_jobs (utils/email_outbox.sql)."""
+    table = db.rows('email_outbox')
+    written = []
+    for job in p_jobs:
+        row = next((r for r in table if r['campaign'] == p_campaign and r['user_id'] == job['user_id']), None)
+        if row is None:
+            table.append(dict(job, id=len(table) + 1, campaign=p_campaign, status=STATUS_PENDING,
+                              attempts=0, next_attempt_at=_now(), claimed_at=None, sent_at=None,
+                              last_error=None))
+            written.append({'job_user_id': job['user_id'], 'inserted': True})
+            continue
+        if row['status'] == STATUS_SENDING:
+            continue
+        if row['content_hash'] == job['content_hash'] and row['status'] != STATUS_CANCELLED:
+            continue
+        if row['status'] in (STATUS_SENT, STATUS_UNCERTAIN) and not p_resend:
+            continue
+        row.update(job, status=STATUS_PENDING, attempts=0, next_attempt_at=_now(),
+                   claimed_at=None, sent_at=None, last_error=None)
+        written.append({'job_user_id': job['user_id'], 'inserted': False})
+    return written
+
+
+def claim_email_jobs(db, p_campaign, p_limit):
+    """Python version of claim_email_jobs (utils/email_outbox.sql)."""
+    now = _now()
+    due = [r for r in db.rows('email_outbox')
+           if r['campaign'] == p_campaign and r['status'] == STATUS_PENDING and r['next_attempt_at'] <= now]
+    due.sort(key=lambda r: (r['next_attempt_at'], r['id']))
+    for row in due[:p_limit]:
+        row.update(status=STATUS_SENDING, claimed_at=now, attempts=row['attempts'] + 1)
+    return [dict(row) for row in due[:p_limit]]
+
+
+@pytest.fixture
+def db(supabase):
+    supabase.functions['enqueue_email_jobs'] = enqueue_email_jobs
+    supabase.functions['claim_email_jobs'] = claim_email_jobs
+    return supabase
+
+
+def messages(count, body='carta'):
+    return [{'key': i, 'to_email': f"santa{i}@example.com", 'subject': 'Carta',
+             'html_body': f"{body} {i}", 'text_body': 'texto'} for i in range(1, count + 1)]
+
+
+def statuses(db):
+    return {row['user_id']: row['status'] for row in db.rows('email_outbox')}
+
+
+def test_enqueue_is_idempotent(db):
+    assert outbox.enqueue_messages(db, CAMPAIGN, messages(3))['queued'] == 3
+    again = outbox.enqueue_messages(db, CAMPAIGN, messages(3))
+    assert again == {'queued': 0, 'requeued': 0, 'unchanged': 3, 'held': 0, 'cancelled': 0}
+    assert len(db.rows('email_outbox')) == 3
+
+
+def test_changed_letter_is_requeued_and_removed_user_cancelled(db):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(3))
+    db.rows('email_outbox')[0].update(status=STATUS_FAILED, attempts=3)
+    changed = messages(2, body='nueva')
+    result = outbox.enqueue_messages(db, CAMPAIGN, changed)
+    assert result['requeued'] == 2
+    assert result['cancelled'] == 1
+    assert statuses(db) == {1: STATUS_PENDING, 2: STATUS_PENDING, 3: STATUS_CANCELLED}
+    assert db.rows('email_outbox')[0]['attempts'] == 0
+
+
+def test_enqueue_never_resets_a_job_being_sent(db):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(2))
+    claimed = outbox.claim_jobs(db, CAMPAIGN, 1)
+    result = outbox.enqueue_messages(db, CAMPAIGN, messages(2, body='nueva'))
+    assert result['held'] == 1 and result['requeued'] == 1
+    row = next(r for r in db.rows('email_outbox') if r['user_id'] == claimed[0]['user_id'])
+    assert row['status'] == STATUS_SENDING
+    assert row['attempts'] == 1
+    # The claimed job is not claimed a second time
+    assert [job['user_id'] for job in outbox.claim_jobs(db, CAMPAIGN, 10)] != [claimed[0]['user_id']]
+
+
+def test_sent_letters_are_only_requeued_on_resend(db):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(1))
+    db.rows('email_outbox')[0]['status'] = STATUS_SENT
+    assert outbox.enqueue_messages(db, CAMPAIGN, messages(1, body='nueva'))['held'] == 1
+    assert statuses(db) == {1: STATUS_SENT}
+    assert outbox.enqueue_messages(db, CAMPAIGN, messages(1, body='nueva'), resend=True)['requeued'] == 1
+    assert statuses(db) == {1: STATUS_PENDING}
+
+
+def test_claim_moves_due_jobs_to_sending(db):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(5))
+    jobs = outbox.claim_jobs(db, CAMPAIGN, 3)
+    assert len(jobs) == 3
+    assert all(job['status'] == STATUS_SENDING and job['attempts'] == 1 for job in jobs)
+    assert len(outbox.claim_jobs(db, CAMPAIGN, 10)) == 2
+    assert outbox.claim_jobs(db, CAMPAIGN, 10) == []
+
+
+def test_failed_attempt_backs_off_then_fails(db):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(1))
+    job = outbox.claim_jobs(db, CAMPAIGN, 1)[0]
+    error = {'ok': False, 'attempted': True, 'error': '451 later'}
+    assert outbox._record_result(db, job, error, SETTINGS) == STATUS_PENDING
+    row = db.rows('email_outbox')[0]
+    retry_at = datetime.fromisoformat(row['next_attempt_at'])
+    assert retry_at > datetime.now(timezone.utc) + timedelta(seconds=50)
+    # Not due yet
+    assert outbox.claim_jobs(db, CAMPAIGN, 1) == []
+
+    job = dict(job, attempts=SETTINGS['max_attempts'])
+    assert outbox._record_result(db, job, error, SETTINGS) == STATUS_FAILED
+    assert outbox.retry_failed(db, CAMPAIGN) == 1
+    assert statuses(db) == {1: STATUS_PENDING}
+
+
+def test_skipped_job_gives_the_attempt_back(db):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(1))
+    job = outbox.claim_jobs(db, CAMPAIGN, 1)[0]
+    skipped = {'ok': False, 'attempted': False, 'error': 'aborted'}
+    assert outbox._record_result(db, job, skipped, SETTINGS) == STATUS_PENDING
+    assert db.rows('email_outbox')[0]['attempts'] == 0
+
+
+def test_backoff_grows_and_is_capped():
+    assert [outbox.backoff_seconds(n, 60, 300) for n in (1, 2, 3, 4)] == [60, 120, 240, 300]
+
+
+def test_stale_claims_become_uncertain_and_are_not_resent(db):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(1))
+    outbox.claim_jobs(db, CAMPAIGN, 1)
+    db.rows('email_outbox')[0]['claimed_at'] = '2000-01-01T00:00:00+00:00'
+    assert outbox.recover_stale_jobs(db, CAMPAIGN, lease_seconds=60) == 1
+    assert statuses(db) == {1: STATUS_UNCERTAIN}
+    assert outbox.retry_failed(db, CAMPAIGN) == 0
+    assert outbox.retry_failed(db, CAMPAIGN, include_uncertain=True) == 1
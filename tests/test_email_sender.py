@@ -0,0 +1,123 @@
+import email
+import threading
+from email.policy import default
+
+import pytest
+
+from utils.email_sender import Mailer, SMTPConnectionPool, SMTPSession, send_email
+from utils.smtp_sink import SMTPSink
+
+CONFIG = {
+    'host': 'localhost', 'port': 25, 'user': 'santa', 'password': 'clave',
+    'from_email': 'Papá Noel <santa@example.com>', 'use_tls': False, 'max_messages_per_connection': 100,
+}
+
+
+def parse(raw):
+    return email.message_from_bytes(raw, policy=default)
+
+
+@pytest.mark.parametrize('to_email, to_header, envelope', [
+    ('ana@example.com', 'ana@example.com', ('ana@example.com', [])),
+    ('ana@bücher.example', 'ana@xn--bcher-kva.example', ('ana@xn--bcher-kva.example', [])),
+    ('Ána <ana@example.com>', 'Ána <ana@example.com>', ('ana@example.com', [])),
+    ('josé@ejemplo.es', 'josé@ejemplo.es', ('josé@ejemplo.es', ['SMTPUTF8'])),
+])
+def test_build_parses_back(to_email, to_header, envelope):
+    mailer = Mailer(CONFIG)
+    raw = mailer.build(to_email, 'Tu Amigo Secreto 🎁', '<p>Hola, ñandú</p>', 'Hola, ñandú')
+    msg = parse(raw)
+    assert msg['To'] == to_header
+    assert msg['Subject'] == 'Tu Amigo Secreto 🎁'
+    assert msg['From'] == 'Papá Noel <santa@example.com>'
+    assert msg.get_body(('html',)).get_content().strip() == '<p>Hola, ñandú</p>'
+    assert msg.get_body(('plain',)).get_content().strip() == 'Hola, ñandú'
+    assert mailer.envelope_to(to_email) == envelope
+
+
+def test_build_rejects_header_injection():
+    with pytest.raises(ValueError):
+        Mailer(CONFIG).build('ana@example.com\r\nBcc: todos@example.com', 'Carta', '<p>Hola</p>')
+
+
+def test_non_ascii_recipients_are_delivered():
+    with SMTPSink() as sink:
+        with SMTPSession(sink.smtp_config()) as smtp:
+            for to_email in ('ana@bücher.example', 'josé@ejemplo.es'):
+                smtp.send(to_email, 'Carta', '<p>Hola</p>')
+        assert sink.stats()['messages'] == 2
+
+
+def test_send_email_uses_the_given_mailer(monkeypatch):
+    monkeypatch.delenv('SMTP_HOST', raising=False)
+    with SMTPSink() as sink:
+        send_email('ana@example.com', 'Carta', '<p>Hola</p>', mailer=Mailer(sink.smtp_config()))
+        assert sink.stats()['messages'] == 1
+
+
+def drop_message(sink, number):
+    """Make the sink close the connection instead of answering the `number`-th DATA."""
+    outcome = sink._outcome
+    calls = []
+
+    def dropping():
+        calls.append(1)
+        return 'drop' if len(calls) == number else outcome()
+    sink._outcome = dropping
+
+
+def test_session_reconnects_when_the_connection_drops():
+    with SMTPSink() as sink:
+        drop_message(sink, 3)
+        with SMTPSession(sink.smtp_config()) as smtp:
+            for i in range(5):
+                smtp.send(f'amigo{i}@example.com', 'Carta', '<p>Hola</p>')
+            assert smtp.connections_opened == 2
+            assert smtp.messages_sent == 5
+        stats = sink.stats()
+        assert stats['dropped'] == 1
+        assert stats['messages'] == 5
+        assert stats['connections'] == 2
+
+
+def test_session_recycles_the_connection_after_the_limit():
+    with SMTPSink() as sink:
+        with SMTPSession(sink.smtp_config(max_messages_per_connection=2)) as smtp:
+            for i in range(5):
+                smtp.send(f'amigo{i}@example.com', 'Carta', '<p>Hola</p>')
+            assert smtp.connections_opened == 3
+        assert sink.stats()['messages'] == 5
+
+
+def test_pool_reuses_sessions():
+    with SMTPSink() as sink:
+        with SMTPConnectionPool(size=2, config=sink.smtp_config()) as pool:
+            for i in range(4):
+                with pool.session() as smtp:
+                    smtp.send(f'amigo{i}@example.com', 'Carta', '<p>Hola</p>')
+            assert pool.connections_opened == 1
+
+            def send_batch(start):
+                for i in range(start, start + 5):
+                    with pool.session() as smtp:
+                        smtp.send(f'amigo{i}@example.com', 'Carta', '<p>Hola</p>')
+            threads = [threading.Thread(target=send_batch, args=(i * 5,)) for i in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert pool.connections_opened <= 2
+        stats = sink.stats()
+        assert stats['messages'] == 34
+        assert stats['connections'] <= 2
+
+
+def test_pool_session_reconnects_after_a_drop():
+    with SMTPSink() as sink:
+        drop_message(sink, 2)
+        with SMTPConnectionPool(size=1, config=sink.smtp_config()) as pool:
+            for i in range(4):
+                with pool.session() as smtp:
+                    smtp.send(f'amigo{i}@example.com', 'Carta', '<p>Hola</p>')
+            assert pool.connections_opened == 2
+        assert sink.stats()['messages'] == 4
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from test_email_outbox import CAMPAIGN, claim_email_jobs, enqueue_email_jobs, messages, statuses
+from utils import email_outbox as outbox
+from utils import email_sender, email_worker
+from utils.config_loader import get_email_settings
+from utils.email_outbox import STATUS_FAILED, STATUS_PENDING, STATUS_SENT
+from utils.email_worker import EmailWorker, get_email_worker, start_email_worker
+from utils.smtp_sink import SMTPSink
+
+
+@pytest.fixture
+def db(supabase):
+    supabase.functions['enqueue_email_jobs'] = enqueue_email_jobs
+    supabase.functions['claim_email_jobs'] = claim_email_jobs
+    return supabase
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    """SMTP sink configured through the environment, as the worker reads it."""
+    with SMTPSink() as sink:
+        config = sink.smtp_config()
+        monkeypatch.setenv('SMTP_HOST', config['host'])
+        monkeypatch.setenv('SMTP_PORT', str(config['port']))
+        monkeypatch.setenv('SMTP_USER', config['user'])
+        monkeypatch.setenv('SMTP_PASSWORD', config['password'])
+        monkeypatch.setenv('SMTP_FROM', config['from_email'])
+        monkeypatch.setenv('SMTP_USE_TLS', 'false')
+        # The default mailer is built once per process from the environment
+        monkeypatch.setattr(email_sender, '_default_mailer', None)
+        yield sink
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    settings = dict(get_email_settings(), rate_per_sec=0, concurrency=2, max_attempts=1)
+    monkeypatch.setattr(outbox, 'get_email_settings', lambda: settings)
+    monkeypatch.setattr(email_worker, '_workers', {})
+    return settings
+
+
+def run(worker, timeout=10):
+    worker.join(timeout)
+    assert not worker.running
+    return worker.status()
+
+
+def test_worker_drains_the_outbox_and_exits_when_idle(db, sink):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(6))
+    worker = start_email_worker(db, CAMPAIGN)
+    assert get_email_worker(CAMPAIGN) is worker
+    status = run(worker)
+    assert status['sent'] == 6
+    assert status['failed'] == 0
+    assert status['queued'] == 0
+    assert status['counts'][STATUS_SENT] == 6
+    assert status['error'] is None and not status['aborted']
+    assert set(statuses(db).values()) == {STATUS_SENT}
+    assert sink.stats()['messages'] == 6
+
+
+def test_worker_on_an_empty_outbox_exits_at_once(db, sink):
+    status = run(start_email_worker(db, CAMPAIGN))
+    assert status['sent'] == 0
+    assert status['queued'] == 0
+    assert sink.stats()['connections'] == 0
+
+
+def test_worker_counts_failed_jobs(db, sink):
+    sink.failure_rate = 1.0
+    outbox.enqueue_messages(db, CAMPAIGN, messages(3))
+    status = run(start_email_worker(db, CAMPAIGN))
+    assert status['sent'] == 0
+    assert status['failed'] == 3
+    assert status['counts'][STATUS_FAILED] == 3
+
+
+def test_worker_waits_for_retries_until_stopped(db, sink):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(3))
+    later = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    db.rows('email_outbox')[0]['next_attempt_at'] = later
+
+    worker = EmailWorker(db, CAMPAIGN, poll_seconds=0.05)
+    worker.start()
+    worker.join(0.5)
+    assert worker.running
+    status = worker.status()
+    assert status['running']
+    assert status['sent'] == 2
+    assert status['queued'] == 1
+
+    worker.stop()
+    status = run(worker)
+    assert not status['running']
+    assert status['counts'][STATUS_PENDING] == 1
+
+
+def test_starting_a_running_worker_keeps_it(db, sink):
+    outbox.enqueue_messages(db, CAMPAIGN, messages(1))
+    db.rows('email_outbox')[0]['next_attempt_at'] = (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()
+    worker = start_email_worker(db, CAMPAIGN)
+    try:
+        assert start_email_worker(db, CAMPAIGN) is worker
+        assert worker.running
+    finally:
+        worker.stop()
+        run(worker)
@@ -0,0 +1,61 @@
+import pytest
+
+from utils import event_settings
+from utils.event_settings import SETTINGS_TABLE, is_wishes_locked, set_wishes_locked
+
+
+class APIError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    event_settings.invalidate_settings()
+    yield
+    event_settings.invalidate_settings()
+
+
+def failing_table(supabase, table, error):
+    real_table = supabase.table
+
+    def table_or_error(name):
+        if name == table:
+            raise error
+        return real_table(name)
+    supabase.table = table_or_error
+
+
+def test_lock_is_one_settings_row(supabase):
+    supabase.rows('users').extend([{'id': 1, 'wishes_locked': False}, {'id': 2, 'wishes_locked': False}])
+    set_wishes_locked(supabase, True)
+    assert supabase.rows(SETTINGS_TABLE)[0]['value'] is True
+    assert not any(user['wishes_locked'] for user in supabase.rows('users'))
+    assert is_wishes_locked(supabase)
+
+
+def test_fresh_read_skips_the_cache(supabase):
+    set_wishes_locked(supabase, False)
+    # Locked from another process
+    supabase.rows(SETTINGS_TABLE)[0]['value'] = True
+    assert not is_wishes_locked(supabase)
+    assert is_wishes_locked(supabase, max_age=0)
+
+
+def test_missing_table_falls_back_to_users_column(supabase):
+    supabase.rows('users').extend([{'id': 1, 'wishes_locked': False}, {'id': 2, 'wishes_locked': False}])
+    failing_table(supabase, SETTINGS_TABLE, APIError("Could not find the table", 'PGRST205'))
+    set_wishes_locked(supabase, True)
+    assert all(user['wishes_locked'] for user in supabase.rows('users'))
+    assert is_wishes_locked(supabase)
+
+
+def test_other_errors_are_not_hidden(supabase):
+    supabase.rows('users').append({'id': 1, 'wishes_locked': False})
+    failing_table(supabase, SETTINGS_TABLE, APIError("permission denied", '42501'))
+    with pytest.raises(APIError):
+        set_wishes_locked(supabase, True)
+    with pytest.raises(APIError):
+        is_wishes_locked(supabase)
+    assert supabase.rows('users')[0]['wishes_locked'] is False
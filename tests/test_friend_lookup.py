@@ -0,0 +1,50 @@
+import pytest
+
+from test_event_settings import APIError, failing_table
+from test_rendered_letters import add_users
+from utils.friend_lookup import FRIEND_CARDS_VIEW, FRIEND_COLUMNS, lookup_friend
+
+
+def friend_row(user):
+    return {column.strip(): user.get(column.strip()) for column in FRIEND_COLUMNS.split(',')}
+
+
+@pytest.fixture
+def db(supabase):
+    add_users(supabase, 3)
+    supabase.tables['secret_friends'] = [
+        {'user_id': 1, 'id_secret_friend': 2}, {'user_id': 2, 'id_secret_friend': 3},
+        {'user_id': 3, 'id_secret_friend': 1},
+    ]
+    users = {user['id']: user for user in supabase.rows('users')}
+    # What the secret_friend_cards view returns (utils/friend_lookup.sql)
+    supabase.tables[FRIEND_CARDS_VIEW] = [
+        dict(friend_row(users[row['id_secret_friend']]), santa_id=row['user_id'],
+             santa_character_name=users[row['user_id']]['character_name'], friend_id=row['id_secret_friend'])
+        for row in supabase.rows('secret_friends')
+    ]
+    supabase.requests.clear()
+    return supabase
+
+
+def test_view_reads_the_card_in_one_request(db):
+    card = lookup_friend(db, 'Personaje 1')
+    assert (card['santa_id'], card['friend_id'], card['friend_character_name']) == (1, 2, 'Personaje 2')
+    assert card['friend_deseo1'] == 'Deseo 2'
+    assert db.requests == [(FRIEND_CARDS_VIEW, 'select')]
+    assert lookup_friend(db, 'Nadie') is None
+
+
+@pytest.mark.parametrize('code', ['PGRST205', '42P01'])
+def test_missing_view_falls_back_to_the_sequential_lookup(db, code):
+    failing_table(db, FRIEND_CARDS_VIEW, APIError("relation does not exist", code))
+    card = lookup_friend(db, 'Personaje 3')
+    assert (card['santa_id'], card['friend_id'], card['friend_character_name']) == (3, 1, 'Personaje 1')
+    assert db.requests == [('users', 'select'), ('secret_friends', 'select'), ('users', 'select')]
+
+
+def test_other_view_errors_are_raised(db):
+    failing_table(db, FRIEND_CARDS_VIEW, APIError("column friend.deseo4 does not exist", '42703'))
+    with pytest.raises(APIError):
+        lookup_friend(db, 'Personaje 1')
+    assert db.requests == []
@@ -0,0 +1,32 @@
+from utils.group_draw import partition_by_group, run_group_draws
+
+
+def rows(count, groups):
+    return [{'id': i, 'grupo': f"grupo {i % groups}", 'pareja_id': i + 1 if i % 2 else i - 1}
+            for i in range(1, count + 1)]
+
+
+def check(outcome, users):
+    group_of = {row['id']: row['grupo'] for row in users}
+    friend_of = {row['user_id']: row['id_secret_friend'] for row in outcome['assignments']}
+    assert sorted(friend_of) == sorted(group_of)
+    assert sorted(friend_of.values()) == sorted(group_of)
+    for giver, receiver in friend_of.items():
+        assert giver != receiver
+        assert group_of[giver] == group_of[receiver]
+
+
+def test_small_groups_are_skipped():
+    users = rows(7, 3) + [{'id': 100, 'grupo': 'solo'}]
+    outcome = run_group_draws(users, max_workers=1)
+    assert outcome['skipped'] == ['solo']
+    assert outcome['groups'] == 3
+    check(outcome, [row for row in users if row['grupo'] != 'solo'])
+    assert set(partition_by_group(users)) == {'grupo 0', 'grupo 1', 'grupo 2', 'solo'}
+
+
+def test_process_pool_gives_valid_draws():
+    users = rows(600, 5)
+    outcome = run_group_draws(users, max_workers=2, pool_min_users=0)
+    assert outcome['errors'] == {}
+    check(outcome, users)
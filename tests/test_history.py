@@ -0,0 +1,61 @@
+import pytest
+
+from utils.history import HISTORY_TABLE, PairHistoryIndex, archive_assignments, load_history_index
+
+
+def archive_secret_friends(db, p_year, p_expected_rows=None):
+    """Python version of archive_secret_friends (utils/assignment_history.sql)."""
+    current = db.rows('secret_friends')
+    if p_expected_rows is not None and len(current) != p_expected_rows:
+        # The transaction is rolled back
+        raise RuntimeError(f"secret_friends has {len(current)} rows, expected {p_expected_rows}")
+    history = db.rows(HISTORY_TABLE)
+    history[:] = [row for row in history if row['year'] != p_year]
+    history.extend({'year': p_year, 'user_id': row['user_id'], 'id_secret_friend': row['id_secret_friend']}
+                   for row in current)
+    return len(current)
+
+
+@pytest.fixture
+def db(supabase):
+    supabase.functions['archive_secret_friends'] = archive_secret_friends
+    return supabase
+
+
+def draw(db, friend_of):
+    db.tables['secret_friends'] = [
+        {'user_id': santa, 'id_secret_friend': friend} for santa, friend in friend_of.items()
+    ]
+
+
+def pairs(db, year):
+    return {(row['user_id'], row['id_secret_friend']) for row in db.rows(HISTORY_TABLE) if row['year'] == year}
+
+
+def test_archive_replaces_only_its_year(db):
+    draw(db, {1: 2, 2: 1})
+    assert archive_assignments(db, 2024, expected_rows=2) == 2
+    draw(db, {1: 2, 2: 3, 3: 1})
+    archive_assignments(db, 2025, expected_rows=3)
+    draw(db, {1: 3, 3: 2, 2: 1})
+    archive_assignments(db, 2025, expected_rows=3)
+
+    assert pairs(db, 2024) == {(1, 2), (2, 1)}
+    assert pairs(db, 2025) == {(1, 3), (3, 2), (2, 1)}
+    index = load_history_index(db, 2026, years_back=1)
+    assert len(index) == 3 and index.contains(1, 3) and not index.contains(1, 2)
+
+
+def test_failed_archive_keeps_the_previous_one(db):
+    draw(db, {1: 2, 2: 1})
+    archive_assignments(db, 2025)
+    draw(db, {1: 2, 2: 3, 3: 1})
+    with pytest.raises(RuntimeError):
+        archive_assignments(db, 2025, expected_rows=4)
+    assert pairs(db, 2025) == {(1, 2), (2, 1)}
+
+
+def test_index_packs_pairs_per_direction():
+    index = PairHistoryIndex.from_rows([{'user_id': 1, 'id_secret_friend': 2}])
+    assert index.contains(1, 2)
+    assert not index.contains(2, 1)
@@ -0,0 +1,156 @@
+import random
+
+import pytest
+
+from utils.derangement import MODE_CYCLE, MODE_UNIFORM
+from utils.incremental_draw import apply_incremental_draw, plan_incremental_draw
+from utils.matching import ExclusionRules, solve_assignment
+
+
+def apply_incremental_draw_rpc(db, p_deletes, p_upserts, p_year=None):
+    """Python version of apply_incremental_draw (utils/incremental_draw.sql)."""
+    def write(table, rows, key):
+        table[:] = [row for row in table if row['user_id'] not in p_deletes]
+        by_key = {key(row): row for row in table}
+        for row in rows:
+            if key(row) in by_key:
+                by_key[key(row)].update(row)
+            else:
+                table.append(dict(row))
+
+    write(db.rows('secret_friends'), p_upserts, lambda row: row['user_id'])
+    if p_year is not None:
+        history = db.rows('secret_friends_history')
+        others = [row for row in history if row['year'] != p_year]
+        history[:] = [row for row in history if row['year'] == p_year]
+        write(history, [dict(row, year=p_year) for row in p_upserts], lambda row: row['user_id'])
+        history.extend(others)
+    return len(p_upserts)
+
+
+def ring(ids):
+    return {ids[k]: ids[(k + 1) % len(ids)] for k in range(len(ids))}
+
+
+def apply(current, plan):
+    result = {giver: friend for giver, friend in current.items() if giver not in plan['deletes']}
+    result.update({row['user_id']: row['id_secret_friend'] for row in plan['upserts']})
+    return result
+
+
+def assert_valid(friend_of, ids, rules=None):
+    assert sorted(friend_of) == sorted(ids)
+    assert sorted(friend_of.values()) == sorted(ids)
+    assert all(giver != friend for giver, friend in friend_of.items())
+    if rules is not None:
+        assert all(rules.is_allowed(giver, friend) for giver, friend in friend_of.items())
+
+
+def cycle_count(friend_of):
+    seen, cycles = set(), 0
+    for start in friend_of:
+        if start in seen:
+            continue
+        cycles += 1
+        user_id = start
+        while user_id not in seen:
+            seen.add(user_id)
+            user_id = friend_of[user_id]
+    return cycles
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_plan_only_writes_the_broken_links(seed):
+    current = ring(list(range(1, 21)))
+    removed = {4, 11}
+    added = [21, 22, 23]
+    ids = [u for u in range(1, 21) if u not in removed] + added
+    plan = plan_incremental_draw(current, ids, rng=random.Random(seed))
+
+    assert sorted(plan['deletes']) == sorted(removed)
+    # The givers of withdrawn users, the new users and one splice point each
+    broken = {giver for giver, friend in current.items() if friend in removed and giver not in removed}
+    written = {row['user_id'] for row in plan['upserts']}
+    assert broken | set(added) <= written
+    assert len(written - broken - set(added)) <= len(added)
+    new_draw = apply(current, plan)
+    assert_valid(new_draw, ids)
+    assert all(new_draw[giver] == friend for giver, friend in current.items()
+               if giver not in written and giver not in removed)
+
+
+@pytest.mark.parametrize('mode', [MODE_CYCLE, MODE_UNIFORM])
+def test_newcomers_join_the_existing_cycles(mode):
+    ids = list(range(1, 101))
+    for seed in range(200):
+        rng = random.Random(seed)
+        current = solve_assignment(ids, mode=mode, rng=rng)
+        plan = plan_incremental_draw(current, ids[3:] + [101, 102, 103], rng=rng)
+        new_draw = apply(current, plan)
+        assert_valid(new_draw, ids[3:] + [101, 102, 103])
+        # Newcomers never close a sub-ring of their own
+        assert all(cycle_members(new_draw, u) - {101, 102, 103} for u in (101, 102, 103))
+        assert cycle_count(new_draw) <= cycle_count(current)
+        if mode == MODE_CYCLE:
+            assert cycle_count(new_draw) == 1
+
+
+def cycle_members(friend_of, start):
+    members, user_id = set(), start
+    while user_id not in members:
+        members.add(user_id)
+        user_id = friend_of[user_id]
+    return members
+
+
+def test_first_incremental_draw_is_a_single_ring():
+    for seed in range(20):
+        plan = plan_incremental_draw({}, [1, 2, 3, 4, 5], rng=random.Random(seed))
+        new_draw = apply({}, plan)
+        assert_valid(new_draw, [1, 2, 3, 4, 5])
+        assert cycle_count(new_draw) == 1
+
+
+def test_plan_with_rules_changes_few_existing_links():
+    current = ring(list(range(1, 31)))
+    ids = list(range(1, 31)) + [31, 32]
+    rules = ExclusionRules()
+    rules.add_couple(31, 32)
+    for user_id in range(1, 31, 2):
+        rules.forbid(31, user_id)
+    for seed in range(20):
+        plan = plan_incremental_draw(current, ids, rules, rng=random.Random(seed))
+        assert plan['deletes'] == []
+        new_draw = apply(current, plan)
+        assert_valid(new_draw, ids, rules)
+        changed = [giver for giver in current if new_draw[giver] != current[giver]]
+        assert len(changed) <= 2
+
+
+def test_unchanged_group_needs_no_writes():
+    current = ring([1, 2, 3, 4])
+    assert plan_incremental_draw(current, [1, 2, 3, 4]) == {'upserts': [], 'deletes': []}
+
+
+def test_apply_writes_the_plan_in_one_request(supabase):
+    supabase.functions['apply_incremental_draw'] = apply_incremental_draw_rpc
+    current = ring([1, 2, 3, 4, 5])
+    supabase.tables['secret_friends'] = [
+        {'user_id': giver, 'id_secret_friend': friend} for giver, friend in current.items()
+    ]
+    supabase.tables['secret_friends_history'] = [
+        dict(row, year=2025) for row in supabase.rows('secret_friends')
+    ] + [{'year': 2024, 'user_id': 3, 'id_secret_friend': 1}]
+    ids = [1, 2, 4, 5, 6]
+    plan = plan_incremental_draw(current, ids, rng=random.Random(0))
+    supabase.requests.clear()
+
+    apply_incremental_draw(supabase, plan, year=2025)
+    assert len(supabase.requests) == 1
+    new_draw = {row['user_id']: row['id_secret_friend'] for row in supabase.rows('secret_friends')}
+    assert new_draw == apply(current, plan)
+    assert_valid(new_draw, ids)
+    archived = {row['user_id']: row['id_secret_friend'] for row in supabase.rows('secret_friends_history')
+                if row['year'] == 2025}
+    assert archived == new_draw
+    assert {'year': 2024, 'user_id': 3, 'id_secret_friend': 1} in supabase.rows('secret_friends_history')
@@ -0,0 +1,63 @@
+import pytest
+
+from test_rendered_letters import add_users
+from utils.letter_data import fetch_letter_data
+
+
+def per_user_letters(db):
+    """The previous path: two user lookups per assignment."""
+    letters = []
+    for row in db.table('secret_friends').select('user_id, id_secret_friend').execute().data:
+        santa = db.table('users').select('email, character_name, nombre').eq('id', row['user_id']).execute().data
+        if not santa or not santa[0].get('email'):
+            continue
+        friend = db.table('users').select(
+            'character_name, deseo1, link_deseo1, deseo2, link_deseo2, deseo3, link_deseo3, comentarios_generales'
+        ).eq('id', row['id_secret_friend']).execute().data
+        if not friend:
+            continue
+        friend = friend[0]
+        letters.append({
+            'user_id': row['user_id'],
+            'friend_id': row['id_secret_friend'],
+            'to_email': santa[0]['email'],
+            'santa_name': santa[0].get('character_name') or santa[0].get('nombre', ''),
+            'friend_info': {f"friend_{column}": friend.get(column, '') for column in friend},
+        })
+    return letters
+
+
+def ring(db, count):
+    db.tables['secret_friends'] = [
+        {'user_id': i, 'id_secret_friend': i % count + 1} for i in range(1, count + 1)
+    ]
+
+
+@pytest.mark.parametrize('count', [20, 200])
+def test_query_count_does_not_grow_with_the_group(supabase, count):
+    add_users(supabase, count)
+    ring(supabase, count)
+    supabase.requests.clear()
+    data = fetch_letter_data(supabase, page_size=1000)
+    assert len(data['letters']) == count
+    # One page of users and one of assignments, each closed by an empty page
+    assert data['queries'] == 4
+    assert len(supabase.requests) == 4
+
+
+def test_same_letters_as_the_per_user_path(supabase):
+    add_users(supabase, 6)
+    ring(supabase, 6)
+    users = supabase.rows('users')
+    users[1]['email'] = ''
+    users[3]['character_name'] = None
+    # A friend that no longer exists
+    supabase.rows('secret_friends').append({'user_id': 5, 'id_secret_friend': 99})
+    supabase.rows('secret_friends').sort(key=lambda row: (row['user_id'], row['id_secret_friend']))
+
+    data = fetch_letter_data(supabase, page_size=4)
+    expected = per_user_letters(supabase)
+    key = lambda letter: (letter['user_id'], letter['friend_id'])
+    assert sorted(data['letters'], key=key) == sorted(expected, key=key)
+    assert data['skipped'] == 2
+    assert any(letter['santa_name'] == 'Nombre 4' for letter in data['letters'])
@@ -0,0 +1,36 @@
+from utils.letter_template import CompiledTemplate, render_letter_email, render_letter_html
+
+
+def test_fill_and_render():
+    template = CompiledTemplate("<p style='width:100%'>{name} pide {wish}</p>")
+    assert template.fields == ('name', 'wish')
+    assert template.fill('Bart', 'un monopatín') == "<p style='width:100%'>Bart pide un monopatín</p>"
+    assert template.render({'wish': 'x', 'name': 'Lisa'}) == "<p style='width:100%'>Lisa pide x</p>"
+
+
+def test_repeated_field_and_values_with_format_characters():
+    template = CompiledTemplate("{a}-{b}-{a}")
+    assert template.fields == ('a', 'b')
+    assert template.fill('%s', '{0}') == "%s-{0}-%s"
+
+
+def test_letter_escapes_user_text():
+    friend = {
+        'friend_character_name': 'Bart <b>',
+        'friend_deseo1': 'Monopatín & casco',
+        'friend_link_deseo1': 'javascript:alert(1)',
+        'friend_deseo2': 'Libro',
+        'friend_link_deseo2': 'https://example.com/libro?a=1&b=2',
+        'friend_deseo3': 'SIN DESEO',
+        'friend_comentarios_generales': 'Talla M\nColor azul',
+    }
+    html = render_letter_html('Homer', friend)
+    assert 'Bart &lt;b&gt;' in html
+    assert 'Monopatín &amp; casco' in html
+    assert 'javascript:' not in html
+    assert "href='https://example.com/libro?a=1&amp;b=2'" in html
+    assert 'Talla M<br>Color azul' in html
+    assert 'deseo #3' not in html
+    email = render_letter_email('Homer', friend)
+    assert email['subject'].endswith('Bart <b>')
+    assert 'Tu Amigo Secreto es: Bart <b>.' in email['text_body']
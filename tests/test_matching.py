@@ -0,0 +1,93 @@
+import random
+
+import pytest
+
+from utils.derangement import MODE_CYCLE, MODE_UNIFORM
+from utils.history import PairHistoryIndex
+from utils.matching import (
+    ExclusionRules, NoCycleFoundError, NoValidAssignmentError, solve_assignment, solve_with_history_fallback,
+)
+
+
+def pairs_only_rules():
+    """Rules where 1 and 2 may only draw each other, and so may 3 and 4."""
+    rules = ExclusionRules()
+    for giver, receiver in ((1, 3), (1, 4), (2, 3), (2, 4)):
+        rules.forbid(giver, receiver, symmetric=True)
+    return rules
+
+
+def assert_valid(friend_of, ids, rules):
+    assert sorted(friend_of) == sorted(ids)
+    assert sorted(friend_of.values()) == sorted(ids)
+    assert all(rules.is_allowed(giver, receiver) for giver, receiver in friend_of.items())
+
+
+@pytest.mark.parametrize('mode', [MODE_UNIFORM, MODE_CYCLE])
+def test_couples_and_teams_are_respected(mode):
+    ids = list(range(1, 13))
+    rules = ExclusionRules()
+    for a in range(1, 13, 2):
+        rules.add_couple(a, a + 1)
+    for user_id in ids:
+        rules.set_team(user_id, user_id % 3)
+    for seed in range(50):
+        assert_valid(solve_assignment(ids, rules, mode=mode, rng=random.Random(seed)), ids, rules)
+
+
+def test_infeasible_rules_raise():
+    # Two of three people on one team both need the third one as their friend
+    rules = ExclusionRules()
+    rules.set_team(1, 'a')
+    rules.set_team(2, 'a')
+    with pytest.raises(NoValidAssignmentError) as error:
+        solve_assignment([1, 2, 3], rules, rng=random.Random(0))
+    assert not isinstance(error.value, NoCycleFoundError)
+
+
+def test_uniform_draw_exists_when_no_ring_does():
+    ids = [1, 2, 3, 4]
+    rules = pairs_only_rules()
+    assert solve_assignment(ids, rules, mode=MODE_UNIFORM, rng=random.Random(0)) == {1: 2, 2: 1, 3: 4, 4: 3}
+    with pytest.raises(NoCycleFoundError, match="uniform"):
+        solve_assignment(ids, rules, mode=MODE_CYCLE, rng=random.Random(0))
+
+
+def test_team_over_half_the_group_is_reported_at_once():
+    ids = list(range(1, 50_001))
+    rules = ExclusionRules()
+    for user_id in ids[:25_001]:
+        rules.set_team(user_id, 'a')
+    for mode in (MODE_UNIFORM, MODE_CYCLE):
+        with pytest.raises(NoValidAssignmentError, match="team 'a'"):
+            solve_assignment(ids, rules, mode=mode, rng=random.Random(0))
+
+
+def test_team_of_exactly_half_the_group_is_solved():
+    ids = list(range(1, 4_001))
+    rules = ExclusionRules()
+    for user_id in ids[:2_000]:
+        rules.set_team(user_id, 'a')
+    for a in range(2_001, 4_001, 2):
+        rules.add_couple(a, a + 1)
+    assert_valid(solve_assignment(ids, rules, rng=random.Random(0)), ids, rules)
+
+
+def test_history_is_dropped_when_it_makes_the_draw_impossible():
+    history = PairHistoryIndex()
+    history.add(1, 2)
+    rules = ExclusionRules(history)
+    warnings = []
+    friend_of = solve_with_history_fallback(lambda: solve_assignment([1, 2], rules), rules, warnings)
+    assert friend_of == {1: 2, 2: 1}
+    assert rules.history is None
+    assert len(warnings) == 1
+
+
+def test_impossible_rules_without_history_still_raise():
+    rules = ExclusionRules()
+    rules.add_couple(1, 2)
+    warnings = []
+    with pytest.raises(NoValidAssignmentError):
+        solve_with_history_fallback(lambda: solve_assignment([1, 2], rules), rules, warnings)
+    assert warnings == []
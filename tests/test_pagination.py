@@ -0,0 +1,45 @@
+import pytest
+
+import fake_supabase
+from utils.pagination import iter_rows, iter_user_ids, iter_users
+
+
+@pytest.fixture
+def db(supabase):
+    # Ids with gaps, inserted out of order
+    for user_id in (9, 2, 14, 5, 7, 1, 12):
+        supabase.rows('users').append({'id': user_id, 'nombre': f"Nombre {user_id}", 'grupo': user_id % 2})
+    return supabase
+
+
+def test_pages_follow_the_key_across_boundaries(db):
+    stats = {}
+    rows = list(iter_users(db, 'nombre', page_size=3, stats=stats))
+    assert [row['id'] for row in rows] == [1, 2, 5, 7, 9, 12, 14]
+    assert rows[0] == {'nombre': 'Nombre 1', 'id': 1}
+    # Three pages, the last one short, plus the empty page that ends paging
+    assert stats['queries'] == 4
+
+
+def test_exact_multiple_of_the_page_size(db):
+    stats = {}
+    assert list(iter_user_ids(db, page_size=7)) == [1, 2, 5, 7, 9, 12, 14]
+    assert len(list(iter_rows(db, 'users', 'id', page_size=7, stats=stats))) == 7
+    assert stats['queries'] == 2
+
+
+def test_empty_table_is_one_request(supabase):
+    stats = {}
+    assert list(iter_rows(supabase, 'secret_friends', 'user_id', key='user_id', stats=stats)) == []
+    assert stats['queries'] == 1
+
+
+def test_filters_apply_to_every_page(db):
+    rows = iter_users(db, 'id', page_size=2, filters=[('eq', 'grupo', 1)])
+    assert [row['id'] for row in rows] == [1, 5, 7, 9]
+
+
+def test_server_row_limit_below_the_page_size(db, monkeypatch):
+    limit = fake_supabase.Query.limit
+    monkeypatch.setattr(fake_supabase.Query, 'limit', lambda self, count: limit(self, min(count, 2)))
+    assert list(iter_user_ids(db, page_size=1000)) == [1, 2, 5, 7, 9, 12, 14]
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from utils.query_cache import TTLCache
+
+
+def test_hit_expiry_and_lru_eviction():
+    cache = TTLCache(max_entries=2, ttl={'a': 60, 'b': 0})
+    calls = []
+
+    def loader(value):
+        return lambda: calls.append(value) or value
+
+    assert cache.get('a', 1, loader('uno')) == 'uno'
+    assert cache.get('a', 1, loader('otro')) == 'uno'
+    cache.get('b', 1, loader('caduca'))
+    assert cache.get('b', 1, loader('nuevo')) == 'nuevo'
+    cache.get('a', 2, loader('dos'))
+    cache.get('a', 3, loader('tres'))
+    assert cache.stats()['a']['size'] == 2
+    assert cache.get('a', 1, loader('recargado')) == 'recargado'
+    assert calls == ['uno', 'caduca', 'nuevo', 'dos', 'tres', 'recargado']
+
+
+def test_none_is_not_cached():
+    cache = TTLCache()
+    assert cache.get('a', 1, lambda: None) is None
+    assert cache.get('a', 1, lambda: 'creado') == 'creado'
+
+
+def test_load_started_before_invalidation_is_not_cached():
+    cache = TTLCache()
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        loading.set()
+        release.wait(5)
+        return 'antiguo'
+
+    reader = threading.Thread(target=cache.get, args=('a', 1, slow_loader))
+    reader.start()
+    loading.wait(5)
+    cache.invalidate('a', 1)
+    release.set()
+    reader.join(5)
+    assert cache.get('a', 1, lambda: 'nuevo') == 'nuevo'
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache()
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'valor'
+
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(cache.get('a', 1, slow_loader)))
+               for _ in range(8)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join(5)
+    assert results == ['valor'] * 8
+    assert len(calls) == 1
+    stats = cache.stats()['a']
+    assert stats['misses'] == 1 and stats['coalesced'] + stats['hits'] == 7
+
+
+def test_waiting_readers_get_the_loader_error():
+    cache = TTLCache()
+    started = threading.Event()
+    errors = []
+
+    def failing_loader():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError('sin conexión')
+
+    def read():
+        try:
+            cache.get('a', 1, failing_loader)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    first = threading.Thread(target=read)
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=read)
+    second.start()
+    first.join(5)
+    second.join(5)
+    assert errors == ['sin conexión'] * 2
+    assert cache.get('a', 1, lambda: 'ok') == 'ok'
@@ -0,0 +1,45 @@
+from utils.letter_data import build_friend_info
+from utils.recipient_plan import email_domain, plan_recipients
+
+
+def letter(user_id, to_email, friend='Bart'):
+    return {
+        'user_id': user_id,
+        'friend_id': user_id + 100,
+        'to_email': to_email,
+        'santa_name': f"Santa {user_id}",
+        'friend_info': build_friend_info({'character_name': friend, 'deseo1': 'Patinete'}),
+    }
+
+
+def test_letters_to_the_same_address_are_merged():
+    plan = plan_recipients([
+        letter(3, 'Familia@Example.com '),
+        letter(1, 'familia@example.com', friend='Lisa'),
+        letter(2, 'otro@example.org'),
+    ])
+    assert plan['letters'] == 3
+    assert plan['merged'] == 1
+    merged = next(message for message in plan['messages'] if len(message['user_ids']) == 2)
+    assert merged['user_ids'] == [1, 3]
+    assert merged['key'] == 1
+    assert merged['to_email'] == 'familia@example.com'
+    assert '2 cartas' in merged['subject']
+    assert 'Lisa' in merged['text_body'] and 'Bart' in merged['text_body']
+
+
+def test_messages_are_grouped_by_domain_largest_first():
+    plan = plan_recipients([
+        letter(1, 'a@pequeno.es'),
+        letter(2, 'b@grande.com'),
+        letter(3, 'c@GRANDE.com'),
+        letter(4, 'd@grande.com'),
+    ])
+    assert plan['domains'] == {'grande.com': 3, 'pequeno.es': 1}
+    assert [email_domain(message) for message in plan['messages']] == ['grande.com'] * 3 + ['pequeno.es']
+
+
+def test_stored_letter_is_reused():
+    stored = dict(letter(1, 'a@example.com'), subject='Asunto', html_body='<p>guardada</p>', text_body='guardada')
+    message = plan_recipients([stored])['messages'][0]
+    assert (message['subject'], message['html_body'], message['text_body']) == ('Asunto', '<p>guardada</p>', 'guardada')
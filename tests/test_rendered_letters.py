@@ -0,0 +1,83 @@
+from utils import rendered_letters
+from utils.rendered_letters import (
+    RENDERED_TABLE, get_letter, load_stored_letters, render_all_letters, render_changed_letters,
+)
+
+
+def add_users(db, count):
+    for i in range(1, count + 1):
+        db.table('users').insert({
+            'nombre': f"Nombre {i}", 'email': f"santa{i}@example.com", 'character_name': f"Personaje {i}",
+            'deseo1': f"Deseo {i}", 'link_deseo1': '', 'deseo2': '', 'link_deseo2': '',
+            'deseo3': '', 'link_deseo3': '', 'comentarios_generales': '',
+        }).execute()
+
+
+def assign(db, friend_of):
+    db.tables['secret_friends'] = [
+        {'user_id': santa, 'id_secret_friend': friend} for santa, friend in friend_of.items()
+    ]
+
+
+def test_letter_of_a_previous_draw_is_not_served(supabase):
+    add_users(supabase, 3)
+    assign(supabase, {1: 2, 2: 3, 3: 1})
+    render_all_letters(supabase, 'draw-1')
+    assert get_letter(supabase, 1, 2)['friend_name'] == 'Personaje 2'
+
+    # New assignments saved, letters not rendered again yet
+    assign(supabase, {1: 3, 3: 2, 2: 1})
+    assert get_letter(supabase, 1, 3) is None
+    data = load_stored_letters(supabase)
+    assert data['outdated'] == 3
+    assert data['letters'] == []
+
+    render_all_letters(supabase, 'draw-2')
+    data = load_stored_letters(supabase)
+    assert data['outdated'] == 0
+    assert {(letter['user_id'], letter['friend_id']) for letter in data['letters']} == {(1, 3), (3, 2), (2, 1)}
+
+
+def test_stale_letter_uses_current_santa_and_friend(supabase):
+    add_users(supabase, 2)
+    assign(supabase, {1: 2, 2: 1})
+    render_all_letters(supabase, 'draw-1')
+    users = supabase.rows('users')
+    users[0]['email'] = 'nuevo@example.com'
+    users[1]['character_name'] = 'Otro personaje'
+    # What the users trigger of utils/rendered_letters.sql does
+    for row in supabase.rows(RENDERED_TABLE):
+        row['stale'] = True
+
+    letter = get_letter(supabase, 1, 2)
+    assert letter['to_email'] == 'nuevo@example.com'
+    assert letter['friend_name'] == 'Otro personaje'
+    assert not letter['stale']
+
+
+def test_wishes_edit_marks_the_santa_letter_stale(supabase):
+    add_users(supabase, 2)
+    assign(supabase, {1: 2, 2: 1})
+    render_all_letters(supabase, 'draw-1')
+    rendered_letters.mark_letters_stale(supabase, 2)
+    stale = {row['user_id']: row['stale'] for row in supabase.rows(RENDERED_TABLE)}
+    assert stale == {1: True, 2: False}
+
+
+def test_incremental_draw_only_renders_the_changed_letters(supabase):
+    add_users(supabase, 4)
+    assign(supabase, {1: 2, 2: 3, 3: 4, 4: 1})
+    render_all_letters(supabase, 'draw-1')
+    # User 4 withdraws: 3 now draws 1
+    assign(supabase, {1: 2, 2: 3, 3: 1})
+    supabase.requests.clear()
+
+    result = render_changed_letters(supabase, {'upserts': [{'user_id': 3, 'id_secret_friend': 1}],
+                                               'deletes': [4]})
+    assert result['rendered'] == 1 and result['removed'] == 1
+    assert ('users', 'select') in supabase.requests
+    assert (RENDERED_TABLE, 'select') not in supabase.requests
+    versions = {row['user_id']: row['draw_version'] for row in supabase.rows(RENDERED_TABLE)}
+    assert versions == {1: 'draw-1', 2: 'draw-1', 3: result['draw_version']}
+    assert get_letter(supabase, 3, 1)['friend_name'] == 'Personaje 1'
+    assert load_stored_letters(supabase)['outdated'] == 0
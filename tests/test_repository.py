@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from utils import repository, stats_service
+from utils.repository import Repository, SQLiteRepository
+
+
+def user(i):
+    return {
+        'nombre': f"Nombre {i}", 'email': f"santa{i}@example.com", 'deseo1': 'Patinete', 'link_deseo1': '',
+        'imagen_deseo1': '', 'deseo2': 'Libro', 'link_deseo2': '', 'imagen_deseo2': '', 'deseo3': '',
+        'link_deseo3': '', 'imagen_deseo3': '', 'comentarios_generales': '',
+        'character_name': f"Personaje {i}", 'character_photo_url': '', 'password': f"clave{i}",
+    }
+
+
+@pytest.fixture
+def repo():
+    repo = SQLiteRepository()
+    repo.insert_users([user(i) for i in range(1, 4)])
+    repo.replace_assignments([{'user_id': 1, 'id_secret_friend': 2}, {'user_id': 2, 'id_secret_friend': 3},
+                              {'user_id': 3, 'id_secret_friend': 1}])
+    return repo
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Partial(Repository):
+        def find_admin(self, username, password):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_login_and_friend_card(repo):
+    assert repo.find_user_login('personaje 1', 'clave1')['id'] == 1
+    assert repo.find_user_login('Personaje 1', 'otra') is None
+    card = repo.friend_card('Personaje 1')
+    assert (card['santa_id'], card['friend_id'], card['friend_character_name']) == (1, 2, 'Personaje 2')
+    assert card['friend_deseo3'] == 'SIN DESEO'
+
+
+def test_update_wishes_only_changes_given_columns(repo):
+    profile = repo.update_wishes('Personaje 1', {'deseo1': 'Bicicleta', 'password': 'no'})
+    assert profile['deseo1'] == 'Bicicleta' and profile['deseo2'] == 'Libro'
+    assert repo.find_user_login('Personaje 1', 'clave1') is not None
+    assert repo.update_wishes('Personaje 1', {'password': 'no'})['deseo1'] == 'Bicicleta'
+    assert repo.update_wishes('Nadie', {'deseo1': 'x'}) is None
+
+
+def test_wishes_lock(repo):
+    assert not repo.is_wishes_locked()
+    repo.set_wishes_locked(True)
+    assert repo.is_wishes_locked(max_age=0)
+
+
+def test_shared_repository_is_created_once(monkeypatch):
+    monkeypatch.setattr(repository, '_repository', None)
+    created = []
+
+    def create():
+        created.append(1)
+        return SQLiteRepository()
+    monkeypatch.setattr(repository, 'create_repository', create)
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(repository.get_repository())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(repo is seen[0] for repo in seen)
+
+
+def test_admin_stats_and_lock_run_on_sqlite(repo):
+    stats_service.invalidate_stats()
+    stats = stats_service.get_stats(repo, max_age=0)
+    assert (stats['total_users'], stats['total_assignments'], stats['wishes_locked']) == (3, 3, False)
+    repo.set_wishes_locked(True)
+    assert stats_service.get_stats(repo, max_age=60)['wishes_locked'] is False
+    stats_service.invalidate_stats()
+    assert stats_service.get_stats(repo)['wishes_locked'] is True
@@ -0,0 +1,27 @@
+from utils.matching import ExclusionRules
+from utils.seeded_draw import SeededDraw, new_seeded_draw, verify_seeded_draw
+
+
+def test_ring_is_rebuilt_from_seed_and_participants():
+    draw = new_seeded_draw(range(1, 50))
+    copy = SeededDraw(draw.seed, draw.participants)
+    assert copy.assignments() == draw.assignments()
+    assert verify_seeded_draw(copy)['ok']
+
+
+def test_from_ring_keeps_the_ring():
+    ring = [5, 3, 9, 1, 7]
+    draw = SeededDraw.from_ring('semilla', ring)
+    assert draw.ring() == ring
+    assert [draw.friend_of(user_id) for user_id in ring] == [3, 9, 1, 7, 5]
+
+
+def test_rules_are_respected_without_seed_retries():
+    # Teams of 5 over 60 people: a random ring almost never avoids them all
+    rows = [{'id': i, 'equipo': f"equipo {i % 12}", 'pareja_id': i + 1 if i % 2 else i - 1}
+            for i in range(1, 61)]
+    rules = ExclusionRules.from_user_rows(rows)
+    draw = new_seeded_draw([row['id'] for row in rows], rules)
+    report = verify_seeded_draw(draw, rules)
+    assert report['ok'] and report['participants'] == 60
+    assert SeededDraw(draw.seed, draw.participants).ring() == draw.ring()
@@ -0,0 +1,40 @@
+import pytest
+
+from test_event_settings import APIError
+from utils.stats_service import read_stats
+
+
+def add_rows(supabase):
+    supabase.rows('users').extend({'id': i} for i in range(1, 4))
+    supabase.rows('secret_friends').extend({'user_id': i, 'id_secret_friend': i % 3 + 1} for i in range(1, 4))
+
+
+def raising(error):
+    def function(db):
+        raise error
+    return function
+
+
+def test_counters_come_from_one_rpc(supabase):
+    supabase.functions['event_stats'] = lambda db: [
+        {'total_users': 10, 'total_assignments': 8, 'wishes_locked': True}
+    ]
+    assert read_stats(supabase) == {'total_users': 10, 'total_assignments': 8, 'wishes_locked': True}
+    assert supabase.requests == [('rpc', 'event_stats')]
+
+
+@pytest.mark.parametrize('code', ['PGRST202', '42883', 'PGRST205'])
+def test_missing_function_falls_back_to_counts(supabase, code):
+    add_rows(supabase)
+    supabase.functions['event_stats'] = raising(APIError("function not found", code))
+    stats = read_stats(supabase)
+    assert (stats['total_users'], stats['total_assignments']) == (3, 3)
+    assert ('users', 'select') in supabase.requests
+
+
+def test_other_errors_are_not_hidden(supabase):
+    add_rows(supabase)
+    supabase.functions['event_stats'] = raising(APIError("permission denied for function event_stats", '42501'))
+    with pytest.raises(APIError):
+        read_stats(supabase)
+    assert supabase.requests == [('rpc', 'event_stats')]
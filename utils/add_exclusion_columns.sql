@@ -0,0 +1,8 @@
+-- Add exclusion rule columns to users table
+-- pareja_id: partner of the user (partners never draw each other)
+-- equipo: team label (people on the same team never draw each other)
+ALTER TABLE "secret-santa".users
+ADD COLUMN IF NOT EXISTS pareja_id INT REFERENCES "secret-santa".users(id) ON DELETE SET NULL;
+
+ALTER TABLE "secret-santa".users
+ADD COLUMN IF NOT EXISTS equipo VARCHAR(100);
@@ -0,0 +1,6 @@
+-- Add group column to users table
+-- Each group (office, family, department...) runs its own independent draw.
+ALTER TABLE "secret-santa".users
+ADD COLUMN IF NOT EXISTS grupo VARCHAR(100);
+
+CREATE INDEX IF NOT EXISTS idx_users_grupo ON "secret-santa".users(grupo);
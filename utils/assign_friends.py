@@ -1,4 +1,3 @@
-import random
 import os
 import sys
 from dotenv import load_dotenv
@@ -6,64 +5,14 @@ from dotenv import load_dotenv
 # Add parent directory to path to import utils
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from utils.supabase_client import get_supabase_client
+from utils.derangement import MODE_UNIFORM, DRAW_MODES
+from utils.draw_service import run_draw
+from utils.seeded_draw import MODE_SEEDED
 
 # Load environment variables
 load_dotenv()
 
-def fetch_user_ids(supabase):
-    """Obtener todos los IDs de los usuarios de la tabla users."""
-    try:
-        response = supabase.table('users').select('id').execute()
-        if response.data:
-            return [row['id'] for row in response.data]
-        return []
-    except Exception as e:
-        print(f"Error al obtener los IDs de usuarios: {e}")
-        return []
-
-def assign_secret_friends(user_ids):
-    """
-    Asignar un amigo secreto a cada usuario.
-    Garantiza que nadie se asigne a sí mismo.
-    """
-    if len(user_ids) < 2:
-        print("No hay suficientes usuarios para realizar el sorteo.")
-        return []
-        
-    assigned_ids = user_ids[:]
-    while True:
-        random.shuffle(assigned_ids)  # Mezclar aleatoriamente
-        # Verificar que ningún usuario sea su propio amigo secreto
-        if all(user_id != assigned_id for user_id, assigned_id in zip(user_ids, assigned_ids)):
-            break
-    
-    # Create list of dictionaries for Supabase insert
-    assignments = [
-        {"user_id": uid, "id_secret_friend": aid} 
-        for uid, aid in zip(user_ids, assigned_ids)
-    ]
-    return assignments
-
-def save_assignments_to_db(supabase, assignments):
-    """
-    Guardar las asignaciones de amigo secreto en la tabla secret_friends.
-    """
-    try:
-        # Limpiar la tabla antes de insertar nuevos datos
-        # Delete all rows where user_id is greater than -1 (effectively all rows)
-        supabase.table('secret_friends').delete().gt('user_id', -1).execute()
-        
-        # Insertar asignaciones
-        if assignments:
-            response = supabase.table('secret_friends').insert(assignments).execute()
-            if response.data:
-                print("Asignaciones de amigo secreto guardadas exitosamente.")
-            else:
-                print("No se pudieron guardar las asignaciones.")
-    except Exception as e:
-        print(f"Error al guardar las asignaciones en la base de datos: {e}")
-
-def main():
+def main(mode=MODE_UNIFORM, incremental=False, by_group=None):
     # Get Supabase client
     try:
         supabase = get_supabase_client()
@@ -71,18 +20,30 @@ def main():
         print(f"Error connecting to Supabase: {e}")
         return
 
-    # Obtener los IDs de los usuarios
-    user_ids = fetch_user_ids(supabase)
-    if not user_ids:
-        print("No se encontraron usuarios en la base de datos.")
-        return
-
-    # Asignar amigos secretos
-    assignments = assign_secret_friends(user_ids)
+    # Realizar el sorteo (ver utils/draw_service.py)
+    result = run_draw(supabase, mode=mode, incremental=incremental, by_group=by_group)
+    for warning in result['warnings']:
+        print(warning)
+    if not result['ok']:
+        print(result['error'], file=sys.stderr)
+        sys.exit(1)
 
-    # Guardar las asignaciones en la base de datos
-    if assignments:
-        save_assignments_to_db(supabase, assignments)
+    print(
+        f"Sorteo completado: {result['users']} participantes, "
+        f"{result['rows_written']} asignaciones guardadas, "
+        f"{result['rows_deleted']} eliminadas ({result['timings']['total']:.2f} s)."
+    )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sorteo de amigo secreto")
+    parser.add_argument("--mode", choices=DRAW_MODES + (MODE_SEEDED,), default=MODE_UNIFORM,
+                        help="uniform: asignación uniforme; cycle: una sola cadena de regalos; "
+                             "seeded: cadena calculada a partir de una semilla")
+    parser.add_argument("--incremental", action="store_true",
+                        help="añadir nuevos usuarios y quitar retirados sin rehacer el sorteo")
+    parser.add_argument("--by-group", action="store_true", default=None,
+                        help="sortear cada grupo por separado (en paralelo)")
+    args = parser.parse_args()
+    main(mode=args.mode, incremental=args.incremental, by_group=args.by_group)
@@ -0,0 +1,43 @@
+-- Per-year archive of Secret Santa assignments
+-- secret_friends only holds the current draw; every draw is also archived
+-- here so the next years can avoid repeating pairings.
+CREATE TABLE IF NOT EXISTS "secret-santa".secret_friends_history (
+    year INT NOT NULL,
+    user_id INT NOT NULL,
+    id_secret_friend INT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (year, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_secret_friends_history_year ON "secret-santa".secret_friends_history(year);
+
+ALTER TABLE "secret-santa".secret_friends_history ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable all access for service role" ON "secret-santa".secret_friends_history
+    FOR ALL USING (true);
+
+-- Replace the archived draw of a year with the current contents of
+-- secret_friends in a single transaction, so a failure never leaves the
+-- year empty or half-written.
+CREATE OR REPLACE FUNCTION "secret-santa".archive_secret_friends(p_year INT, p_expected_rows INT DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    archived_rows INT;
+BEGIN
+    DELETE FROM "secret-santa".secret_friends_history WHERE year = p_year;
+
+    INSERT INTO "secret-santa".secret_friends_history (year, user_id, id_secret_friend)
+    SELECT p_year, user_id, id_secret_friend
+    FROM "secret-santa".secret_friends;
+
+    GET DIAGNOSTICS archived_rows = ROW_COUNT;
+
+    IF p_expected_rows IS NOT NULL AND archived_rows <> p_expected_rows THEN
+        RAISE EXCEPTION 'secret_friends has % rows, expected %', archived_rows, p_expected_rows;
+    END IF;
+
+    RETURN archived_rows;
+END;
+$$;
@@ -0,0 +1,94 @@
+"""
+Batched, atomic persistence of Secret Santa draws.
+Assignments are written in batches to a staging table under a draw id and
+swapped into secret_friends in one transaction (see
+utils/secret_friends_staging.sql), so a failed save never leaves the
+table empty or half-written.
+"""
+import time
+import uuid
+from typing import Callable, Dict, Iterator, List, Optional
+
+STAGING_TABLE = 'secret_friends_staging'
+SWAP_FUNCTION = 'swap_secret_friends'
+DEFAULT_BATCH_SIZE = 1000
+
+
+def iter_batches(rows: List[dict], batch_size: int) -> Iterator[List[dict]]:
+    """Yield consecutive slices of `rows` with at most `batch_size` items."""
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    for start in range(0, len(rows), batch_size):
+        yield rows[start:start + batch_size]
+
+
+def insert_in_batches(supabase, table: str, rows: List[dict], batch_size: int = DEFAULT_BATCH_SIZE,
+                      on_batch: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Insert rows in batches so no single request grows with the group size.
+
+    Args:
+        on_batch: Optional callback(rows_written, total_rows) after each batch
+
+    Returns:
+        Number of batches sent
+    """
+    batches = 0
+    written = 0
+    for batch in iter_batches(rows, batch_size):
+        supabase.table(table).insert(batch).execute()
+        batches += 1
+        written += len(batch)
+        if on_batch:
+            on_batch(written, len(rows))
+    return batches
+
+
+def discard_staged_draw(supabase, draw_id: str) -> None:
+    """Remove the staged rows of a draw that will not be swapped in."""
+    supabase.table(STAGING_TABLE).delete().eq('draw_id', draw_id).execute()
+
+
+def save_assignments_atomic(supabase, assignments: List[dict], batch_size: int = DEFAULT_BATCH_SIZE,
+                            draw_id: Optional[str] = None,
+                            on_batch: Optional[Callable[[int, int], None]] = None) -> Dict[str, float]:
+    """
+    Stage the draw in batches and swap it into secret_friends atomically.
+
+    Args:
+        assignments: Rows {"user_id", "id_secret_friend"}
+        batch_size: Rows per insert request
+        draw_id: Optional draw id (a new UUID by default)
+        on_batch: Optional callback(rows_written, total_rows) after each batch
+
+    Returns:
+        Dictionary with draw_id, rows, batches, seconds and rows_per_sec
+
+    Raises:
+        Exception: any error from Supabase; staged rows are discarded first
+    """
+    draw_id = draw_id or str(uuid.uuid4())
+    staged = [
+        {"draw_id": draw_id, "user_id": a["user_id"], "id_secret_friend": a["id_secret_friend"]}
+        for a in assignments
+    ]
+
+    start = time.perf_counter()
+    try:
+        batches = insert_in_batches(supabase, STAGING_TABLE, staged, batch_size, on_batch)
+        supabase.rpc(SWAP_FUNCTION, {"p_draw_id": draw_id, "p_expected_rows": len(staged)}).execute()
+    except Exception:
+        try:
+            discard_staged_draw(supabase, draw_id)
+        except Exception:
+            pass
+        raise
+    seconds = time.perf_counter() - start
+
+    return {
+        "draw_id": draw_id,
+        "rows": len(staged),
+        "batches": batches,
+        "seconds": seconds,
+        "rows_per_sec": len(staged) / seconds if seconds > 0 else float("inf"),
+    }
@@ -0,0 +1,70 @@
+"""
+Benchmark for the Secret Santa draw engines.
+
+Compares the old reshuffle-until-valid loop with the single-pass engines in
+utils/derangement.py for group sizes from 10 to 1,000,000 participants.
+
+Usage:
+    python utils/benchmark_draw.py
+    python utils/benchmark_draw.py --sizes 10 1000 100000 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.derangement import uniform_derangement, sattolo_cycle
+
+DEFAULT_SIZES = [10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+
+def rejection_draw(n, rng):
+    """Previous engine: shuffle the whole list until nobody draws themselves."""
+    assigned = list(range(n))
+    retries = 0
+    while True:
+        rng.shuffle(assigned)
+        if all(i != a for i, a in enumerate(assigned)):
+            return assigned, retries
+        retries += 1
+
+
+def time_engine(engine, n, repeat, seed):
+    """Run an engine `repeat` times and return (best, worst) seconds."""
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine(n, rng)
+        timings.append(time.perf_counter() - start)
+    return min(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de motores de sorteo")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+
+    engines = [
+        ("rejection", rejection_draw),
+        ("uniform", uniform_derangement),
+        ("cycle", sattolo_cycle),
+    ]
+
+    header = f"{'n':>10} " + " ".join(f"{name + ' best/worst (s)':>30}" for name, _ in engines)
+    print(header)
+    print("-" * len(header))
+    for n in args.sizes:
+        cells = []
+        for _, engine in engines:
+            best, worst = time_engine(engine, n, args.repeat, args.seed)
+            cells.append(f"{best:>14.4f} / {worst:<13.4f}")
+        print(f"{n:>10} " + " ".join(cells))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Throughput benchmark for the letter email pipeline.
+
+Renders synthetic letters and sends them to a local SMTP sink
+(utils/smtp_sink.py) with one connection per message (send_email), one
+reused session (SMTPSession) and the concurrent bulk mailer at several
+concurrency levels. Reports messages/sec, p50/p99 transmit latency and
+SMTP connections. Latency, temporary failures and dropped connections can
+be injected to measure the retry rounds needed to deliver everything.
+
+Usage:
+    python utils/benchmark_email.py
+    python utils/benchmark_email.py --sizes 1000 10000 --concurrency 1 8 32 --latency 0.02
+    python utils/benchmark_email.py --sizes 2000 --failure-rate 0.05 --drop-rate 0.01
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.benchmark_letters import fake_letters
+from utils.bulk_mailer import send_bulk
+from utils.email_outbox import backoff_seconds
+from utils.email_sender import Mailer, SMTPConnectionPool, SMTPSession, send_email
+from utils.letter_template import render_letters
+from utils.smtp_sink import SMTPSink
+
+# Above this size the one-connection-per-message run is skipped (too slow)
+MAX_SINGLE_SEND = 500
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_single(messages, mailer):
+    """send_email: connect, authenticate and quit for every message."""
+    latencies, failed = [], 0
+    for m in messages:
+        start = time.perf_counter()
+        try:
+            send_email(m['to_email'], m['subject'], m['html_body'], m['text_body'], mailer=mailer)
+        except Exception:  # noqa: BLE001
+            failed += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failed
+
+
+def run_session(messages, mailer):
+    """SMTPSession: one authenticated connection for everything."""
+    latencies, failed = [], 0
+    with SMTPSession(mailer=mailer) as session:
+        for m in messages:
+            start = time.perf_counter()
+            try:
+                session.send(m['to_email'], m['subject'], m['html_body'], m['text_body'])
+            except Exception:  # noqa: BLE001
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+    return latencies, failed
+
+
+def run_bulk(messages, mailer, concurrency, max_attempts, retry_base):
+    """send_bulk with retry rounds (exponential backoff) until all are delivered."""
+    latencies, rounds, pending = [], 0, messages
+    with SMTPConnectionPool(size=concurrency, mailer=mailer) as pool:
+        while pending and rounds < max_attempts:
+            if rounds:
+                time.sleep(backoff_seconds(rounds, retry_base, retry_base * 16))
+            rounds += 1
+            outcome = send_bulk(pending, concurrency=concurrency, rate=0, pool=pool)
+            latencies.extend(r['transmit_seconds'] for r in outcome['results'] if r['attempted'])
+            failed_keys = {r['key'] for r in outcome['results'] if not r['ok']}
+            pending = [m for m in pending if m['key'] in failed_keys]
+    return latencies, len(pending), rounds
+
+
+def report(name, size, seconds, latencies, failed, sink, rounds=1):
+    stats = sink.stats()
+    delivered = size - failed
+    print(f"{name:<14} {size:>7} {delivered / seconds:>10.1f} {1000 * percentile(latencies, 0.5):>9.2f} "
+          f"{1000 * percentile(latencies, 0.99):>9.2f} {stats['connections']:>6} {failed:>6} "
+          f"{stats['failed'] + stats['dropped']:>9} {rounds:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del envío de correos contra un servidor SMTP local")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.005, help="segundos de espera del servidor por mensaje")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="proporción de errores temporales 451")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="proporción de conexiones cortadas")
+    parser.add_argument("--max-per-connection", type=int, default=100)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--retry-base", type=float, default=0.05, help="espera antes del primer reintento (s)")
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+
+    with SMTPSink(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                  drop_rate=args.drop_rate, seed=args.seed) as sink:
+        mailer = Mailer(sink.smtp_config(args.max_per_connection))
+
+        print(f"SMTP local en {sink.host}:{sink.port}, latencia {args.latency * 1000:.1f} ms, "
+              f"errores {args.failure_rate:.1%}, cortes {args.drop_rate:.1%}")
+        print(f"{'modo':<14} {'correos':>7} {'correos/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+              f"{'conex':>6} {'fallan':>6} {'inyectados':>9} {'rondas':>6}")
+        for size in args.sizes:
+            start = time.perf_counter()
+            messages = render_letters(fake_letters(size, args.seed))
+            print(f"-- {size} cartas generadas en {time.perf_counter() - start:.2f} s")
+
+            if size <= MAX_SINGLE_SEND:
+                sink.reset_stats()
+                start = time.perf_counter()
+                latencies, failed = run_single(messages, mailer)
+                report("send_email", size, time.perf_counter() - start, latencies, failed, sink)
+
+            sink.reset_stats()
+            start = time.perf_counter()
+            latencies, failed = run_session(messages, mailer)
+            report("session", size, time.perf_counter() - start, latencies, failed, sink)
+
+            for concurrency in args.concurrency:
+                sink.reset_stats()
+                start = time.perf_counter()
+                latencies, failed, rounds = run_bulk(messages, mailer, concurrency,
+                                                     args.max_attempts, args.retry_base)
+                report(f"bulk x{concurrency}", size, time.perf_counter() - start,
+                       latencies, failed, sink, rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Latency benchmark for the secret friend lookup.
+
+Compares the one-request lookup through the secret_friend_cards view with
+the previous three-step lookup (santa id, assignment, friend row) against
+the configured Supabase project, for a sample of participants. Both paths
+run alternately for every participant so network drift affects them alike.
+
+Usage:
+    python utils/benchmark_friend_lookup.py
+    python utils/benchmark_friend_lookup.py --users 50 --repeat 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from statistics import mean
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from dotenv import load_dotenv
+from utils.friend_lookup import fetch_friend_card, fetch_friend_card_sequential
+from utils.pagination import iter_users
+from utils.supabase_client import get_supabase_client
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def time_lookup(lookup, supabase, name, stats):
+    start = time.perf_counter()
+    card = lookup(supabase, name, stats=stats)
+    return time.perf_counter() - start, card
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la consulta del amigo secreto")
+    parser.add_argument("--users", type=int, default=20, help="participantes de la muestra")
+    parser.add_argument("--repeat", type=int, default=3, help="consultas por participante y método")
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase = get_supabase_client()
+    names = [row['character_name'] for row in iter_users(supabase, 'id, character_name')]
+    if not names:
+        print("No hay participantes registrados.")
+        return
+    names = random.Random(args.seed).sample(names, min(args.users, len(names)))
+
+    paths = [
+        ("vista (1 consulta)", fetch_friend_card),
+        ("3 consultas", fetch_friend_card_sequential),
+    ]
+    timings = {label: [] for label, _ in paths}
+    stats = {label: {'queries': 0} for label, _ in paths}
+    mismatches = 0
+
+    # Warm up connections before measuring
+    for _, lookup in paths:
+        lookup(supabase, names[0])
+
+    for i in range(args.repeat):
+        for name in names:
+            order = paths if i % 2 == 0 else paths[::-1]
+            cards = []
+            for label, lookup in order:
+                seconds, card = time_lookup(lookup, supabase, name, stats[label])
+                timings[label].append(seconds)
+                cards.append(card)
+            mismatches += cards[0] != cards[1]
+
+    lookups = len(names) * args.repeat
+    print(f"{len(names)} participantes, {args.repeat} consultas por participante")
+    print(f"{'método':<20} {'media ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'consultas':>10}")
+    for label, _ in paths:
+        values = timings[label]
+        print(f"{label:<20} {1000 * mean(values):>9.1f} {1000 * percentile(values, 0.5):>9.1f} "
+              f"{1000 * percentile(values, 0.95):>9.1f} {1000 * percentile(values, 0.99):>9.1f} "
+              f"{stats[label]['queries'] / lookups:>10.1f}")
+    speedup = mean(timings[paths[1][0]]) / mean(timings[paths[0][0]])
+    print(f"\nLa vista es {speedup:.1f}x más rápida de media.")
+    if mismatches:
+        print(f"⚠️ {mismatches} consultas devolvieron resultados distintos.")
+
+
+if __name__ == "__main__":
+    main()
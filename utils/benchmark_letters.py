@@ -0,0 +1,137 @@
+"""
+Benchmark for the wishes letter rendering.
+
+Compares the previous per-letter f-string concatenation (with and without
+escaping the user text) with the precompiled templates in
+utils/letter_template.py.
+
+Usage:
+    python utils/benchmark_letters.py
+    python utils/benchmark_letters.py --letters 100000 --repeat 3
+"""
+import argparse
+import html
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.letter_template import render_letters, render_letter_html
+
+
+def concat_letter_html(santa_name, friend):
+    """Previous builder: string concatenation for every block, no escaping."""
+    def format_wish(wish, link, idx):
+        if not wish:
+            return ""
+        html = f"<div style='margin-left:20px;margin-bottom:15px;'>"
+        html += f"Para ver la magia del deseo #{idx}:<br>"
+        html += f"<span style='color:#c0392b;font-weight:bold;'>{wish}</span>"
+        if link:
+            html += f" <a href='{link}' target='_blank' style='color:#d35400;text-decoration:none;'>(Ver referencia 🔗)</a>"
+        html += "</div>"
+        return html
+
+    wishes_html = ""
+    wishes_html += "<p><strong>Como primera opción (mi favorito 😍):</strong></p>"
+    wishes_html += format_wish(friend.get("friend_deseo1", ""), friend.get("friend_link_deseo1"), 1)
+    wishes_html += "<p><strong>También me encantaría:</strong></p>"
+    wishes_html += format_wish(friend.get("friend_deseo2", ""), friend.get("friend_link_deseo2"), 2)
+    if friend.get("friend_deseo3") and friend.get("friend_deseo3") != "SIN DESEO":
+        wishes_html += "<p><strong>Y si te sientes muy generoso 😇:</strong></p>"
+        wishes_html += format_wish(friend.get("friend_deseo3", ""), friend.get("friend_link_deseo3"), 3)
+    comentarios = ""
+    if friend.get("friend_comentarios_generales"):
+        comentarios = (
+            "<p><strong>P.D. (Notas importantes 📝):</strong><br>"
+            f"{friend['friend_comentarios_generales']}</p>"
+        )
+    return f"""
+        <div style="background-color:#f8f9fa;color:#2c3e50;padding:40px;border-radius:10px;
+                    font-family:'Courier New',Courier,monospace;line-height:1.6;
+                    box-shadow:0 4px 8px rgba(0,0,0,0.1);border:2px solid #e0e0e0;">
+            <div style="font-size:1.5em;font-weight:bold;margin-bottom:20px;">
+                Querido Santa (osea tú, {santa_name}) 🎅,
+            </div>
+            <div style="font-size:1.2em;">
+                <p>Este año me he portado EXTRAORDINARIAMENTE bien (créeme 😉).
+                Para esta Navidad, me haría la persona más feliz del mundo recibir
+                alguno de estos regalitos:</p>
+                {wishes_html}
+                {comentarios}
+                <div style="margin-top:40px;text-align:right;font-size:1.3em;font-style:italic;">
+                    Con cariño y esperanza,<br>
+                    {friend.get('friend_character_name', '')} 🎄
+                </div>
+            </div>
+        </div>
+        """
+
+
+def escaped_concat_letter_html(santa_name, friend):
+    """Previous builder with every user value passed through html.escape first."""
+    safe = {key: html.escape(value) if isinstance(value, str) else value for key, value in friend.items()}
+    return concat_letter_html(html.escape(santa_name), safe)
+
+
+def fake_letters(count, seed):
+    """Letters shaped like utils/letter_data.fetch_letter_data rows."""
+    rng = random.Random(seed)
+    words = ["libro", "taza", "bufanda", "<b>juego</b>", "café & té", "calcetines", "\"vinilo\"", "puzzle"]
+    letters = []
+    for i in range(count):
+        def wish():
+            return " ".join(rng.choice(words) for _ in range(rng.randint(2, 8)))
+        letters.append({
+            'user_id': i,
+            'to_email': f"santa{i}@example.com",
+            'santa_name': f"Santa {i}",
+            'friend_info': {
+                'friend_character_name': f"Personaje {i}",
+                'friend_deseo1': wish(),
+                'friend_link_deseo1': "https://example.com/item?a=1&b=2" if rng.random() < 0.5 else "",
+                'friend_deseo2': wish(),
+                'friend_link_deseo2': "",
+                'friend_deseo3': wish() if rng.random() < 0.7 else "",
+                'friend_link_deseo3': "https://example.com/x",
+                'friend_comentarios_generales': "Talla M\nSin gluten" if rng.random() < 0.3 else "",
+            },
+        })
+    return letters
+
+
+def best_of(repeat, run):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de generación de cartas")
+    parser.add_argument("--letters", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+
+    letters = fake_letters(args.letters, args.seed)
+    runs = [
+        ("concat (anterior)", lambda: [concat_letter_html(l['santa_name'], l['friend_info']) for l in letters]),
+        ("concat + html.escape", lambda: [escaped_concat_letter_html(l['santa_name'], l['friend_info']) for l in letters]),
+        ("template (solo HTML)", lambda: [render_letter_html(l['santa_name'], l['friend_info']) for l in letters]),
+        ("template (correo completo)", lambda: render_letters(letters)),
+    ]
+
+    print(f"{args.letters} cartas, mejor de {args.repeat} ejecuciones")
+    print(f"{'motor':<28} {'segundos':>10} {'cartas/s':>12}")
+    for name, run in runs:
+        seconds = best_of(args.repeat, run)
+        print(f"{name:<28} {seconds:>10.3f} {args.letters / seconds:>12.0f}")
+    print("\nEl motor anterior no escapa el texto de los deseos; compárese con 'concat + html.escape'.")
+
+
+if __name__ == "__main__":
+    main()
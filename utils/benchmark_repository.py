@@ -0,0 +1,153 @@
+"""
+Offline load test of the page queries.
+
+Fills a local SQLite repository (utils/repository.py) with synthetic
+participants and a draw, then runs the page query mix (login, profile,
+friend reveal, registration list, wishes update) from several threads and
+reports operations/sec and p50/p99 latency per query. No Supabase project
+or network is needed; --backend supabase runs the read-only queries
+against the configured project instead.
+
+Usage:
+    python utils/benchmark_repository.py
+    python utils/benchmark_repository.py --users 5000 --threads 1 4 16 --ops 20000
+    python utils/benchmark_repository.py --sqlite-path /tmp/santa.db
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.derangement import uniform_derangement
+from utils.repository import BACKEND_SQLITE, BACKEND_SUPABASE, create_repository
+
+# (query, weight): a page visit mostly reads
+QUERY_MIX = [
+    ('login', 20),
+    ('profile', 30),
+    ('friend', 30),
+    ('characters', 5),
+    ('update_wishes', 15),
+]
+READ_ONLY = {'login', 'profile', 'friend', 'characters'}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def seed_sqlite(repo, users: int, seed: int) -> None:
+    """Participants shaped like the registration form, and a full draw."""
+    rng = random.Random(seed)
+    repo.insert_users([{
+        'nombre': f"Nombre {i}",
+        'email': f"santa{i}@example.com",
+        'deseo1': f"Deseo uno {i}",
+        'link_deseo1': "https://example.com/item" if rng.random() < 0.5 else "",
+        'imagen_deseo1': "",
+        'deseo2': f"Deseo dos {i}",
+        'link_deseo2': "",
+        'imagen_deseo2': "",
+        'deseo3': f"Deseo tres {i}" if rng.random() < 0.7 else "",
+        'link_deseo3': "",
+        'imagen_deseo3': "",
+        'comentarios_generales': "Talla M" if rng.random() < 0.3 else "",
+        'character_name': f"Personaje {i}",
+        'character_photo_url': "",
+        'password': f"clave{i}",
+    } for i in range(users)])
+    friend_of = uniform_derangement(users, rng)
+    # SQLite ids start at 1
+    repo.replace_assignments([
+        {'user_id': i + 1, 'id_secret_friend': friend_of[i] + 1} for i in range(users)
+    ])
+
+
+def run_query(repo, query: str, i: int) -> None:
+    name = f"Personaje {i}"
+    if query == 'login':
+        repo.find_user_login(name.upper(), f"clave{i}")
+    elif query == 'profile':
+        repo.get_profile(name)
+        repo.is_wishes_locked()
+    elif query == 'friend':
+        repo.friend_card(name)
+    elif query == 'characters':
+        repo.character_names()
+    elif query == 'update_wishes':
+        repo.update_wishes(name, {'deseo1': f"Nuevo deseo {time.perf_counter()}", 'deseo2': "Deseo dos"})
+
+
+def run_load(repo, users: int, threads: int, ops: int, queries: List[str], seed: int) -> Dict[str, List[float]]:
+    """Run `ops` queries from `threads` threads; latencies per query."""
+    latencies: Dict[str, List[float]] = {query: [] for query in queries}
+    weights = [weight for query, weight in QUERY_MIX if query in queries]
+    lock = threading.Lock()
+
+    def worker(index: int) -> None:
+        rng = random.Random(seed + index)
+        local: Dict[str, List[float]] = {query: [] for query in queries}
+        for _ in range(ops // threads):
+            query = rng.choices(queries, weights)[0]
+            start = time.perf_counter()
+            run_query(repo, query, rng.randrange(users))
+            local[query].append(time.perf_counter() - start)
+        with lock:
+            for query, values in local.items():
+                latencies[query].extend(values)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de las consultas de las páginas")
+    parser.add_argument("--backend", choices=[BACKEND_SQLITE, BACKEND_SUPABASE], default=BACKEND_SQLITE)
+    parser.add_argument("--sqlite-path", default=":memory:")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--ops", type=int, default=10000, help="consultas por ejecución")
+    parser.add_argument("--seed", type=int, default=2025)
+    args = parser.parse_args()
+
+    repo = create_repository(args.backend, args.sqlite_path)
+    if args.backend == BACKEND_SQLITE:
+        start = time.perf_counter()
+        if not repo.count_users():
+            seed_sqlite(repo, args.users, args.seed)
+        users = repo.count_users()
+        print(f"SQLite {args.sqlite_path}: {users} participantes, {repo.count_assignments()} asignaciones "
+              f"(preparado en {time.perf_counter() - start:.2f} s)")
+        queries = [query for query, _ in QUERY_MIX]
+    else:
+        # Only read the live project, and only the synthetic characters
+        users = args.users
+        print(f"Supabase: solo consultas de lectura sobre 'Personaje 0'..'Personaje {users - 1}'")
+        queries = [query for query, _ in QUERY_MIX if query in READ_ONLY]
+
+    print(f"{'hilos':>5} {'consulta':<14} {'n':>7} {'p50 ms':>9} {'p99 ms':>9}   {'total/s':>9}")
+    for threads in args.threads:
+        start = time.perf_counter()
+        latencies = run_load(repo, users, threads, args.ops, queries, args.seed)
+        seconds = time.perf_counter() - start
+        total = sum(len(values) for values in latencies.values())
+        for i, query in enumerate(queries):
+            values = latencies[query]
+            throughput = f"{total / seconds:>9.0f}" if i == 0 else ""
+            print(f"{threads:>5} {query:<14} {len(values):>7} {1000 * percentile(values, 0.5):>9.3f} "
+                  f"{1000 * percentile(values, 0.99):>9.3f}   {throughput}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Concurrent bulk mailer.
+Sends many emails over a pool of authenticated SMTP sessions, with a
+token-bucket rate limiter so large campaigns stay under provider quotas.
+"""
+import math
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+from utils.email_sender import SMTPConnectionPool, StageTimer
+from utils.config_loader import get_email_settings
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Tokens refill at `rate` per second up to `capacity`; `acquire` blocks
+    until a token is available. A rate of None or 0 disables the limit.
+    """
+
+    def __init__(self, rate: Optional[float], capacity: Optional[float] = None):
+        self.rate = rate or 0
+        self.capacity = capacity or max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take one token, waiting for the refill if the bucket is empty."""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _send_one(pool: SMTPConnectionPool, bucket: TokenBucket, abort: threading.Event,
+              timer: StageTimer, message: dict) -> dict:
+    """
+    Send one message (runs in a worker thread) and describe the outcome.
+
+    The rate token is taken before a session is borrowed from the pool, so
+    no connection sits idle while the limiter waits.
+    """
+    result = {
+        'to_email': message['to_email'],
+        'key': message.get('key'),
+        'ok': False,
+        'attempted': False,
+        'error': None,
+        'seconds': 0.0,
+        'mime_seconds': 0.0,
+        'transmit_seconds': 0.0,
+    }
+    if abort.is_set():
+        result['error'] = "Aborted after an SMTP authentication error"
+        return result
+    bucket.acquire()
+    start = time.perf_counter()
+    result['attempted'] = True
+    try:
+        raw = pool.mailer.build(message['to_email'], message['subject'], message['html_body'],
+                                message.get('text_body'), message.get('message_id'))
+        built = time.perf_counter()
+        result['mime_seconds'] = built - start
+        timer.add('mime', result['mime_seconds'])
+        with pool.session() as smtp:
+            transmit_start = time.perf_counter()
+            try:
+                smtp.send_raw(message['to_email'], raw)
+            finally:
+                result['transmit_seconds'] = time.perf_counter() - transmit_start
+                timer.add('transmit', result['transmit_seconds'])
+        result['ok'] = True
+    except smtplib.SMTPAuthenticationError as e:
+        # Every other message would fail the same way
+        abort.set()
+        result['error'] = f"SMTP authentication failed: {e}"
+    except Exception as e:  # noqa: BLE001
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _send_group(pool: SMTPConnectionPool, bucket: TokenBucket, abort: threading.Event,
+                timer: StageTimer, group: List[dict]) -> List[dict]:
+    """
+    Send a group of messages in a row from one worker.
+
+    Each message borrows a session only once it has its rate token; the
+    pool hands the most recently returned session back, so the group keeps
+    reusing the connection it started on.
+    """
+    return [_send_one(pool, bucket, abort, timer, message) for message in group]
+
+
+def _group_messages(messages: List[dict], group_by: Callable[[dict], Hashable],
+                    chunk_size: int, concurrency: int = 1) -> List[List[dict]]:
+    """
+    Split messages by `group_by` into chunks, keeping their order.
+
+    Chunks hold at most `chunk_size` messages and at most an even share of
+    their group per worker, so one large domain is still spread over all
+    `concurrency` connections.
+    """
+    groups: Dict[Hashable, List[dict]] = {}
+    for message in messages:
+        groups.setdefault(group_by(message), []).append(message)
+    chunks = []
+    for group in groups.values():
+        size = max(1, min(chunk_size, math.ceil(len(group) / concurrency)))
+        chunks.extend(group[i:i + size] for i in range(0, len(group), size))
+    return chunks
+
+
+def send_bulk(messages: Iterable[dict], concurrency: Optional[int] = None,
+              rate: Optional[float] = None, burst: Optional[float] = None,
+              config: Optional[dict] = None, pool: Optional[SMTPConnectionPool] = None,
+              limiter: Optional[TokenBucket] = None,
+              group_by: Optional[Callable[[dict], Hashable]] = None,
+              on_result: Optional[Callable[[dict], None]] = None) -> Dict[str, object]:
+    """
+    Send many emails concurrently.
+
+    Each message is a dictionary with 'to_email', 'subject', 'html_body',
+    optional 'text_body' and 'message_id', and an optional 'key' that is
+    copied to its result (e.g. the user id). Messages per connection are
+    capped by the SMTP configuration (SMTP_MAX_MESSAGES_PER_CONNECTION).
+
+    Args:
+        messages: Messages to send
+        concurrency: Parallel SMTP connections (defaults to config.json)
+        rate: Maximum messages per second over all connections, None for no limit
+        burst: Messages that may be sent at once before the rate applies
+        config: Optional SMTP configuration (defaults to the environment)
+        pool: Optional SMTPConnectionPool to reuse across calls (left open)
+        limiter: Optional TokenBucket to share across calls (overrides rate and burst)
+        group_by: Optional key (e.g. recipient domain); messages with the same
+                  key are sent in a row by one worker, in chunks of at most
+                  SMTP_MAX_MESSAGES_PER_CONNECTION and of an even share of
+                  the key's messages per connection
+        on_result: Optional callback called with every result, in the calling thread
+
+    Returns:
+        Dictionary with:
+        - 'results': one {"to_email", "key", "ok", "attempted", "error", "seconds",
+          "mime_seconds", "transmit_seconds"} per message ('attempted' is
+          False if it was skipped after an abort)
+        - 'sent', 'failed': counts
+        - 'aborted': True if an authentication error stopped the campaign
+        - 'seconds', 'messages_per_sec': wall time and throughput
+        - 'connections': SMTP connections opened
+        - 'timings': seconds per stage ('mime' build, 'transmit'), see StageTimer.report
+
+    Raises:
+        EmailConfigError: if SMTP configuration is invalid
+    """
+    settings = get_email_settings()
+    concurrency = concurrency or settings['concurrency']
+    rate = settings['rate_per_sec'] if rate is None else rate
+    burst = burst or settings['burst']
+
+    own_pool = pool is None
+    if own_pool:
+        pool = SMTPConnectionPool(size=concurrency, config=config)
+    messages = list(messages)
+    bucket = limiter or TokenBucket(rate, burst)
+    abort = threading.Event()
+    timer = StageTimer()
+    results: List[dict] = []
+
+    start = time.perf_counter()
+    opened_before = pool.connections_opened
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            if group_by is None:
+                futures = [executor.submit(_send_one, pool, bucket, abort, timer, m) for m in messages]
+            else:
+                chunk_size = pool.config.get('max_messages_per_connection') or len(messages) or 1
+                futures = [executor.submit(_send_group, pool, bucket, abort, timer, group)
+                           for group in _group_messages(messages, group_by, chunk_size, concurrency)]
+            for future in as_completed(futures):
+                done = future.result()
+                for result in done if isinstance(done, list) else [done]:
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+    finally:
+        connections = pool.connections_opened - opened_before
+        if own_pool:
+            pool.close()
+    elapsed = time.perf_counter() - start
+
+    sent = sum(1 for r in results if r['ok'])
+    return {
+        'results': results,
+        'sent': sent,
+        'failed': len(results) - sent,
+        'aborted': abort.is_set(),
+        'seconds': elapsed,
+        'messages_per_sec': sent / elapsed if elapsed > 0 else 0.0,
+        'connections': connections,
+        'timings': timer.report(),
+    }
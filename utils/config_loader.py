@@ -64,3 +64,90 @@ def get_current_year() -> int:
     """
     config = load_config()
     return config.get("year", 2025)
+
+
+# Defaults for the "draw" section of config.json
+DEFAULT_DRAW_SETTINGS = {
+    "history_years": 3,
+    "batch_size": 1000,
+    "by_group": False,
+    "max_workers": None,
+}
+
+
+def get_draw_settings() -> Dict[str, Any]:
+    """
+    Get the draw settings, filling in defaults for missing keys.
+    
+    Returns:
+        Dictionary with draw settings (history_years, batch_size, by_group, max_workers)
+    """
+    config = load_config()
+    settings = dict(DEFAULT_DRAW_SETTINGS)
+    settings.update(config.get("draw", {}))
+    return settings
+
+
+def get_page_size() -> int:
+    """
+    Get the number of rows per request for paginated reads.
+    
+    Returns:
+        Integer page size (defaults to 1000, the default PostgREST row limit)
+    """
+    config = load_config()
+    return int(config.get("database", {}).get("page_size", 1000))
+
+
+# Defaults for the "email" section of config.json
+DEFAULT_EMAIL_SETTINGS = {
+    "concurrency": 4,
+    "rate_per_sec": 5,
+    "burst": 5,
+    "max_attempts": 5,
+    "retry_base_seconds": 60,
+    "retry_max_seconds": 3600,
+    "claim_batch_size": 100,
+    "lease_seconds": 600,
+    "worker_poll_seconds": 30,
+    "group_by_domain": True,
+}
+
+
+def get_email_settings() -> Dict[str, Any]:
+    """
+    Get the bulk email settings, filling in defaults for missing keys.
+    
+    Returns:
+        Dictionary with email settings (concurrency, rate_per_sec, burst,
+        max_attempts, retry_base_seconds, retry_max_seconds, claim_batch_size,
+        lease_seconds, worker_poll_seconds, group_by_domain)
+    """
+    config = load_config()
+    settings = dict(DEFAULT_EMAIL_SETTINGS)
+    settings.update(config.get("email", {}))
+    return settings
+
+
+# Defaults for the "cache" section of config.json
+DEFAULT_CACHE_SETTINGS = {
+    "max_entries": 2048,
+    "user_info_ttl": 30,
+    "selected_characters_ttl": 10,
+    "friend_info_ttl": 60,
+}
+
+
+def get_cache_settings() -> Dict[str, Any]:
+    """
+    Get the query cache settings, filling in defaults for missing keys.
+    
+    Returns:
+        Dictionary with cache settings (max_entries and the TTL in seconds
+        of each cached query: user_info_ttl, selected_characters_ttl,
+        friend_info_ttl)
+    """
+    config = load_config()
+    settings = dict(DEFAULT_CACHE_SETTINGS)
+    settings.update(config.get("cache", {}))
+    return settings
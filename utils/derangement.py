@@ -0,0 +1,101 @@
+"""
+Derangement engines for the Secret Santa draw.
+Builds the giver -> receiver mapping in a single pass over the participants
+instead of reshuffling the whole list until nobody draws themselves.
+"""
+import random
+from typing import Dict, List, Optional, Sequence
+
+# Available draw modes
+MODE_UNIFORM = "uniform"
+MODE_CYCLE = "cycle"
+DRAW_MODES = (MODE_UNIFORM, MODE_CYCLE)
+
+
+def sattolo_cycle(n: int, rng: Optional[random.Random] = None) -> List[int]:
+    """
+    Build a random single-cycle permutation of range(n) (Sattolo's algorithm).
+
+    Every participant ends up in one big gift chain, so nobody can draw
+    themselves and there are no closed pairs (A -> B -> A) unless n == 2.
+    Runs in exactly n - 1 steps.
+
+    Returns:
+        List p where p[i] is the index that i gives a gift to
+    """
+    rng = rng or random
+    p = list(range(n))
+    for i in range(n - 1, 0, -1):
+        j = int(rng.random() * i)  # 0 <= j < i, never i itself
+        p[i], p[j] = p[j], p[i]
+    return p
+
+
+def uniform_derangement(n: int, rng: Optional[random.Random] = None) -> List[int]:
+    """
+    Build a uniformly random derangement of range(n).
+
+    Implements the Martínez-Panholzer-Prodinger algorithm: a single backwards
+    pass that swaps each still-unmarked position with a random earlier one and
+    occasionally closes a 2-cycle, with the closing probability derived from
+    the derangement numbers. Expected cost is about 2n random draws, with no
+    restart of the whole list.
+
+    Returns:
+        List p where p[i] is the index that i gives a gift to
+    """
+    if n < 2:
+        raise ValueError("A derangement needs at least 2 participants")
+    rng = rng or random
+
+    # Derangement numbers grow like n!, so keep only the ratios
+    # ratio[k] = D(k-1) / D(k). From D(k) = (k - 1) * (D(k-1) + D(k-2)):
+    # ratio[k] = 1 / ((k - 1) * (1 + ratio[k-1])), starting at D(1) / D(2) = 0.
+    ratio = [0.0] * (n + 1)
+    for k in range(3, n + 1):
+        ratio[k] = 1.0 / ((k - 1) * (1.0 + ratio[k - 1]))
+
+    p = list(range(n))
+    marked = [False] * n
+    i = n - 1
+    u = n  # number of unmarked positions in p[0..i]
+    while u >= 2:
+        if not marked[i]:
+            j = int(rng.random() * i)
+            while marked[j]:
+                j = int(rng.random() * i)
+            p[i], p[j] = p[j], p[i]
+            # Probability of closing a 2-cycle: (u - 1) * D(u - 2) / D(u)
+            close_prob = (u - 1) * ratio[u - 1] * ratio[u] if u > 2 else 1.0
+            if rng.random() < close_prob:
+                marked[j] = True
+                u -= 1
+            u -= 1
+        i -= 1
+    return p
+
+
+def derange(user_ids: Sequence[int], mode: str = MODE_UNIFORM,
+            rng: Optional[random.Random] = None) -> Dict[int, int]:
+    """
+    Draw a secret friend for every user id.
+
+    Args:
+        user_ids: Participant ids (at least 2, no duplicates)
+        mode: "uniform" for a uniformly random derangement or "cycle" for a
+              single gift chain through everyone
+        rng: Optional random.Random instance (for reproducible draws)
+
+    Returns:
+        Dictionary mapping each user id to the id of their secret friend
+    """
+    n = len(user_ids)
+    if n < 2:
+        raise ValueError("A draw needs at least 2 participants")
+    if mode == MODE_UNIFORM:
+        p = uniform_derangement(n, rng)
+    elif mode == MODE_CYCLE:
+        p = sattolo_cycle(n, rng)
+    else:
+        raise ValueError(f"Unknown draw mode '{mode}'. Use one of: {', '.join(DRAW_MODES)}")
+    return {user_ids[i]: user_ids[p[i]] for i in range(n)}
@@ -0,0 +1,14 @@
+-- Seeded (stateless) draws
+-- A seeded draw is fully defined by its seed and the ordered participant
+-- list; everyone's secret friend can be recomputed from it (utils/seeded_draw.py).
+CREATE TABLE IF NOT EXISTS "secret-santa".draw_seeds (
+    year INT PRIMARY KEY,
+    seed VARCHAR(64) NOT NULL,
+    participants INT[] NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+ALTER TABLE "secret-santa".draw_seeds ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable all access for service role" ON "secret-santa".draw_seeds
+    FOR ALL USING (true);
@@ -0,0 +1,239 @@
+"""
+Secret Santa draw service.
+Runs the whole draw (fetch participants and rules, solve, persist, archive)
+in-process on an existing Supabase client and returns a structured result,
+so the admin panel and the command line share the same code path.
+"""
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.derangement import MODE_UNIFORM
+from utils.matching import (
+    ExclusionRules, NoCycleFoundError, NoValidAssignmentError, solve_assignment, solve_with_history_fallback
+)
+from utils.history import load_history_index, archive_assignments
+from utils.incremental_draw import plan_incremental_draw, apply_incremental_draw
+from utils.assignment_store import save_assignments_atomic
+from utils.config_loader import get_current_year, get_draw_settings
+from utils.pagination import iter_rows, iter_users
+from utils.rendered_letters import render_all_letters, render_changed_letters
+from utils.query_cache import on_draw
+from utils.group_draw import run_group_draws, plan_group_incremental_draw
+from utils.seeded_draw import (
+    MODE_SEEDED, new_seeded_draw, verify_seeded_draw, save_seeded_draw, clear_seeded_draw
+)
+
+# progress(fraction between 0 and 1, message)
+ProgressCallback = Callable[[float, str], None]
+
+
+def _fetch_participants(supabase, warnings: List[str], by_group: bool = False) -> List[dict]:
+    """Fetch participant ids together with their exclusion rule (and group) columns."""
+    columns = 'id, pareja_id, equipo, grupo' if by_group else 'id, pareja_id, equipo'
+    try:
+        return list(iter_users(supabase, columns))
+    except Exception as e:
+        if by_group:
+            # Group draws need the grupo column (utils/add_group_column.sql)
+            raise
+        # Exclusion columns not migrated yet (utils/add_exclusion_columns.sql)
+        warnings.append(f"No se pudieron cargar las reglas de exclusión, se sortea sin ellas: {e}")
+        return list(iter_users(supabase, 'id'))
+
+
+def _fetch_current_assignments(supabase) -> Dict[int, int]:
+    rows = iter_rows(supabase, 'secret_friends', 'user_id, id_secret_friend', key='user_id')
+    return {row['user_id']: row['id_secret_friend'] for row in rows}
+
+
+def _clear_seed(supabase, year: int, warnings: List[str]) -> None:
+    try:
+        clear_seeded_draw(supabase, year)
+    except Exception as e:
+        # draw_seeds not migrated yet (utils/draw_seeds.sql)
+        warnings.append(f"No se pudo limpiar la semilla del sorteo de {year}: {e}")
+
+
+def run_draw(supabase, mode: str = MODE_UNIFORM, incremental: bool = False,
+             year: Optional[int] = None, progress: Optional[ProgressCallback] = None,
+             by_group: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Run a full or incremental draw.
+
+    Args:
+        supabase: Supabase client (usually get_supabase_client())
+        mode: "uniform", "cycle" (see utils/derangement.py) or "seeded"
+              (see utils/seeded_draw.py)
+        incremental: Only add new users and remove withdrawn ones
+        year: Event year (defaults to config.json)
+        progress: Optional callback(fraction, message) for live progress
+        by_group: Draw every `grupo` independently in a process pool
+                  (defaults to draw.by_group in config.json)
+
+    Returns:
+        Dictionary with:
+        - 'ok': whether the draw was saved
+        - 'users', 'groups', 'rows_written', 'rows_deleted': counts
+        - 'draw_id', 'rows_per_sec': persistence details (full draws)
+        - 'seed', 'verification': seed and verifier report (seeded draws)
+        - 'draw_version', 'letters_rendered': stored letters of the draw
+          (utils/rendered_letters.py)
+        - 'timings': seconds per stage
+        - 'warnings': list of non-fatal messages
+        - 'error': error message when 'ok' is False
+    """
+    def report(fraction: float, message: str) -> None:
+        if progress:
+            progress(fraction, message)
+
+    settings = get_draw_settings()
+    year = year if year is not None else get_current_year()
+    by_group = settings['by_group'] if by_group is None else by_group
+    result: Dict[str, Any] = {
+        'ok': False,
+        'mode': mode,
+        'incremental': incremental,
+        'year': year,
+        'users': 0,
+        'groups': None,
+        'rows_written': 0,
+        'rows_deleted': 0,
+        'draw_id': None,
+        'rows_per_sec': None,
+        'seed': None,
+        'verification': None,
+        'draw_version': None,
+        'letters_rendered': 0,
+        'timings': {},
+        'warnings': [],
+        'error': None,
+    }
+    timings = result['timings']
+    warnings = result['warnings']
+    started = time.perf_counter()
+
+    def lap(stage: str, since: float) -> float:
+        now = time.perf_counter()
+        timings[stage] = now - since
+        return now
+
+    try:
+        report(0.0, "Cargando participantes...")
+        t = time.perf_counter()
+        if by_group and mode == MODE_SEEDED and not incremental:
+            result['error'] = "El sorteo con semilla no admite sorteos por grupo."
+            return result
+        rows = _fetch_participants(supabase, warnings, by_group)
+        user_ids = [row['id'] for row in rows]
+        result['users'] = len(user_ids)
+        rules = ExclusionRules.from_user_rows(rows)
+        t = lap('fetch_users', t)
+        if len(user_ids) < 2:
+            result['error'] = "No hay suficientes usuarios para realizar el sorteo."
+            return result
+
+        report(0.15, "Cargando historial de sorteos...")
+        try:
+            rules.history = load_history_index(supabase, year, settings['history_years'])
+        except Exception as e:
+            warnings.append(f"No se pudo cargar el historial de sorteos, se sortea sin él: {e}")
+        t = lap('fetch_history', t)
+
+        if incremental:
+            report(0.3, "Calculando cambios...")
+            current = _fetch_current_assignments(supabase)
+            if by_group:
+                plan = plan_group_incremental_draw(current, rows, rules.history)
+            else:
+                plan = plan_incremental_draw(current, user_ids, rules)
+            t = lap('solve', t)
+            report(0.6, "Guardando cambios...")
+            apply_incremental_draw(supabase, plan, year=year)
+            # The draw no longer matches any seed
+            _clear_seed(supabase, year, warnings)
+            lap('save', t)
+            result['rows_written'] = len(plan['upserts'])
+            result['rows_deleted'] = len(plan['deletes'])
+        elif by_group:
+            report(0.3, "Sorteando por grupos...")
+            outcome = run_group_draws(rows, rules.history, mode, settings['max_workers'])
+            if outcome['errors']:
+                details = "; ".join(f"{group or 'sin grupo'}: {error}" for group, error in outcome['errors'].items())
+                raise NoValidAssignmentError(details)
+            for group in outcome['skipped']:
+                warnings.append(f"El grupo '{group or 'sin grupo'}' tiene menos de 2 personas y no participa.")
+            result['groups'] = outcome['groups']
+            assignments = outcome['assignments']
+            t = lap('solve', t)
+        elif mode == MODE_SEEDED:
+            report(0.3, "Sorteando con semilla...")
+            draw = solve_with_history_fallback(lambda: new_seeded_draw(user_ids, rules), rules, warnings)
+            verification = verify_seeded_draw(draw, rules)
+            if not verification['ok']:
+                raise RuntimeError(f"La verificación del sorteo con semilla falló: {verification}")
+            result['seed'] = draw.seed
+            result['verification'] = verification
+            assignments = draw.assignments()
+            t = lap('solve', t)
+        else:
+            report(0.3, "Sorteando...")
+            friend_of = solve_with_history_fallback(
+                lambda: solve_assignment(user_ids, rules, mode=mode), rules, warnings
+            )
+            assignments = [{"user_id": uid, "id_secret_friend": friend_of[uid]} for uid in user_ids]
+            t = lap('solve', t)
+
+        if not incremental:
+            def on_batch(written: int, total: int) -> None:
+                report(0.4 + 0.5 * written / total, f"Guardando asignaciones ({written}/{total})...")
+
+            stats = save_assignments_atomic(supabase, assignments, settings['batch_size'], on_batch=on_batch)
+            t = lap('save', t)
+            result['rows_written'] = stats['rows']
+            result['draw_id'] = stats['draw_id']
+            result['rows_per_sec'] = stats['rows_per_sec']
+
+            # secret_friends is still written, so the friend page, stats and
+            # mailing work as usual; the seed makes the draw reproducible.
+            if result['seed']:
+                save_seeded_draw(supabase, year, draw)
+            else:
+                _clear_seed(supabase, year, warnings)
+
+            report(0.9, "Archivando sorteo...")
+            try:
+                archive_assignments(supabase, year, len(assignments))
+            except Exception as e:
+                warnings.append(f"Error al archivar el sorteo de {year}: {e}")
+            lap('archive', t)
+
+        report(0.95, "Generando cartas...")
+        t = time.perf_counter()
+        try:
+            if incremental:
+                # Only the santas whose friend changed get a new letter
+                letters = render_changed_letters(supabase, plan)
+            else:
+                letters = render_all_letters(supabase, result['draw_id'])
+            result['draw_version'] = letters['draw_version']
+            result['letters_rendered'] = letters['rendered']
+        except Exception as e:
+            # rendered_letters not migrated yet (utils/rendered_letters.sql)
+            warnings.append(f"No se pudieron generar las cartas del sorteo: {e}")
+        lap('render_letters', t)
+
+        result['ok'] = True
+        on_draw()
+        report(1.0, "Sorteo completado.")
+    except NoCycleFoundError as e:
+        result['error'] = (
+            "No se encontró una única cadena de regalos que respete las reglas actuales; "
+            f"prueba el modo uniforme: {e}"
+        )
+    except NoValidAssignmentError as e:
+        result['error'] = f"No es posible realizar el sorteo con las reglas actuales: {e}"
+    except Exception as e:
+        result['error'] = f"Error al realizar el sorteo: {e}"
+    finally:
+        timings['total'] = time.perf_counter() - started
+    return result
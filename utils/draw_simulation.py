@@ -0,0 +1,286 @@
+"""
+Vectorized draw simulator.
+Runs millions of Secret Santa draws with NumPy to check that the draw
+engines are uniform and to measure what each one costs, including how many
+reshuffles the old rejection loop needs. Besides the giver -> receiver
+counts, the number of cycles per draw is compared with its exact
+distribution over all derangements, which tells a single gift chain
+("cycle") apart from a uniform derangement.
+
+Usage:
+    python utils/draw_simulation.py --n 10 --draws 1000000
+    python utils/draw_simulation.py --n 50 --draws 200000 --engines cycle rejection uniform
+
+Requires numpy (pip install numpy), which the web app itself does not need.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.derangement import uniform_derangement, sattolo_cycle
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only needed for simulations
+    np = None
+
+# Rows generated per NumPy batch (keeps memory bounded for big runs)
+DEFAULT_BATCH = 100_000
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("draw_simulation needs numpy: pip install numpy")
+
+
+def rejection_batch(n: int, size: int, rng) -> tuple:
+    """
+    Simulate the old engine: shuffle until nobody draws themselves.
+
+    Returns:
+        (permutations of shape (size, n), number of shuffles per draw)
+    """
+    identity = np.arange(n, dtype=np.int32)
+    perms = np.empty((size, n), dtype=np.int32)
+    shuffles = np.zeros(size, dtype=np.int32)
+    pending = np.arange(size)
+    while pending.size:
+        candidates = rng.permuted(np.broadcast_to(identity, (pending.size, n)), axis=1)
+        shuffles[pending] += 1
+        valid = ~(candidates == identity).any(axis=1)
+        perms[pending[valid]] = candidates[valid]
+        pending = pending[~valid]
+    return perms, shuffles
+
+
+def sattolo_batch(n: int, size: int, rng) -> tuple:
+    """Sattolo's algorithm applied to `size` rows at once."""
+    perms = np.broadcast_to(np.arange(n, dtype=np.int32), (size, n)).copy()
+    rows = np.arange(size)
+    for i in range(n - 1, 0, -1):
+        j = (rng.random(size) * i).astype(np.int64)
+        tmp = perms[rows, i].copy()
+        perms[rows, i] = perms[rows, j]
+        perms[rows, j] = tmp
+    return perms, np.ones(size, dtype=np.int32)
+
+
+def mpp_batch(n: int, size: int, rng) -> tuple:
+    """
+    utils/derangement.uniform_derangement (Martínez-Panholzer-Prodinger)
+    applied to `size` rows at once.
+
+    Every row visits the same position i on each step, so only the choice
+    of an unmarked j (redrawn where it hits a marked one) and the 2-cycle
+    closing coin are per row.
+    """
+    ratio = np.zeros(n + 1)
+    for k in range(3, n + 1):
+        ratio[k] = 1.0 / ((k - 1) * (1.0 + ratio[k - 1]))
+
+    perms = np.broadcast_to(np.arange(n, dtype=np.int32), (size, n)).copy()
+    marked = np.zeros((size, n), dtype=bool)
+    unmarked = np.full(size, n, dtype=np.int64)
+    rows = np.arange(size)
+    for i in range(n - 1, 0, -1):
+        active = rows[(unmarked >= 2) & ~marked[:, i]]
+        if not active.size:
+            continue
+        j = (rng.random(active.size) * i).astype(np.int64)
+        redo = marked[active, j]
+        while redo.any():
+            j[redo] = (rng.random(int(redo.sum())) * i).astype(np.int64)
+            redo = marked[active, j]
+        tmp = perms[active, i].copy()
+        perms[active, i] = perms[active, j]
+        perms[active, j] = tmp
+        u = unmarked[active]
+        close_prob = np.where(u > 2, (u - 1) * ratio[u - 1] * ratio[u], 1.0)
+        close = rng.random(active.size) < close_prob
+        marked[active[close], j[close]] = True
+        unmarked[active] -= 1 + close
+    return perms, np.ones(size, dtype=np.int32)
+
+
+def python_engine_batch(engine: Callable[[int, random.Random], list]) -> Callable:
+    """Wrap a pure-Python engine from utils/derangement.py as a batch engine."""
+    def batch(n: int, size: int, rng) -> tuple:
+        py_rng = random.Random(int(rng.integers(2 ** 63)))
+        perms = np.array([engine(n, py_rng) for _ in range(size)], dtype=np.int32)
+        return perms, np.ones(size, dtype=np.int32)
+    return batch
+
+
+ENGINES: Dict[str, Callable] = {
+    "rejection": rejection_batch,
+    "cycle": sattolo_batch,
+    "uniform": mpp_batch,
+    "uniform-python": python_engine_batch(uniform_derangement),
+    "cycle-python": python_engine_batch(sattolo_cycle),
+}
+PYTHON_ENGINES = ("uniform-python", "cycle-python")
+
+
+def derangement_cycle_counts(n: int) -> List[int]:
+    """
+    Number of derangements of n elements with exactly k cycles, for k in 0..n.
+
+    Recurrence d(n, k) = (n - 1) * (d(n - 1, k) + d(n - 2, k - 1)): the
+    element n either joins a cycle of a derangement of n - 1, or forms a
+    2-cycle with one of the other n - 1 elements. Exact (Python integers).
+    """
+    previous = [1] + [0] * n  # d(0, k)
+    current = [0] * (n + 1)   # d(1, k)
+    for m in range(2, n + 1):
+        previous, current = current, [0] + [
+            (m - 1) * (current[k] + previous[k - 1]) for k in range(1, n + 1)
+        ]
+    return current
+
+
+def count_cycles(perms) -> "np.ndarray":
+    """Cycles of every row, by pointer doubling (each cycle counted at its smallest element)."""
+    n = perms.shape[1]
+    smallest = np.broadcast_to(np.arange(n), perms.shape).copy()
+    jump = perms.astype(np.int64)
+    covered = 1
+    while covered < n:
+        smallest = np.minimum(smallest, np.take_along_axis(smallest, jump, axis=1))
+        jump = np.take_along_axis(jump, jump, axis=1)
+        covered *= 2
+    return (smallest == np.arange(n)).sum(axis=1)
+
+
+def cycle_chi2(observed, n: int, draws: int) -> tuple:
+    """
+    Chi-square of the cycles-per-draw histogram against uniform derangements.
+
+    Bins expecting fewer than 5 draws are pooled with their neighbour.
+
+    Returns:
+        (chi2, degrees of freedom)
+    """
+    exact = derangement_cycle_counts(n)
+    total = sum(exact)
+    bins = []
+    obs = exp = 0.0
+    for k in range(n + 1):
+        obs += observed[k]
+        exp += draws * exact[k] / total
+        if exp >= 5:
+            bins.append((obs, exp))
+            obs = exp = 0.0
+    if bins and exp:
+        last_obs, last_exp = bins.pop()
+        bins.append((last_obs + obs, last_exp + exp))
+    elif exp:
+        bins.append((obs, exp))
+    chi2 = float(sum((o - e) ** 2 / e for o, e in bins))
+    return chi2, max(len(bins) - 1, 1)
+
+
+def simulate(engine: str, n: int, draws: int, seed: Optional[int] = None,
+             batch: int = DEFAULT_BATCH) -> Dict[str, object]:
+    """
+    Run `draws` draws of `n` participants with one engine.
+
+    Returns:
+        Dictionary with timing (seconds, draws_per_sec), validity
+        (fixed_points), retry cost (mean/max shuffles), fairness of the
+        giver -> receiver counts (chi-square against a uniform spread over
+        the n - 1 possible friends, plus its z-score and the worst relative
+        deviation of a single cell) and the shape of the draws: mean cycles
+        per draw and the chi-square z-score of the cycle-count histogram
+        against uniform derangements ('cycles_z'; a single chain scores far
+        above 3).
+    """
+    _require_numpy()
+    if n < 2:
+        raise ValueError("A draw needs at least 2 participants")
+    run_batch = ENGINES[engine]
+    rng = np.random.default_rng(seed)
+
+    counts = np.zeros(n * n, dtype=np.int64)
+    identity = np.arange(n, dtype=np.int64)
+    fixed_points = 0
+    two_cycles = 0
+    cycles = np.zeros(n + 1, dtype=np.int64)
+    total_shuffles = 0
+    max_shuffles = 0
+    elapsed = 0.0
+
+    done = 0
+    while done < draws:
+        size = min(batch, draws - done)
+        start = time.perf_counter()
+        perms, shuffles = run_batch(n, size, rng)
+        elapsed += time.perf_counter() - start
+
+        fixed_points += int((perms == identity).sum())
+        # 2-cycles: p[p[i]] == i
+        two_cycles += int((np.take_along_axis(perms, perms, axis=1) == identity).sum() // 2)
+        counts += np.bincount((identity * n + perms).ravel(), minlength=n * n)
+        cycles += np.bincount(count_cycles(perms), minlength=n + 1)
+        total_shuffles += int(shuffles.sum())
+        max_shuffles = max(max_shuffles, int(shuffles.max()))
+        done += size
+
+    off_diagonal = counts.reshape(n, n)[~np.eye(n, dtype=bool)]
+    expected = draws / (n - 1)
+    chi2 = float(((off_diagonal - expected) ** 2 / expected).sum())
+    dof = n * (n - 1) - 2 * n + 1  # cells minus row and column constraints
+    dof = max(dof, 1)
+    cycles_chi2, cycles_dof = cycle_chi2(cycles, n, draws)
+
+    return {
+        "engine": engine,
+        "n": n,
+        "draws": draws,
+        "seconds": elapsed,
+        "draws_per_sec": draws / elapsed if elapsed > 0 else float("inf"),
+        "fixed_points": fixed_points,
+        "two_cycles_per_draw": two_cycles / draws,
+        "mean_shuffles": total_shuffles / draws,
+        "max_shuffles": max_shuffles,
+        "chi2": chi2,
+        "dof": dof,
+        "chi2_z": (chi2 - dof) / (2 * dof) ** 0.5,
+        "max_cell_deviation": float(np.abs(off_diagonal / expected - 1).max()),
+        "cycles_per_draw": float((cycles * np.arange(n + 1)).sum() / draws),
+        "cycles_chi2": cycles_chi2,
+        "cycles_dof": cycles_dof,
+        "cycles_z": (cycles_chi2 - cycles_dof) / (2 * cycles_dof) ** 0.5,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de sorteos")
+    parser.add_argument("--n", type=int, default=10, help="participantes por sorteo")
+    parser.add_argument("--draws", type=int, default=1_000_000, help="sorteos a simular")
+    parser.add_argument("--python-draws", type=int, default=100_000,
+                        help="sorteos para los motores en Python puro (más lentos)")
+    parser.add_argument("--engines", nargs="+", choices=list(ENGINES), default=["rejection", "cycle", "uniform"])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    print(f"{'engine':<14} {'draws':>9} {'draws/s':>12} {'fixed':>6} {'2-cyc/draw':>10} "
+          f"{'shuffles':>9} {'max':>5} {'chi2 z':>8} {'max dev':>8} {'ciclos':>7} {'ciclos z':>9}")
+    for engine in args.engines:
+        draws = args.python_draws if engine in PYTHON_ENGINES else args.draws
+        r = simulate(engine, args.n, draws, seed=args.seed)
+        print(f"{engine:<14} {r['draws']:>9} {r['draws_per_sec']:>12.0f} {r['fixed_points']:>6} "
+              f"{r['two_cycles_per_draw']:>10.3f} {r['mean_shuffles']:>9.3f} {r['max_shuffles']:>5} "
+              f"{r['chi2_z']:>8.2f} {r['max_cell_deviation']:>8.3f} {r['cycles_per_draw']:>7.3f} "
+              f"{r['cycles_z']:>9.1f}")
+    print("\nchi2 z: desviación respecto a un reparto uniforme (|z| < 3 es compatible con uniforme).")
+    print("ciclos z: número de ciclos por sorteo frente a su distribución exacta en los desarreglos.")
+    print("cycle: una sola cadena, por diseño no es uniforme sobre todos los desarreglos (ciclos z muy alto),")
+    print("pero cada amigo posible sigue siendo igual de probable para cada participante.")
+
+
+if __name__ == "__main__":
+    main()
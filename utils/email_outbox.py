@@ -0,0 +1,308 @@
+"""
+Durable email outbox.
+Letters are queued as one job per recipient in the email_outbox table
+(see utils/email_outbox.sql) and a sender drains the queue with retries and
+exponential backoff. Progress survives reruns and crashes: pressing "send"
+again only sends what is still pending, never what was already delivered.
+"""
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from utils.assignment_store import iter_batches
+from utils.bulk_mailer import TokenBucket, send_bulk
+from utils.config_loader import get_email_settings
+from utils.email_sender import SMTPConnectionPool, StageTimer
+from utils.pagination import iter_rows
+from utils.recipient_plan import email_domain
+
+OUTBOX_TABLE = 'email_outbox'
+CLAIM_FUNCTION = 'claim_email_jobs'
+ENQUEUE_FUNCTION = 'enqueue_email_jobs'
+
+STATUS_PENDING = 'pending'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+# Claimed by a sender that died: it may or may not have been delivered
+STATUS_UNCERTAIN = 'uncertain'
+STATUS_CANCELLED = 'cancelled'
+STATUSES = (STATUS_PENDING, STATUS_SENDING, STATUS_SENT, STATUS_FAILED,
+            STATUS_UNCERTAIN, STATUS_CANCELLED)
+
+# Rows per upsert request when queueing
+ENQUEUE_BATCH_SIZE = 500
+
+
+def letters_campaign(year: int) -> str:
+    """Outbox campaign name of the letters of `year`."""
+    return f"cartas-{year}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def content_hash(message: dict) -> str:
+    """Fingerprint of what a recipient would receive."""
+    digest = hashlib.sha256()
+    for field in ('to_email', 'subject', 'html_body', 'text_body'):
+        digest.update((message.get(field) or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def backoff_seconds(attempts: int, base: float, cap: float) -> float:
+    """Delay before the next try after `attempts` failed attempts."""
+    return min(cap, base * 2 ** max(0, attempts - 1))
+
+
+def _needs_queueing(current: Optional[dict], fingerprint: str, resend: bool) -> bool:
+    """Whether a message would be written by enqueue_email_jobs (same rules)."""
+    if current is None or current['status'] == STATUS_CANCELLED:
+        return True
+    if current['content_hash'] == fingerprint or current['status'] == STATUS_SENDING:
+        return False
+    return resend or current['status'] not in (STATUS_SENT, STATUS_UNCERTAIN)
+
+
+def enqueue_messages(supabase, campaign: str, messages: List[dict], resend: bool = False) -> Dict[str, int]:
+    """
+    Queue one job per message, keyed by campaign and recipient user id.
+
+    Enqueueing is idempotent: a job whose content did not change keeps its
+    status. A job whose letter changed (new friend, new wishes) is queued
+    again unless it is being sent right now (left to its sender, or to
+    recover_stale_jobs) or was already delivered ('sent' or 'uncertain'),
+    which is only queued again with `resend`. The reset happens in the
+    enqueue_email_jobs function (utils/email_outbox.sql), so a job claimed
+    in the meantime is never reset. Pending jobs of users that are no
+    longer in `messages` are cancelled.
+
+    Args:
+        campaign: Campaign name (see letters_campaign)
+        messages: Dictionaries with 'key' (user id), 'to_email', 'subject',
+                  'html_body' and optional 'text_body'
+        resend: Also queue again changed letters that were already delivered
+
+    Returns:
+        Dictionary with 'queued', 'requeued', 'unchanged', 'held' (changed
+        but in flight or already delivered) and 'cancelled' counts
+    """
+    existing = {
+        row['user_id']: row
+        for row in iter_rows(supabase, OUTBOX_TABLE, 'id, user_id, content_hash, status',
+                             filters=[('eq', 'campaign', campaign)])
+    }
+
+    jobs = []
+    unchanged = 0
+    for message in messages:
+        fingerprint = content_hash(message)
+        current = existing.get(message['key'])
+        if not _needs_queueing(current, fingerprint, resend):
+            if current['content_hash'] == fingerprint:
+                unchanged += 1
+            continue
+        jobs.append({
+            'user_id': message['key'],
+            'to_email': message['to_email'],
+            'subject': message['subject'],
+            'html_body': message['html_body'],
+            'text_body': message.get('text_body'),
+            'content_hash': fingerprint,
+        })
+
+    queued = requeued = 0
+    for batch in iter_batches(jobs, ENQUEUE_BATCH_SIZE):
+        response = supabase.rpc(ENQUEUE_FUNCTION, {
+            'p_campaign': campaign, 'p_jobs': batch, 'p_resend': resend,
+        }).execute()
+        for row in response.data or []:
+            if row['inserted']:
+                queued += 1
+            else:
+                requeued += 1
+
+    keys = {message['key'] for message in messages}
+    stale = [row['id'] for user_id, row in existing.items()
+             if user_id not in keys and row['status'] == STATUS_PENDING]
+    cancelled = 0
+    for batch in iter_batches(stale, ENQUEUE_BATCH_SIZE):
+        # Only jobs still pending: one claimed since the read is left alone
+        response = supabase.table(OUTBOX_TABLE).update({'status': STATUS_CANCELLED}).in_(
+            'id', batch).eq('status', STATUS_PENDING).execute()
+        cancelled += len(response.data or [])
+
+    return {
+        'queued': queued,
+        'requeued': requeued,
+        'unchanged': unchanged,
+        'held': len(messages) - unchanged - queued - requeued,
+        'cancelled': cancelled,
+    }
+
+
+def retry_failed(supabase, campaign: str, include_uncertain: bool = False) -> int:
+    """
+    Queue failed jobs again (and 'uncertain' ones if asked to).
+
+    Returns:
+        Number of jobs queued again
+    """
+    statuses = [STATUS_FAILED] + ([STATUS_UNCERTAIN] if include_uncertain else [])
+    response = supabase.table(OUTBOX_TABLE).update({
+        'status': STATUS_PENDING,
+        'attempts': 0,
+        'next_attempt_at': _now().isoformat(),
+        'last_error': None,
+    }).eq('campaign', campaign).in_('status', statuses).execute()
+    return len(response.data or [])
+
+
+def recover_stale_jobs(supabase, campaign: str, lease_seconds: Optional[float] = None) -> int:
+    """
+    Mark jobs claimed longer than `lease_seconds` ago as 'uncertain'.
+
+    Such a job belonged to a sender that stopped between claiming and
+    recording the outcome, so the email may already have gone out. It is
+    not resent automatically; see retry_failed(include_uncertain=True).
+
+    Returns:
+        Number of jobs marked
+    """
+    lease_seconds = lease_seconds or get_email_settings()['lease_seconds']
+    cutoff = (_now() - timedelta(seconds=lease_seconds)).isoformat()
+    response = supabase.table(OUTBOX_TABLE).update({
+        'status': STATUS_UNCERTAIN,
+        'last_error': 'Sender stopped before recording the result',
+    }).eq('campaign', campaign).eq('status', STATUS_SENDING).lt('claimed_at', cutoff).execute()
+    return len(response.data or [])
+
+
+def claim_jobs(supabase, campaign: str, limit: int) -> List[dict]:
+    """Atomically claim up to `limit` due jobs (status becomes 'sending')."""
+    response = supabase.rpc(CLAIM_FUNCTION, {'p_campaign': campaign, 'p_limit': limit}).execute()
+    return response.data or []
+
+
+def _record_result(supabase, job: dict, result: dict, settings: dict) -> str:
+    """Store the outcome of one claimed job and return its new status."""
+    if result['ok']:
+        update = {'status': STATUS_SENT, 'sent_at': _now().isoformat(), 'last_error': None}
+    elif not result['attempted']:
+        # Skipped after an abort: give the attempt back
+        update = {'status': STATUS_PENDING, 'attempts': max(0, job['attempts'] - 1)}
+    elif job['attempts'] >= settings['max_attempts']:
+        update = {'status': STATUS_FAILED, 'last_error': result['error']}
+    else:
+        delay = backoff_seconds(job['attempts'], settings['retry_base_seconds'], settings['retry_max_seconds'])
+        update = {
+            'status': STATUS_PENDING,
+            'next_attempt_at': (_now() + timedelta(seconds=delay)).isoformat(),
+            'last_error': result['error'],
+        }
+    supabase.table(OUTBOX_TABLE).update(update).eq('id', job['id']).execute()
+    return update['status']
+
+
+def _message_id(job: dict, domain: str) -> str:
+    """Stable Message-ID, so a resent letter can be recognised as the same one."""
+    return f"<{job['campaign']}.{job['user_id']}.{job['content_hash'][:16]}@{domain}>"
+
+
+def drain_outbox(supabase, campaign: str, batch_size: Optional[int] = None,
+                 concurrency: Optional[int] = None, rate: Optional[float] = None,
+                 config: Optional[dict] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 on_result: Optional[Callable[[dict], None]] = None) -> Dict[str, object]:
+    """
+    Send every due job of `campaign`, one claimed batch at a time.
+
+    Each outcome is written back as soon as it is known, so after a crash
+    at most the messages in flight end up 'uncertain'. Jobs waiting for a
+    retry later than now are left for a future call.
+
+    Args:
+        batch_size: Jobs claimed per round (defaults to config.json)
+        concurrency: Parallel SMTP connections (defaults to config.json)
+        rate: Maximum messages per second (defaults to config.json)
+        config: Optional SMTP configuration (defaults to the environment)
+        should_stop: Optional callable checked between batches
+        on_result: Optional callback called with every send result, including
+                   the job's new 'status'
+
+    Returns:
+        Dictionary with 'sent', 'retrying', 'failed', 'recovered' counts,
+        'aborted' (SMTP authentication error), 'seconds' and 'timings'
+        (seconds per stage: 'mime', 'transmit' and 'record' of the outcome)
+
+    Raises:
+        EmailConfigError: if SMTP configuration is invalid
+    """
+    settings = get_email_settings()
+    batch_size = batch_size or settings['claim_batch_size']
+    concurrency = concurrency or settings['concurrency']
+    rate = settings['rate_per_sec'] if rate is None else rate
+    # Validates the SMTP configuration before touching the queue
+    pool = SMTPConnectionPool(size=concurrency, config=config)
+
+    counts = {STATUS_SENT: 0, STATUS_PENDING: 0, STATUS_FAILED: 0}
+    aborted = False
+    start = time.perf_counter()
+    recovered = recover_stale_jobs(supabase, campaign, settings['lease_seconds'])
+
+    limiter = TokenBucket(rate, settings['burst'])
+    timer = StageTimer()
+    with pool:
+        while not aborted and not (should_stop and should_stop()):
+            jobs = claim_jobs(supabase, campaign, batch_size)
+            if not jobs:
+                break
+            by_id = {job['id']: job for job in jobs}
+            messages = [{
+                'key': job['id'],
+                'to_email': job['to_email'],
+                'subject': job['subject'],
+                'html_body': job['html_body'],
+                'text_body': job.get('text_body'),
+                'message_id': _message_id(job, pool.mailer.domain),
+            } for job in jobs]
+
+            def record(result):
+                if result['attempted']:
+                    timer.add('mime', result['mime_seconds'])
+                    timer.add('transmit', result['transmit_seconds'])
+                with timer.measure('record'):
+                    status = _record_result(supabase, by_id[result['key']], result, settings)
+                result['status'] = status
+                if result['attempted']:
+                    counts[status] += 1
+                if on_result:
+                    on_result(result)
+
+            outcome = send_bulk(messages, concurrency=concurrency, pool=pool, limiter=limiter,
+                                group_by=email_domain if settings['group_by_domain'] else None,
+                                on_result=record)
+            aborted = outcome['aborted']
+
+    return {
+        'sent': counts[STATUS_SENT],
+        'retrying': counts[STATUS_PENDING],
+        'failed': counts[STATUS_FAILED],
+        'recovered': recovered,
+        'aborted': aborted,
+        'seconds': time.perf_counter() - start,
+        'timings': timer.report(),
+    }
+
+
+def outbox_status(supabase, campaign: str) -> Dict[str, int]:
+    """Number of jobs of `campaign` in every status."""
+    status = {}
+    for name in STATUSES:
+        response = supabase.table(OUTBOX_TABLE).select('id', count='exact', head=True) \
+            .eq('campaign', campaign).eq('status', name).execute()
+        status[name] = response.count or 0
+    return status
@@ -0,0 +1,87 @@
+-- Durable outbox for letter emails
+-- One job per campaign and recipient. The sender claims due jobs with
+-- claim_email_jobs (status 'sending'), then records each outcome: 'sent',
+-- 'pending' again with a backoff delay, or 'failed' once the attempts run
+-- out. A job left in 'sending' by a crashed sender is marked 'uncertain'
+-- and is never resent automatically.
+
+CREATE TABLE IF NOT EXISTS "secret-santa".email_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    campaign VARCHAR(100) NOT NULL,
+    user_id INT NOT NULL,
+    to_email VARCHAR(255) NOT NULL,
+    subject TEXT NOT NULL,
+    html_body TEXT NOT NULL,
+    text_body TEXT,
+    content_hash VARCHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    claimed_at TIMESTAMPTZ,
+    sent_at TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (campaign, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS email_outbox_due_idx
+    ON "secret-santa".email_outbox (campaign, status, next_attempt_at);
+
+ALTER TABLE "secret-santa".email_outbox ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable all access for service role" ON "secret-santa".email_outbox
+    FOR ALL USING (true);
+
+-- Atomically move up to p_limit due jobs to 'sending' and return them.
+-- SKIP LOCKED lets several senders drain the same campaign safely.
+CREATE OR REPLACE FUNCTION "secret-santa".claim_email_jobs(p_campaign VARCHAR, p_limit INT)
+RETURNS SETOF "secret-santa".email_outbox
+LANGUAGE sql
+AS $$
+    UPDATE "secret-santa".email_outbox
+    SET status = 'sending', claimed_at = NOW(), attempts = attempts + 1
+    WHERE id IN (
+        SELECT id
+        FROM "secret-santa".email_outbox
+        WHERE campaign = p_campaign
+          AND status = 'pending'
+          AND next_attempt_at <= NOW()
+        ORDER BY next_attempt_at, id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$;
+
+-- Queue or re-queue letters. A job is reset to 'pending' only when its
+-- content changed (or it was cancelled) and nobody is sending it right now:
+-- jobs in 'sending' are left to their sender (or to recover_stale_jobs), and
+-- delivered ('sent') or possibly delivered ('uncertain') jobs are only
+-- queued again when p_resend is true. Returns the jobs written.
+CREATE OR REPLACE FUNCTION "secret-santa".enqueue_email_jobs(p_campaign VARCHAR, p_jobs JSONB,
+                                                             p_resend BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (job_user_id INT, inserted BOOLEAN)
+LANGUAGE sql
+AS $$
+    INSERT INTO "secret-santa".email_outbox AS o
+        (campaign, user_id, to_email, subject, html_body, text_body, content_hash)
+    SELECT p_campaign, j.user_id, j.to_email, j.subject, j.html_body, j.text_body, j.content_hash
+    FROM jsonb_to_recordset(p_jobs) AS j(user_id INT, to_email VARCHAR, subject TEXT,
+                                         html_body TEXT, text_body TEXT, content_hash VARCHAR)
+    ON CONFLICT (campaign, user_id) DO UPDATE
+    SET to_email = EXCLUDED.to_email,
+        subject = EXCLUDED.subject,
+        html_body = EXCLUDED.html_body,
+        text_body = EXCLUDED.text_body,
+        content_hash = EXCLUDED.content_hash,
+        status = 'pending',
+        attempts = 0,
+        next_attempt_at = NOW(),
+        claimed_at = NULL,
+        sent_at = NULL,
+        last_error = NULL
+    WHERE o.status <> 'sending'
+      AND (o.content_hash <> EXCLUDED.content_hash OR o.status = 'cancelled')
+      AND (o.status NOT IN ('sent', 'uncertain') OR p_resend)
+    RETURNING o.user_id, (o.xmax = 0);
+$$;
@@ -1,11 +1,27 @@
+import base64
 import os
+import queue
+import secrets
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.header import Header
 from email.message import EmailMessage
+from email.policy import SMTPUTF8
+from email.utils import formataddr, formatdate, make_msgid, parseaddr
+from typing import Dict
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Errors after which the connection is considered dropped and is reopened
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+# Plain-text part used when a message has no text alternative
+FALLBACK_TEXT_BODY = "Tu carta de Amigo Secreto está disponible en formato HTML."
+
 
 class EmailConfigError(Exception):
     """Raised when email configuration is invalid or incomplete."""
@@ -20,6 +36,7 @@ def _get_smtp_config():
     password = os.getenv("SMTP_PASSWORD")
     from_email = os.getenv("SMTP_FROM", user)
     use_tls = os.getenv("SMTP_USE_TLS", "true").lower() in {"1", "true", "yes"}
+    max_messages = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
 
     if not host or not user or not password or not from_email:
         raise EmailConfigError(
@@ -34,35 +51,337 @@ def _get_smtp_config():
         "password": password,
         "from_email": from_email,
         "use_tls": use_tls,
+        "max_messages_per_connection": max_messages,
     }
 
 
-def send_email(to_email: str, subject: str, html_body: str, text_body: str | None = None) -> None:
+def _header_value(value: str) -> str:
+    """Reject CR/LF so user data cannot inject extra headers."""
+    if "\r" in value or "\n" in value:
+        raise ValueError("Header values must not contain line breaks")
+    return value
+
+
+def _encode_subject(subject: str) -> str:
+    _header_value(subject)
+    if subject.isascii():
+        return subject
+    return Header(subject, "utf-8", header_name="Subject").encode(linesep="\r\n")
+
+
+def _needs_smtputf8(address: str) -> bool:
+    """Non-ASCII local parts can only be delivered with the SMTPUTF8 extension."""
+    return not address.rpartition("@")[0].isascii()
+
+
+def _ascii_address(address: str) -> str:
+    """Address with its domain IDNA-encoded (bücher.example -> xn--bcher-kva.example)."""
+    local, at, domain = address.rpartition("@")
+    if not at or domain.isascii():
+        return address
+    return f"{local}@{domain.encode('idna').decode('ascii')}"
+
+
+class StageTimer:
+    """Thread-safe accumulator of seconds spent per stage (render, mime, transmit...)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def report(self) -> Dict[str, dict]:
+        """{stage: {'seconds', 'count', 'avg_ms'}} for every measured stage."""
+        with self._lock:
+            return {
+                stage: {
+                    'seconds': seconds,
+                    'count': self._counts[stage],
+                    'avg_ms': 1000 * seconds / self._counts[stage],
+                }
+                for stage, seconds in self._seconds.items()
+            }
+
+
+class Mailer:
+    """
+    Builds outgoing messages from a configuration validated once.
+
+    The headers and MIME parts that are the same for every message (From,
+    MIME-Version, the multipart boundary and the fallback text part) are
+    encoded once; each message only encodes its own recipient, subject and
+    bodies into raw bytes ready for SMTP, without going through the
+    EmailMessage object model. Recipient domains are IDNA-encoded; a
+    recipient whose local part is not ASCII gets an EmailMessage with UTF-8
+    headers instead, sent with the SMTPUTF8 extension (see envelope_to).
+
+    :param config: Optional SMTP configuration (defaults to the environment)
+    :raises EmailConfigError: if SMTP configuration is invalid
+    """
+
+    def __init__(self, config: dict | None = None):
+        self.config = config or _get_smtp_config()
+        name, address = parseaddr(self.config["from_email"])
+        self.envelope_from = address or self.config["from_email"]
+        self.domain = self.envelope_from.rsplit("@", 1)[-1] or "localhost"
+        # '_' is not a base64 character, so no encoded body can contain it
+        self._boundary = f"=_secret_santa_{secrets.token_hex(12)}"
+        self._head = (
+            f"From: {_header_value(formataddr((name, self.envelope_from)))}\r\n"
+            "MIME-Version: 1.0\r\n"
+            f'Content-Type: multipart/alternative; boundary="{self._boundary}"\r\n'
+        ).encode("ascii")
+        self._fallback_text_part = self._part("text/plain", FALLBACK_TEXT_BODY)
+        self._closing = f"--{self._boundary}--\r\n".encode("ascii")
+
+    def _part(self, content_type: str, body: str) -> bytes:
+        return (
+            f"--{self._boundary}\r\n"
+            f'Content-Type: {content_type}; charset="utf-8"\r\n'
+            "Content-Transfer-Encoding: base64\r\n\r\n"
+        ).encode("ascii") + base64.encodebytes(body.encode("utf-8")).replace(b"\n", b"\r\n")
+
+    def envelope_to(self, to_email: str) -> tuple[str, list[str]]:
+        """RCPT TO address of `to_email` and the MAIL FROM options it needs."""
+        address = parseaddr(to_email)[1] or to_email
+        if _needs_smtputf8(address):
+            return address, ["SMTPUTF8"]
+        return _ascii_address(address), []
+
+    def build(self, to_email: str, subject: str, html_body: str, text_body: str | None = None,
+              message_id: str | None = None) -> bytes:
+        """Raw RFC 5322 bytes of a text + HTML message."""
+        name, address = parseaddr(_header_value(to_email))
+        address = address or to_email
+        if _needs_smtputf8(address):
+            return self._build_smtputf8(to_email, subject, html_body, text_body, message_id)
+        headers = (
+            f"To: {formataddr((name, _ascii_address(address)))}\r\n"
+            f"Subject: {_encode_subject(subject)}\r\n"
+            f"Date: {formatdate(usegmt=True)}\r\n"
+            f"Message-ID: {_header_value(message_id) if message_id else make_msgid(domain=self.domain)}\r\n"
+        ).encode("ascii")
+        text_part = self._part("text/plain", text_body) if text_body else self._fallback_text_part
+        return b"".join((
+            headers, self._head, b"\r\n",
+            text_part, b"\r\n",
+            self._part("text/html", html_body), b"\r\n",
+            self._closing,
+        ))
+
+    def _build_smtputf8(self, to_email: str, subject: str, html_body: str, text_body: str | None,
+                        message_id: str | None) -> bytes:
+        """Same message with UTF-8 headers, for recipients with a non-ASCII local part."""
+        msg = EmailMessage(policy=SMTPUTF8)
+        msg["From"] = self.config["from_email"]
+        msg["To"] = to_email
+        msg["Subject"] = subject
+        msg["Date"] = formatdate(usegmt=True)
+        msg["Message-ID"] = message_id or make_msgid(domain=self.domain)
+        msg.set_content(text_body or FALLBACK_TEXT_BODY)
+        msg.add_alternative(html_body, subtype="html")
+        return msg.as_bytes()
+
+
+_default_mailer: Mailer | None = None
+
+
+def get_mailer() -> Mailer:
+    """
+    Get or create the Mailer singleton for the environment configuration.
+
+    :raises EmailConfigError: if SMTP configuration is invalid
+    """
+    global _default_mailer
+    if _default_mailer is None:
+        _default_mailer = Mailer()
+    return _default_mailer
+
+
+def _open_connection(config: dict) -> smtplib.SMTP:
+    smtp = smtplib.SMTP(config["host"], config["port"])
+    try:
+        if config["use_tls"]:
+            smtp.starttls()
+        smtp.login(config["user"], config["password"])
+    except Exception:
+        smtp.close()
+        raise
+    return smtp
+
+
+def send_email(to_email: str, subject: str, html_body: str, text_body: str | None = None,
+               mailer: Mailer | None = None) -> None:
     """Send an HTML email using SMTP configuration from environment variables.
 
+    Opens a connection for this single message. For many messages use
+    SMTPSession, which reuses one authenticated connection.
+
     :param to_email: Recipient email address
     :param subject: Email subject
     :param html_body: HTML body content
     :param text_body: Optional plain-text alternative
+    :param mailer: Optional Mailer with its own configuration (defaults to the environment)
     :raises EmailConfigError: if SMTP configuration is invalid
     :raises smtplib.SMTPException: for SMTP related errors
     """
-    config = _get_smtp_config()
+    mailer = mailer or get_mailer()
+    raw = mailer.build(to_email, subject, html_body, text_body)
 
-    msg = EmailMessage()
-    msg["Subject"] = subject
-    msg["From"] = config["from_email"]
-    msg["To"] = to_email
+    recipient, options = mailer.envelope_to(to_email)
 
-    # Fallback text body
-    if not text_body:
-        text_body = "Tu carta de Amigo Secreto está disponible en formato HTML."
+    with _open_connection(mailer.config) as smtp:
+        smtp.sendmail(mailer.envelope_from, [recipient], raw, mail_options=options)
 
-    msg.set_content(text_body)
-    msg.add_alternative(html_body, subtype="html")
 
-    with smtplib.SMTP(config["host"], config["port"]) as smtp:
-        if config["use_tls"]:
-            smtp.starttls()
-        smtp.login(config["user"], config["password"])
-        smtp.send_message(msg)
+class SMTPSession:
+    """Authenticated SMTP connection reused across many messages.
+
+    The connection is opened lazily, recycled after
+    SMTP_MAX_MESSAGES_PER_CONNECTION messages (providers often cap it) and
+    reopened transparently when the server drops it.
+
+    Usage::
+
+        with SMTPSession() as smtp:
+            for letter in letters:
+                smtp.send(letter.to, letter.subject, letter.html)
+
+    :param config: Optional SMTP configuration (defaults to the environment)
+    :param mailer: Optional Mailer to build messages with (overrides config)
+    :raises EmailConfigError: if SMTP configuration is invalid
+    """
+
+    def __init__(self, config: dict | None = None, mailer: Mailer | None = None):
+        self.mailer = mailer or (Mailer(config) if config else get_mailer())
+        self.config = self.mailer.config
+        self._smtp: smtplib.SMTP | None = None
+        self._sent_on_connection = 0
+        self.connections_opened = 0
+        self.messages_sent = 0
+
+    def __enter__(self) -> "SMTPSession":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _connect(self) -> smtplib.SMTP:
+        self.close()
+        self._smtp = _open_connection(self.config)
+        self._sent_on_connection = 0
+        self.connections_opened += 1
+        return self._smtp
+
+    def close(self) -> None:
+        """Close the connection (QUIT), ignoring errors on a dead socket."""
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:  # noqa: BLE001
+            self._smtp.close()
+        self._smtp = None
+
+    def _deliver(self, transmit) -> None:
+        """Run `transmit(smtp)`, reconnecting once if the connection dropped."""
+        limit = self.config.get("max_messages_per_connection") or 0
+        if self._smtp is None or (limit and self._sent_on_connection >= limit):
+            self._connect()
+        try:
+            transmit(self._smtp)
+        except _CONNECTION_ERRORS:
+            transmit(self._connect())
+        self._sent_on_connection += 1
+        self.messages_sent += 1
+
+    def send_raw(self, to_email: str, raw: bytes) -> None:
+        """Send a message built by Mailer.build.
+
+        :raises smtplib.SMTPException: for SMTP related errors
+        """
+        recipient, options = self.mailer.envelope_to(to_email)
+        self._deliver(lambda smtp: smtp.sendmail(self.mailer.envelope_from, [recipient], raw, mail_options=options))
+
+    def send_message(self, msg: EmailMessage) -> None:
+        """Send a prepared EmailMessage.
+
+        :raises smtplib.SMTPException: for SMTP related errors
+        """
+        self._deliver(lambda smtp: smtp.send_message(msg))
+
+    def send(self, to_email: str, subject: str, html_body: str, text_body: str | None = None) -> None:
+        """Send an HTML email over the shared connection (same arguments as send_email)."""
+        self.send_raw(to_email, self.mailer.build(to_email, subject, html_body, text_body))
+
+
+class SMTPConnectionPool:
+    """Thread-safe pool of SMTPSession objects.
+
+    Sessions are created on demand up to `size` and handed out one thread
+    at a time, so concurrent senders reuse authenticated connections.
+
+    :param size: Maximum number of open sessions
+    :param config: Optional SMTP configuration (defaults to the environment)
+    :param mailer: Optional Mailer shared by the sessions (overrides config)
+    :raises EmailConfigError: if SMTP configuration is invalid
+    """
+
+    def __init__(self, size: int = 4, config: dict | None = None, mailer: Mailer | None = None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.mailer = mailer or (Mailer(config) if config else get_mailer())
+        self.config = self.mailer.config
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._all: list[SMTPSession] = []
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "SMTPConnectionPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @contextmanager
+    def session(self):
+        """Borrow a session for the duration of a `with` block."""
+        session = self._acquire()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def _acquire(self) -> SMTPSession:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._all) < self.size:
+                session = SMTPSession(mailer=self.mailer)
+                self._all.append(session)
+                return session
+        return self._idle.get()
+
+    @property
+    def connections_opened(self) -> int:
+        return sum(s.connections_opened for s in self._all)
+
+    def close(self) -> None:
+        """Close every session of the pool."""
+        for session in self._all:
+            session.close()
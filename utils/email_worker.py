@@ -0,0 +1,209 @@
+"""
+Background email worker.
+Drains the email outbox (utils/email_outbox.py) in a thread that lives
+outside the Streamlit script run, so the admin page only enqueues letters
+and polls the worker's in-memory status while the campaign goes out.
+
+It can also run as its own process:
+    python utils/email_worker.py
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+from utils.config_loader import get_current_year, get_email_settings
+from utils.email_sender import StageTimer
+from utils.email_outbox import (
+    STATUS_FAILED, STATUS_PENDING, STATUS_SENDING, STATUS_SENT,
+    drain_outbox, letters_campaign, outbox_status,
+)
+
+_workers: Dict[str, "EmailWorker"] = {}
+_workers_lock = threading.Lock()
+
+
+class EmailWorker:
+    """
+    Thread that sends every job of a campaign until the queue is empty.
+
+    Jobs waiting for a retry are picked up by polling the outbox every
+    `poll_seconds`. `status()` only reads memory, so it is cheap enough to
+    be polled from the UI every second or two.
+    """
+
+    def __init__(self, supabase, campaign: str, poll_seconds: Optional[float] = None):
+        self.supabase = supabase
+        self.campaign = campaign
+        self.poll_seconds = poll_seconds or get_email_settings()['worker_poll_seconds']
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._counts: Dict[str, int] = {}
+        self._sent = 0
+        self._failed = 0
+        self._retrying = 0
+        self._timer = StageTimer()
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._aborted = False
+        self._error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the worker thread (no-op if it is already running)."""
+        if self.running:
+            return
+        self._stop.clear()
+        with self._lock:
+            self._sent = self._failed = self._retrying = 0
+            self._timer = StageTimer()
+            self._started_at = time.monotonic()
+            self._finished_at = None
+            self._aborted = False
+            self._error = None
+        self._thread = threading.Thread(target=self._run, name=f"email-worker-{self.campaign}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Ask the worker to stop after the batch in flight."""
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _refresh_counts(self) -> Dict[str, int]:
+        counts = outbox_status(self.supabase, self.campaign)
+        with self._lock:
+            self._counts = counts
+        return counts
+
+    def _on_result(self, result: dict) -> None:
+        if not result['attempted']:
+            return
+        self._timer.add('mime', result['mime_seconds'])
+        self._timer.add('transmit', result['transmit_seconds'])
+        with self._lock:
+            status = result['status']
+            if status == STATUS_SENT:
+                self._sent += 1
+            elif status == STATUS_FAILED:
+                self._failed += 1
+            else:
+                self._retrying += 1
+            # Keep the queue counters live between refreshes (a retry stays queued)
+            if status != STATUS_PENDING:
+                self._counts[status] = self._counts.get(status, 0) + 1
+                self._counts[STATUS_PENDING] = max(0, self._counts.get(STATUS_PENDING, 0) - 1)
+
+    def _run(self) -> None:
+        try:
+            self._refresh_counts()
+            while not self._stop.is_set():
+                outcome = drain_outbox(self.supabase, self.campaign,
+                                       should_stop=self._stop.is_set, on_result=self._on_result)
+                counts = self._refresh_counts()
+                if outcome['aborted']:
+                    with self._lock:
+                        self._aborted = True
+                    break
+                if not counts[STATUS_PENDING] and not counts[STATUS_SENDING]:
+                    break
+                # Only retries scheduled for later are left
+                self._stop.wait(self.poll_seconds)
+        except Exception as e:  # noqa: BLE001
+            with self._lock:
+                self._error = str(e)
+        finally:
+            with self._lock:
+                self._finished_at = time.monotonic()
+
+    def status(self) -> Dict[str, object]:
+        """
+        Snapshot of the campaign progress.
+
+        Returns:
+            Dictionary with 'campaign', 'running', 'sent', 'failed',
+            'retrying' (this run), 'queued' (pending or in flight),
+            'counts' (jobs per status), 'seconds', 'messages_per_sec',
+            'eta_seconds' (None while unknown), 'timings' (seconds per
+            stage, see StageTimer.report), 'aborted' and 'error'
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            end = self._finished_at or time.monotonic()
+            elapsed = end - self._started_at if self._started_at else 0.0
+            sent, failed, retrying = self._sent, self._failed, self._retrying
+            aborted, error = self._aborted, self._error
+            timer = self._timer
+        queued = counts.get(STATUS_PENDING, 0) + counts.get(STATUS_SENDING, 0)
+        rate = sent / elapsed if elapsed > 0 else 0.0
+        return {
+            'campaign': self.campaign,
+            'running': self.running,
+            'sent': sent,
+            'failed': failed,
+            'retrying': retrying,
+            'queued': queued,
+            'counts': counts,
+            'seconds': elapsed,
+            'messages_per_sec': rate,
+            'eta_seconds': queued / rate if rate > 0 else None,
+            'timings': timer.report(),
+            'aborted': aborted,
+            'error': error,
+        }
+
+
+def get_email_worker(campaign: str) -> Optional[EmailWorker]:
+    """Worker of `campaign` in this process, if one was started."""
+    return _workers.get(campaign)
+
+
+def start_email_worker(supabase, campaign: str) -> EmailWorker:
+    """Start (or keep) the single worker of `campaign` in this process."""
+    with _workers_lock:
+        worker = _workers.get(campaign)
+        if worker is None:
+            worker = EmailWorker(supabase, campaign)
+            _workers[campaign] = worker
+        worker.start()
+        return worker
+
+
+def main():
+    from utils.supabase_client import get_supabase_client
+
+    parser = argparse.ArgumentParser(description="Envía los correos pendientes de la cola")
+    parser.add_argument("--year", type=int, default=None, help="año de la campaña (por defecto el de config.json)")
+    args = parser.parse_args()
+
+    campaign = letters_campaign(args.year or get_current_year())
+    worker = start_email_worker(get_supabase_client(), campaign)
+    try:
+        while worker.running:
+            worker.join(5)
+            s = worker.status()
+            print(f"[{campaign}] enviados {s['sent']}, fallidos {s['failed']}, "
+                  f"en cola {s['queued']}, {s['messages_per_sec']:.1f} correos/s")
+    except KeyboardInterrupt:
+        print("Deteniendo tras el lote en curso...")
+        worker.stop()
+        worker.join()
+
+    s = worker.status()
+    if s['error'] or s['aborted']:
+        print(f"Error: {s['error'] or 'autenticación SMTP fallida'}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Campaña {campaign}: {s['sent']} enviados, {s['failed']} fallidos, {s['queued']} en cola.")
+
+
+if __name__ == "__main__":
+    main()
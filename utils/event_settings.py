@@ -0,0 +1,102 @@
+"""
+Event-level settings store.
+Global flags such as the wishes lock live in the event_settings key/value
+table (see utils/event_settings.sql): changing one is a single-row write,
+and readers share a cached value for SETTINGS_CACHE_TTL seconds instead of
+querying on every page load. Until the table is created the wishes lock
+falls back to the per-user wishes_locked column.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+SETTINGS_TABLE = 'event_settings'
+WISHES_LOCKED = 'wishes_locked'
+# Seconds a setting is reused before reading it again
+SETTINGS_CACHE_TTL = 10
+
+_settings_cache: Dict[str, tuple] = {}
+
+# Marks a setting that has no row
+_MISSING = object()
+
+# PostgREST / PostgreSQL error codes of a table that does not exist
+MISSING_TABLE_CODES = {'PGRST205', '42P01'}
+
+
+def is_missing_table(error: Exception) -> bool:
+    """Whether a Supabase error means the table or view does not exist yet."""
+    return getattr(error, 'code', None) in MISSING_TABLE_CODES
+
+
+def _read_setting(supabase, key: str) -> Any:
+    response = supabase.table(SETTINGS_TABLE).select('value').eq('key', key).execute()
+    if not response.data:
+        return _MISSING
+    return response.data[0]['value']
+
+
+def get_setting(supabase, key: str, default: Any = None, max_age: float = SETTINGS_CACHE_TTL) -> Any:
+    """
+    Value of a setting, cached for `max_age` seconds.
+
+    Returns:
+        The stored value, or `default` if the setting has no row
+    """
+    now = time.monotonic()
+    cached = _settings_cache.get(key)
+    if cached is None or now - cached[0] >= max_age:
+        cached = (now, _read_setting(supabase, key))
+        _settings_cache[key] = cached
+    return default if cached[1] is _MISSING else cached[1]
+
+
+def set_setting(supabase, key: str, value: Any) -> None:
+    """Store a setting (one row) and refresh the local cache."""
+    supabase.table(SETTINGS_TABLE).upsert({
+        'key': key,
+        'value': value,
+        'updated_at': datetime.now(timezone.utc).isoformat(),
+    }, on_conflict='key').execute()
+    _settings_cache[key] = (time.monotonic(), value)
+
+
+def invalidate_settings() -> None:
+    """Forget every cached setting."""
+    _settings_cache.clear()
+
+
+def is_wishes_locked(supabase, max_age: float = SETTINGS_CACHE_TTL) -> bool:
+    """
+    Whether wishes editing is locked for everyone.
+
+    Use max_age=0 right before a write that the lock must stop.
+    """
+    try:
+        return bool(get_setting(supabase, WISHES_LOCKED, False, max_age))
+    except Exception as e:
+        if not is_missing_table(e):
+            raise
+        # event_settings not created yet (utils/event_settings.sql)
+    # The lock status is global (applied to all users), any row tells it
+    response = supabase.table('users').select('wishes_locked').order('id').limit(1).execute()
+    return bool(response.data and response.data[0]['wishes_locked'])
+
+
+def set_wishes_locked(supabase, lock: bool) -> None:
+    """
+    Lock or unlock wishes editing for everyone.
+
+    Raises:
+        Exception: any error other than event_settings not existing, so a
+        failed write is never hidden behind the per-user column
+    """
+    try:
+        set_setting(supabase, WISHES_LOCKED, lock)
+        return
+    except Exception as e:
+        if not is_missing_table(e):
+            raise
+        # event_settings not created yet (utils/event_settings.sql)
+    # Supabase blocks updates without a filter; id > 0 covers every user
+    supabase.table('users').update({'wishes_locked': lock}).gt('id', 0).execute()
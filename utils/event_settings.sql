@@ -0,0 +1,21 @@
+-- Event-level settings
+-- One row per setting (e.g. wishes_locked), so changing a global flag is a
+-- single-row write instead of an update of every user
+-- (see utils/event_settings.py).
+CREATE TABLE IF NOT EXISTS "secret-santa".event_settings (
+    key VARCHAR(100) PRIMARY KEY,
+    value JSONB NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Keep the current lock state of the users table
+INSERT INTO "secret-santa".event_settings (key, value)
+SELECT 'wishes_locked', to_jsonb(COALESCE(
+    (SELECT wishes_locked FROM "secret-santa".users ORDER BY id LIMIT 1), FALSE
+))
+ON CONFLICT (key) DO NOTHING;
+
+ALTER TABLE "secret-santa".event_settings ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable all access for service role" ON "secret-santa".event_settings
+    FOR ALL USING (true);
@@ -0,0 +1,15 @@
+-- Admin dashboard counters in one request
+-- Counts users and assignments without returning any row, and reads the
+-- wishes lock (see utils/stats_service.py).
+-- Run utils/event_settings.sql first.
+CREATE OR REPLACE FUNCTION "secret-santa".event_stats()
+RETURNS TABLE (total_users BIGINT, total_assignments BIGINT, wishes_locked BOOLEAN)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        (SELECT COUNT(*) FROM "secret-santa".users),
+        (SELECT COUNT(*) FROM "secret-santa".secret_friends),
+        COALESCE((SELECT (s.value)::BOOLEAN FROM "secret-santa".event_settings s
+                  WHERE s.key = 'wishes_locked'), FALSE);
+$$;
@@ -0,0 +1,102 @@
+"""
+Secret friend lookup for the friend page.
+The friend's card and wishes are read with one request to the
+secret_friend_cards view (see utils/friend_lookup.sql), which joins the
+santa, their assignment and the friend. Until the view is created the
+previous three-step lookup (santa id, assignment, friend row) is used.
+"""
+from typing import Any, Dict, Optional
+
+from utils.event_settings import is_missing_table
+from utils.letter_template import NO_WISH
+
+FRIEND_CARDS_VIEW = 'secret_friend_cards'
+
+FRIEND_COLUMNS = (
+    'character_name, character_photo_url, deseo1, link_deseo1, imagen_deseo1, '
+    'deseo2, link_deseo2, imagen_deseo2, deseo3, link_deseo3, imagen_deseo3, comentarios_generales'
+)
+
+
+def _count_query(stats: Optional[Dict[str, int]]) -> None:
+    if stats is not None:
+        stats['queries'] = stats.get('queries', 0) + 1
+
+
+def build_friend_card(santa_id: int, friend_id: int, friend: dict) -> Dict[str, Any]:
+    """Map the friend's `users` columns to the friend_* keys of the friend page."""
+    return {
+        "santa_id": santa_id,
+        "friend_id": friend_id,
+        "friend_character_name": friend['character_name'],
+        "friend_photo_url": friend['character_photo_url'] or "",
+        "friend_deseo1": friend['deseo1'] or NO_WISH,
+        "friend_link_deseo1": friend['link_deseo1'] or "",
+        "friend_imagen_deseo1": friend['imagen_deseo1'] or "",
+        "friend_deseo2": friend['deseo2'] or NO_WISH,
+        "friend_link_deseo2": friend['link_deseo2'] or "",
+        "friend_imagen_deseo2": friend['imagen_deseo2'] or "",
+        "friend_deseo3": friend['deseo3'] or NO_WISH,
+        "friend_link_deseo3": friend['link_deseo3'] or "",
+        "friend_imagen_deseo3": friend['imagen_deseo3'] or "",
+        "friend_comentarios_generales": friend.get('comentarios_generales', ''),
+    }
+
+
+def fetch_friend_card(supabase, character_name: str,
+                      stats: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Friend card of the santa `character_name` in one request.
+
+    Returns:
+        friend_* dictionary (see build_friend_card), or None if the santa
+        does not exist or has no assignment yet
+    """
+    response = supabase.table(FRIEND_CARDS_VIEW).select(f'santa_id, friend_id, {FRIEND_COLUMNS}').eq(
+        'santa_character_name', character_name
+    ).limit(1).execute()
+    _count_query(stats)
+    if not response.data:
+        return None
+    row = response.data[0]
+    return build_friend_card(row['santa_id'], row['friend_id'], row)
+
+
+def fetch_friend_card_sequential(supabase, character_name: str,
+                                 stats: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    """Same as fetch_friend_card with three requests (santa id, assignment, friend row)."""
+    response = supabase.table('users').select('id').eq('character_name', character_name).execute()
+    _count_query(stats)
+    if not response.data:
+        return None
+    santa_id = response.data[0]['id']
+
+    response = supabase.table('secret_friends').select('id_secret_friend').eq('user_id', santa_id).execute()
+    _count_query(stats)
+    if not response.data:
+        return None
+    friend_id = response.data[0]['id_secret_friend']
+
+    response = supabase.table('users').select(FRIEND_COLUMNS).eq('id', friend_id).execute()
+    _count_query(stats)
+    if not response.data:
+        return None
+    return build_friend_card(santa_id, friend_id, response.data[0])
+
+
+def lookup_friend(supabase, character_name: str) -> Optional[Dict[str, Any]]:
+    """
+    Friend card of a santa: one request through the view, or the
+    three-step lookup while the view does not exist.
+
+    secret_friends is written for seeded draws too, so both paths serve
+    them. The seed is not read here: computing the friend from it still
+    needs the santa and friend rows, which the view returns in one request.
+    """
+    try:
+        return fetch_friend_card(supabase, character_name)
+    except Exception as e:
+        if not is_missing_table(e):
+            raise
+        # secret_friend_cards not created yet (utils/friend_lookup.sql)
+        return fetch_friend_card_sequential(supabase, character_name)
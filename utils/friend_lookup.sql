@@ -0,0 +1,25 @@
+-- One-request secret friend lookup
+-- Joins the santa, their assignment and the friend's card and wishes, so
+-- the friend page reads everything with a single query by character name
+-- (see utils/friend_lookup.py).
+CREATE OR REPLACE VIEW "secret-santa".secret_friend_cards
+WITH (security_invoker = true) AS
+SELECT
+    santa.id AS santa_id,
+    santa.character_name AS santa_character_name,
+    friend.id AS friend_id,
+    friend.character_name,
+    friend.character_photo_url,
+    friend.deseo1,
+    friend.link_deseo1,
+    friend.imagen_deseo1,
+    friend.deseo2,
+    friend.link_deseo2,
+    friend.imagen_deseo2,
+    friend.deseo3,
+    friend.link_deseo3,
+    friend.imagen_deseo3,
+    friend.comentarios_generales
+FROM "secret-santa".users santa
+JOIN "secret-santa".secret_friends sf ON sf.user_id = santa.id
+JOIN "secret-santa".users friend ON friend.id = sf.id_secret_friend;
@@ -0,0 +1,142 @@
+"""
+Group-scoped Secret Santa draws.
+Users are partitioned by their `grupo` column and every group draws
+independently; large draws are solved in parallel in a process pool.
+"""
+import multiprocessing
+import os
+import secrets
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from utils.derangement import MODE_UNIFORM
+from utils.matching import ExclusionRules, NoValidAssignmentError, solve_assignment, solve_with_history_fallback
+from utils.incremental_draw import plan_incremental_draw
+
+# Label used for users without a group
+DEFAULT_GROUP = ""
+# Below this many participants the groups are solved in the current
+# process: it takes less time than starting the worker processes
+POOL_MIN_USERS = 50_000
+
+
+def partition_by_group(rows: List[dict]) -> Dict[Hashable, List[dict]]:
+    """Split `users` rows by their `grupo` column."""
+    groups: Dict[Hashable, List[dict]] = {}
+    for row in rows:
+        groups.setdefault(row.get('grupo') or DEFAULT_GROUP, []).append(row)
+    return groups
+
+
+def _solve_group(task: Tuple[Hashable, List[dict], str, Any, int]) -> Tuple[Hashable, Optional[List[dict]], Optional[str]]:
+    """
+    Draw one group (runs inside a worker process).
+
+    Every task carries its own seed drawn by the parent, so the workers
+    never share or reuse a random state.
+    """
+    group, rows, mode, history, seed = task
+    user_ids = [row['id'] for row in rows]
+    rules = ExclusionRules.from_user_rows(rows)
+    rules.history = history
+    rng = random.Random(seed)
+    try:
+        friend_of = solve_with_history_fallback(
+            lambda: solve_assignment(user_ids, rules, mode=mode, rng=rng), rules
+        )
+    except NoValidAssignmentError as e:
+        return group, None, str(e)
+    return group, [{"user_id": uid, "id_secret_friend": friend_of[uid]} for uid in user_ids], None
+
+
+def run_group_draws(rows: List[dict], history=None, mode: str = MODE_UNIFORM,
+                    max_workers: Optional[int] = None,
+                    pool_min_users: int = POOL_MIN_USERS) -> Dict[str, Any]:
+    """
+    Draw every group independently, in parallel across CPU cores.
+
+    Args:
+        rows: `users` rows with 'id' and optional 'grupo', 'pareja_id', 'equipo'
+        history: Optional PairHistoryIndex of past pairings
+        mode: "uniform" or "cycle"
+        max_workers: Worker processes (defaults to the number of CPUs);
+                     1 solves everything in the current process
+        pool_min_users: Fewer participants than this are solved in the
+                        current process as well
+
+    Returns:
+        Dictionary with:
+        - 'assignments': rows {"user_id", "id_secret_friend"} of all groups
+        - 'groups': number of groups drawn
+        - 'skipped': groups with fewer than 2 members
+        - 'errors': {group: message} for groups without a valid assignment
+    """
+    groups = partition_by_group(rows)
+    skipped = sorted(str(g) for g, members in groups.items() if len(members) < 2)
+    drawable = {g: members for g, members in groups.items() if len(members) >= 2}
+
+    group_of = {row['id']: g for g, members in drawable.items() for row in members}
+    histories = history.partition(group_of) if history else {}
+    tasks = [
+        (group, members, mode, histories.get(group), secrets.randbits(64))
+        for group, members in drawable.items()
+    ]
+
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1 or len(group_of) < pool_min_users:
+        results = [_solve_group(task) for task in tasks]
+    else:
+        # Large groups first, one per task, so no worker is left with the
+        # slowest ones at the end. Spawned workers do not inherit the
+        # threads and locks of the web server, which forking would copy.
+        tasks.sort(key=lambda task: len(task[1]), reverse=True)
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_solve_group, tasks, chunksize=1))
+
+    assignments: List[dict] = []
+    errors: Dict[str, str] = {}
+    for group, group_assignments, error in results:
+        if error:
+            errors[str(group)] = error
+        else:
+            assignments.extend(group_assignments)
+
+    return {
+        'assignments': assignments,
+        'groups': len(tasks),
+        'skipped': skipped,
+        'errors': errors,
+    }
+
+
+def plan_group_incremental_draw(current: Dict[int, int], rows: List[dict],
+                                history=None) -> Dict[str, list]:
+    """
+    Incremental draw per group: new users only join links inside their group.
+
+    Links that now cross groups (a user changed group) are redrawn as well.
+    """
+    groups = partition_by_group(rows)
+    group_of = {row['id']: g for g, members in groups.items() for row in members}
+    histories = history.partition(group_of) if history else {}
+
+    current_by_group: Dict[Hashable, Dict[int, int]] = {}
+    for giver, receiver in current.items():
+        group = group_of.get(giver)
+        if group is not None and group_of.get(receiver) == group:
+            current_by_group.setdefault(group, {})[giver] = receiver
+
+    upserts: List[dict] = []
+    deletes = [giver for giver in current if giver not in group_of]
+    for group, members in groups.items():
+        if len(members) < 2:
+            deletes.extend(row['id'] for row in members if row['id'] in current)
+            continue
+        group_current = current_by_group.get(group, {})
+        rules = ExclusionRules.from_user_rows(members)
+        rules.history = histories.get(group)
+        plan = plan_incremental_draw(group_current, [row['id'] for row in members], rules)
+        upserts.extend(plan['upserts'])
+    return {'upserts': upserts, 'deletes': deletes}
@@ -0,0 +1,105 @@
+"""
+Cross-year assignment history for the Secret Santa draw.
+Archives every draw per year and keeps a compact in-memory index of past
+giver -> receiver pairs so the matching engine can avoid repeating them.
+"""
+from typing import Dict, Hashable, Iterable, Optional
+
+from utils.pagination import iter_rows
+
+HISTORY_TABLE = 'secret_friends_history'
+ARCHIVE_FUNCTION = 'archive_secret_friends'
+
+# User ids are SERIAL (int4), so a pair fits in one int64 key
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+_NO_GROUP = object()
+
+
+def pack_pair(giver: int, receiver: int) -> int:
+    """Pack a giver -> receiver pair into a single int64 key."""
+    return ((giver & _ID_MASK) << _ID_BITS) | (receiver & _ID_MASK)
+
+
+def unpack_pair(key: int):
+    """Inverse of pack_pair."""
+    return key >> _ID_BITS, key & _ID_MASK
+
+
+class PairHistoryIndex:
+    """
+    Set of past giver -> receiver pairs stored as packed int64 keys.
+
+    Membership checks are O(1) and each pair costs one int in a set, instead
+    of a tuple of two ints, no matter how many years are loaded.
+    """
+
+    def __init__(self, keys: Optional[Iterable[int]] = None):
+        self._keys = set(keys) if keys is not None else set()
+
+    def add(self, giver: int, receiver: int) -> None:
+        self._keys.add(pack_pair(giver, receiver))
+
+    def contains(self, giver: int, receiver: int) -> bool:
+        return pack_pair(giver, receiver) in self._keys
+
+    def __contains__(self, pair) -> bool:
+        return self.contains(*pair)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def partition(self, group_of: Dict[int, Hashable]) -> Dict[Hashable, "PairHistoryIndex"]:
+        """
+        Split the index by the giver's group in one pass over the keys.
+        Pairs whose giver has no group are dropped.
+        """
+        parts: Dict[Hashable, PairHistoryIndex] = {}
+        for key in self._keys:
+            group = group_of.get(key >> _ID_BITS, _NO_GROUP)
+            if group is _NO_GROUP:
+                continue
+            if group not in parts:
+                parts[group] = PairHistoryIndex()
+            parts[group]._keys.add(key)
+        return parts
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> "PairHistoryIndex":
+        """Build the index from rows with `user_id` and `id_secret_friend`."""
+        return cls(pack_pair(row['user_id'], row['id_secret_friend']) for row in rows)
+
+
+def load_history_index(supabase, current_year: int, years_back: int,
+                       page_size: Optional[int] = None) -> PairHistoryIndex:
+    """
+    Load past pairings of the last `years_back` years before `current_year`.
+
+    Only a fixed window of years is loaded, so load time and memory depend on
+    the group size, not on how long the event has been running.
+    """
+    index = PairHistoryIndex()
+    for year in range(current_year - years_back, current_year):
+        rows = iter_rows(supabase, HISTORY_TABLE, 'user_id, id_secret_friend', key='user_id',
+                         page_size=page_size, filters=[('eq', 'year', year)])
+        for row in rows:
+            index.add(row['user_id'], row['id_secret_friend'])
+    return index
+
+
+def archive_assignments(supabase, year: int, expected_rows: Optional[int] = None) -> int:
+    """
+    Store the current draw of secret_friends as the draw of `year`,
+    replacing any earlier draw of the same year.
+
+    The delete and the copy run in one transaction on the database (see
+    utils/assignment_history.sql), so the year is never left half-written.
+
+    Args:
+        expected_rows: Optional number of assignments the draw must have
+
+    Returns:
+        Number of archived rows
+    """
+    response = supabase.rpc(ARCHIVE_FUNCTION, {"p_year": year, "p_expected_rows": expected_rows}).execute()
+    return response.data or 0
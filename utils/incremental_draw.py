@@ -0,0 +1,152 @@
+"""
+Incremental Secret Santa draw.
+Adds late registrants to the current draw and removes withdrawn users
+while changing as few secret friends as possible.
+"""
+import random
+from typing import Dict, Iterable, List, Optional
+
+from utils.matching import ExclusionRules, NoValidAssignmentError
+
+# Random swaps tried per unresolved giver before giving up
+DEFAULT_SWAP_ATTEMPTS = 64
+
+APPLY_FUNCTION = 'apply_incremental_draw'
+
+
+def _allowed(rules: Optional[ExclusionRules], giver: int, receiver: int) -> bool:
+    if rules is None:
+        return giver != receiver
+    return rules.is_allowed(giver, receiver)
+
+
+def plan_incremental_draw(current: Dict[int, int], user_ids: Iterable[int],
+                          rules: Optional[ExclusionRules] = None,
+                          rng: Optional[random.Random] = None,
+                          swap_attempts: int = DEFAULT_SWAP_ATTEMPTS) -> Dict[str, list]:
+    """
+    Work out the minimal changes that turn the current draw into a valid
+    draw for `user_ids`.
+
+    A withdrawn user w is bridged over: giver_of[w] now draws friend_of[w].
+    A new user x is spliced in after a random existing giver a, so
+    a -> x -> friend_of[a]. Both keep every chain of the current draw in one
+    piece, so a single gift ring (cycle and seeded draws) stays a single
+    ring, and each change writes at most two rows.
+
+    Args:
+        current: Current draw as {user_id: id_secret_friend}
+        user_ids: Ids of everyone who takes part now
+        rules: Optional exclusion rules for the new links
+        rng: Optional random.Random instance
+        swap_attempts: Random splice points tried per new user
+
+    Returns:
+        Dictionary with:
+        - 'upserts': rows {"user_id", "id_secret_friend"} to write
+        - 'deletes': user ids whose row must be removed
+
+    Raises:
+        NoValidAssignmentError: if the new users cannot be placed without a
+                                full redraw
+    """
+    rng = rng or random.Random()
+    participants = list(user_ids)
+    active = set(participants)
+    n = len(participants)
+    if len(active) < 2:
+        raise NoValidAssignmentError("A draw needs at least 2 participants")
+
+    deletes = [giver for giver in current if giver not in active]
+    links: Dict[int, int] = {}
+
+    def friend(user_id):
+        if user_id in links:
+            return links[user_id]
+        receiver = current.get(user_id)
+        return receiver if receiver in active else None
+
+    received = {r for g, r in current.items() if g in active and r in active}
+
+    # Bridge over withdrawn users: g -> w1 -> w2 -> r becomes g -> r
+    for giver in participants:
+        if friend(giver) is not None or giver not in current:
+            continue
+        receiver = current[giver]
+        for _ in range(len(deletes)):
+            if receiver is None or receiver in active:
+                break
+            receiver = current.get(receiver)
+        if (receiver in active and receiver not in received and receiver != giver
+                and _allowed(rules, giver, receiver)):
+            links[giver] = receiver
+            received.add(receiver)
+
+    # What is left are open chains h -> ... -> t (a new user is a chain of one)
+    chains = []
+    for head in participants:
+        if head in received:
+            continue
+        nodes = [head]
+        while len(nodes) <= n and friend(nodes[-1]) is not None:
+            nodes.append(friend(nodes[-1]))
+        chains.append(nodes)
+
+    if sum(len(nodes) for nodes in chains) == n:
+        # Nobody is left to splice into: close the chains into one ring
+        _close_ring(chains, links, rules, rng, swap_attempts)
+    else:
+        for nodes in chains:
+            _splice_chain(nodes, participants, friend, links, rules, rng, swap_attempts)
+
+    upserts = [{"user_id": giver, "id_secret_friend": receiver} for giver, receiver in links.items()]
+    return {"upserts": upserts, "deletes": deletes}
+
+
+def _splice_chain(nodes: List[int], participants: List[int], friend, links: Dict[int, int],
+                  rules: Optional[ExclusionRules], rng, swap_attempts: int) -> None:
+    """Insert the chain h -> ... -> t after a random giver a: a -> h ... t -> friend_of[a]."""
+    head, tail = nodes[0], nodes[-1]
+    inside = set(nodes)
+    n = len(participants)
+    for _ in range(swap_attempts):
+        giver = participants[int(rng.random() * n)]
+        receiver = friend(giver)
+        if receiver is None or giver in inside:
+            continue
+        if _allowed(rules, giver, head) and _allowed(rules, tail, receiver):
+            links[giver] = head
+            links[tail] = receiver
+            return
+    raise NoValidAssignmentError(
+        f"User {head} cannot be added to the current draw without "
+        "breaking the exclusion rules. Run a full draw instead."
+    )
+
+
+def _close_ring(chains: List[List[int]], links: Dict[int, int],
+                rules: Optional[ExclusionRules], rng, swap_attempts: int) -> None:
+    """Link the chains tail to head, in a random order, into a single ring."""
+    for _ in range(swap_attempts):
+        rng.shuffle(chains)
+        pairs = [(chains[i][-1], chains[(i + 1) % len(chains)][0]) for i in range(len(chains))]
+        if all(_allowed(rules, tail, head) for tail, head in pairs):
+            links.update(pairs)
+            return
+    raise NoValidAssignmentError(
+        "The new users cannot be joined into a draw without breaking the "
+        "exclusion rules. Run a full draw instead."
+    )
+
+
+def apply_incremental_draw(supabase, plan: Dict[str, list], year: Optional[int] = None) -> None:
+    """
+    Write an incremental plan: delete the rows of withdrawn users and upsert
+    the changed links in one transaction (see utils/incremental_draw.sql).
+    When `year` is given, the archived draw of that year is updated too.
+    """
+    deletes: List[int] = plan.get("deletes", [])
+    upserts: List[dict] = plan.get("upserts", [])
+    if not deletes and not upserts:
+        return
+    supabase.rpc(APPLY_FUNCTION, {"p_deletes": deletes, "p_upserts": upserts, "p_year": year}).execute()
@@ -0,0 +1,39 @@
+-- Atomic write of an incremental Secret Santa draw
+-- Requires utils/secret_friends_unique_user.sql (one row per user) and
+-- utils/assignment_history.sql. The rows of withdrawn users are removed and
+-- the changed links written in a single transaction, so a failure never
+-- leaves a giver without a friend.
+
+CREATE OR REPLACE FUNCTION "secret-santa".apply_incremental_draw(p_deletes INT[], p_upserts JSONB,
+                                                                 p_year INT DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    written_rows INT;
+BEGIN
+    DELETE FROM "secret-santa".secret_friends WHERE user_id = ANY(p_deletes);
+
+    INSERT INTO "secret-santa".secret_friends (user_id, id_secret_friend)
+    SELECT r.user_id, r.id_secret_friend
+    FROM jsonb_to_recordset(p_upserts) AS r(user_id INT, id_secret_friend INT)
+    ON CONFLICT (user_id) DO UPDATE
+    SET id_secret_friend = EXCLUDED.id_secret_friend;
+
+    GET DIAGNOSTICS written_rows = ROW_COUNT;
+
+    -- Keep the archived draw of the year equal to the current one
+    IF p_year IS NOT NULL THEN
+        DELETE FROM "secret-santa".secret_friends_history
+        WHERE year = p_year AND user_id = ANY(p_deletes);
+
+        INSERT INTO "secret-santa".secret_friends_history (year, user_id, id_secret_friend)
+        SELECT p_year, r.user_id, r.id_secret_friend
+        FROM jsonb_to_recordset(p_upserts) AS r(user_id INT, id_secret_friend INT)
+        ON CONFLICT (year, user_id) DO UPDATE
+        SET id_secret_friend = EXCLUDED.id_secret_friend;
+    END IF;
+
+    RETURN written_rows;
+END;
+$$;
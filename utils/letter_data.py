@@ -0,0 +1,71 @@
+"""
+Bulk data access for the wishes letters.
+Loads every assignment together with the santa and friend columns in a few
+paged queries (instead of two user lookups per assignment) and joins them
+in memory through an id -> user map.
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.pagination import iter_rows, iter_users
+
+LETTER_USER_COLUMNS = (
+    'id, email, nombre, character_name, deseo1, link_deseo1, '
+    'deseo2, link_deseo2, deseo3, link_deseo3, comentarios_generales'
+)
+
+
+def build_friend_info(friend_row: dict) -> Dict[str, Any]:
+    """Map a `users` row to the friend_* keys used by the letter."""
+    return {
+        'friend_character_name': friend_row.get('character_name', ''),
+        'friend_deseo1': friend_row.get('deseo1', ''),
+        'friend_link_deseo1': friend_row.get('link_deseo1', ''),
+        'friend_deseo2': friend_row.get('deseo2', ''),
+        'friend_link_deseo2': friend_row.get('link_deseo2', ''),
+        'friend_deseo3': friend_row.get('deseo3', ''),
+        'friend_link_deseo3': friend_row.get('link_deseo3', ''),
+        'friend_comentarios_generales': friend_row.get('comentarios_generales', ''),
+    }
+
+
+def fetch_letter_data(supabase, page_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Load everything needed to send the wishes letters.
+
+    Returns:
+        Dictionary with:
+        - 'letters': list of {user_id, friend_id, to_email, santa_name, friend_info}
+        - 'skipped': assignments whose santa has no email or whose users are missing
+        - 'queries': number of requests sent to Supabase
+        - 'seconds': elapsed time
+    """
+    start = time.perf_counter()
+    stats = {'queries': 0}
+
+    users = {row['id']: row for row in iter_users(supabase, LETTER_USER_COLUMNS, page_size, stats=stats)}
+
+    letters: List[dict] = []
+    skipped = 0
+    assignments = iter_rows(supabase, 'secret_friends', 'user_id, id_secret_friend',
+                            key='user_id', page_size=page_size, stats=stats)
+    for row in assignments:
+        santa = users.get(row.get('user_id'))
+        friend = users.get(row.get('id_secret_friend'))
+        if not santa or not friend or not santa.get('email'):
+            skipped += 1
+            continue
+        letters.append({
+            'user_id': santa['id'],
+            'friend_id': friend['id'],
+            'to_email': santa['email'],
+            'santa_name': santa.get('character_name') or santa.get('nombre', ''),
+            'friend_info': build_friend_info(friend),
+        })
+
+    return {
+        'letters': letters,
+        'skipped': skipped,
+        'queries': stats['queries'],
+        'seconds': time.perf_counter() - start,
+    }
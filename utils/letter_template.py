@@ -0,0 +1,228 @@
+"""
+Precompiled wishes letter.
+The letter templates are parsed once at import into printf-style format
+strings, so rendering a letter is one string build per block instead of
+repeated concatenation. User text (names, wishes, notes) is HTML-escaped
+and only http(s) links are kept. Shared by the letter emails and the
+on-screen letter of the friend page.
+"""
+import html
+import re
+from typing import Dict, Iterable, List
+
+# Placeholder used by the friend page for an empty wish
+NO_WISH = "SIN DESEO"
+
+_FIELD = re.compile(r"\{(\w+)\}")
+
+
+class CompiledTemplate:
+    """
+    Template with {field} placeholders compiled once to a %-format string.
+
+    The source is parsed at construction into the ordered field list and a
+    printf-style format (literal '%' escaped), so `fill` is a single C-level
+    string build with no per-call parsing in Python. Values are inserted as
+    given: escape them first.
+    """
+
+    def __init__(self, source: str):
+        parts = _FIELD.split(source)
+        literals, fields = parts[0::2], parts[1::2]
+        self.fields = tuple(dict.fromkeys(fields))
+        self._slots = tuple(self.fields.index(field) for field in fields)
+        self.source = "%s".join(literal.replace("%", "%%") for literal in literals)
+
+    def fill(self, *values) -> str:
+        """Render with positional values, in the order of `fields` (fastest)."""
+        if len(self._slots) == len(self.fields):
+            return self.source % values
+        # A field used more than once
+        return self.source % tuple(values[slot] for slot in self._slots)
+
+    def render(self, values: Dict[str, str]) -> str:
+        return self.fill(*[values[field] for field in self.fields])
+
+
+LETTER_HTML = CompiledTemplate("""
+<div style="background-color:#f8f9fa;color:#2c3e50;padding:40px;border-radius:10px;
+            font-family:'Courier New',Courier,monospace;line-height:1.6;
+            box-shadow:0 4px 8px rgba(0,0,0,0.1);border:2px solid #e0e0e0;">
+    <div style="font-size:1.5em;font-weight:bold;margin-bottom:20px;">
+        Querido Santa (osea tú, {santa_name}) 🎅,
+    </div>
+    <div style="font-size:1.2em;">
+        <p>Este año me he portado EXTRAORDINARIAMENTE bien (créeme 😉).
+        Para esta Navidad, me haría la persona más feliz del mundo recibir
+        alguno de estos regalitos:</p>
+        <p><strong>Como primera opción (mi favorito 😍):</strong></p>{wish1}
+        <p><strong>También me encantaría:</strong></p>{wish2}{wish3}{notes}
+        <div style="margin-top:40px;text-align:right;font-size:1.3em;font-style:italic;">
+            Con cariño y esperanza,<br>
+            {friend_name} 🎄
+        </div>
+    </div>
+</div>
+""")
+
+WISH_HTML = CompiledTemplate(
+    "<div style='margin-left:20px;margin-bottom:15px;'>"
+    "Para ver la magia del deseo #{number}:<br>"
+    "<span style='color:#c0392b;font-weight:bold;'>{wish}</span>{link}</div>"
+)
+
+WISH_LINK_HTML = CompiledTemplate(
+    " <a href='{url}' target='_blank' style='color:#d35400;text-decoration:none;'>(Ver referencia 🔗)</a>"
+)
+
+WISH3_HEADER_HTML = "<p><strong>Y si te sientes muy generoso 😇:</strong></p>"
+
+NOTES_HTML = CompiledTemplate("<p><strong>P.D. (Notas importantes 📝):</strong><br>{notes}</p>")
+
+SUBJECT = CompiledTemplate("🎅 Carta de tu Amigo Secreto - {friend_name}")
+
+LETTER_TEXT = CompiledTemplate(
+    "Hola {santa_name},\n\n"
+    "Tu Amigo Secreto es: {friend_name}.\n"
+    "Revisa la versión HTML de este correo para ver la carta completa y los detalles de los deseos.\n\n"
+    "¡Felices fiestas!"
+)
+
+
+def escape_text(text) -> str:
+    """HTML-escape user text and keep its line breaks."""
+    if not text:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    # Same result as html.escape(text, quote=True), but plain text (the
+    # common case) costs only a few substring scans
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    if '"' in text:
+        text = text.replace('"', '&quot;')
+    if "'" in text:
+        text = text.replace("'", '&#x27;')
+    if '\n' in text:
+        text = text.replace('\n', '<br>')
+    return text
+
+
+def safe_link(url) -> str:
+    """Escaped link if it is an http(s) URL, '' otherwise (no javascript: links)."""
+    if not url:
+        return ""
+    url = str(url).strip()
+    if not url.lower().startswith(("http://", "https://")):
+        return ""
+    return html.escape(url, quote=True)
+
+
+def _wish_html(wish, link, number: int) -> str:
+    if not wish:
+        return ""
+    url = safe_link(link)
+    return WISH_HTML.fill(number, escape_text(wish), WISH_LINK_HTML.fill(url) if url else "")
+
+
+def render_letter_html(santa_name: str, friend: dict) -> str:
+    """
+    HTML letter from the friend to their Santa.
+
+    Args:
+        santa_name: Name shown in the greeting
+        friend: friend_* keys (see utils/letter_data.build_friend_info)
+    """
+    get = friend.get
+    wish3 = get("friend_deseo3")
+    notes = get("friend_comentarios_generales")
+    return LETTER_HTML.fill(
+        escape_text(santa_name),
+        _wish_html(get("friend_deseo1", ""), get("friend_link_deseo1"), 1),
+        _wish_html(get("friend_deseo2", ""), get("friend_link_deseo2"), 2),
+        WISH3_HEADER_HTML + _wish_html(wish3, get("friend_link_deseo3"), 3)
+        if wish3 and wish3 != NO_WISH else "",
+        NOTES_HTML.fill(escape_text(notes)) if notes else "",
+        escape_text(get('friend_character_name', '')),
+    )
+
+
+def render_letter_email(santa_name: str, friend: dict) -> Dict[str, str]:
+    """Subject, HTML body and plain-text body of a letter email."""
+    friend_name = friend.get('friend_character_name', '')
+    return {
+        'subject': SUBJECT.fill(friend_name),
+        'html_body': render_letter_html(santa_name, friend),
+        'text_body': LETTER_TEXT.fill(santa_name, friend_name),
+    }
+
+
+COMBINED_SUBJECT = CompiledTemplate("🎅 {count} cartas de Amigo Secreto")
+
+COMBINED_LETTER_HTML = CompiledTemplate(
+    "<h2 style='font-family:Arial,sans-serif;color:#c0392b;margin-top:30px;'>"
+    "Carta para {santa_name}</h2>{letter}"
+)
+
+COMBINED_TEXT_LINE = CompiledTemplate("- {santa_name}: tu Amigo Secreto es {friend_name}.")
+
+COMBINED_TEXT = CompiledTemplate(
+    "Hola,\n\n"
+    "Este correo reúne las cartas de Amigo Secreto de {count} participantes:\n"
+    "{lines}\n\n"
+    "Revisa la versión HTML de este correo para ver las cartas completas y los detalles de los deseos.\n\n"
+    "¡Felices fiestas!"
+)
+
+
+def render_combined_email(letters: List[dict]) -> Dict[str, str]:
+    """
+    One email with the letters of several Santas that share an address.
+
+    Args:
+        letters: Rows from utils/letter_data.fetch_letter_data, or stored
+                 letters (utils/rendered_letters.py) whose 'html_body' and
+                 'friend_name' are reused as they are
+    """
+    html_parts = []
+    lines = []
+    for letter in letters:
+        santa_name = letter['santa_name']
+        if 'html_body' in letter:
+            letter_html, friend_name = letter['html_body'], letter['friend_name']
+        else:
+            friend = letter['friend_info']
+            letter_html = render_letter_html(santa_name, friend)
+            friend_name = friend.get('friend_character_name', '')
+        html_parts.append(COMBINED_LETTER_HTML.fill(escape_text(santa_name), letter_html))
+        lines.append(COMBINED_TEXT_LINE.fill(santa_name, friend_name))
+    return {
+        'subject': COMBINED_SUBJECT.fill(len(letters)),
+        'html_body': "".join(html_parts),
+        'text_body': COMBINED_TEXT.fill(len(letters), "\n".join(lines)),
+    }
+
+
+def render_letters(letters: Iterable[dict]) -> List[dict]:
+    """
+    Render the email of every letter.
+
+    Args:
+        letters: Rows from utils/letter_data.fetch_letter_data
+
+    Returns:
+        Messages with 'key' (santa user id), 'to_email', 'subject',
+        'html_body' and 'text_body', ready for the email outbox
+    """
+    messages = []
+    append = messages.append
+    for letter in letters:
+        message = render_letter_email(letter['santa_name'], letter['friend_info'])
+        message['key'] = letter['user_id']
+        message['to_email'] = letter['to_email']
+        append(message)
+    return messages
@@ -0,0 +1,370 @@
+"""
+Constraint-aware matching for the Secret Santa draw.
+Supports exclusion rules (partners, same team, explicit pairs) on top of the
+single-pass engines in utils/derangement.py, and reports when no valid
+assignment exists instead of retrying forever.
+"""
+import random
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence
+
+from utils.derangement import derange, sattolo_cycle, MODE_UNIFORM, MODE_CYCLE, DRAW_MODES
+
+# Random swaps tried per conflicting giver before falling back to the exact
+# augmenting-path search.
+DEFAULT_SWAP_ATTEMPTS = 64
+
+# Fresh random rings tried in cycle mode before giving up.
+DEFAULT_CYCLE_RESTARTS = 8
+
+
+class NoValidAssignmentError(Exception):
+    """Raised when the exclusion rules leave no valid assignment."""
+    pass
+
+
+class NoCycleFoundError(NoValidAssignmentError):
+    """
+    Raised when no single gift ring respecting the rules was found.
+
+    The cycle search is randomized, so this does not prove that the rules
+    are impossible: a uniform draw may still exist.
+    """
+    pass
+
+
+class ExclusionRules:
+    """
+    Set of giver -> receiver pairs that must not be drawn.
+
+    Rules are kept sparse: explicit pairs are stored individually and teams
+    are stored as a user -> team label map, so a team of any size costs one
+    entry per member instead of one entry per pair.
+    """
+
+    def __init__(self, history=None):
+        self._pairs = set()
+        self._teams: Dict[int, Hashable] = {}
+        # Optional PairHistoryIndex (utils/history.py) of past pairings
+        self.history = history
+
+    def forbid(self, giver: int, receiver: int, symmetric: bool = False) -> None:
+        """Forbid `giver` from drawing `receiver` (and the reverse if symmetric)."""
+        self._pairs.add((giver, receiver))
+        if symmetric:
+            self._pairs.add((receiver, giver))
+
+    def add_couple(self, a: int, b: int) -> None:
+        """Partners must not draw each other."""
+        self.forbid(a, b, symmetric=True)
+
+    def set_team(self, user_id: int, team: Hashable) -> None:
+        """People on the same team must not draw each other."""
+        if team is None or team == "":
+            self._teams.pop(user_id, None)
+        else:
+            self._teams[user_id] = team
+
+    def is_allowed(self, giver: int, receiver: int) -> bool:
+        """Check whether `giver` may draw `receiver`."""
+        if giver == receiver:
+            return False
+        if (giver, receiver) in self._pairs:
+            return False
+        team = self._teams.get(giver)
+        if team is not None and self._teams.get(receiver) == team:
+            return False
+        if self.history is not None and self.history.contains(giver, receiver):
+            return False
+        return True
+
+    def team_of(self, user_id: int) -> Optional[Hashable]:
+        """Team label of a user, or None."""
+        return self._teams.get(user_id)
+
+    def largest_team(self, user_ids: Iterable[int]):
+        """Return (team, size) of the largest team among `user_ids`, or (None, 0)."""
+        sizes: Dict[Hashable, int] = {}
+        for user_id in user_ids:
+            team = self._teams.get(user_id)
+            if team is not None:
+                sizes[team] = sizes.get(team, 0) + 1
+        if not sizes:
+            return None, 0
+        team = max(sizes, key=sizes.get)
+        return team, sizes[team]
+
+    def __len__(self) -> int:
+        history_size = len(self.history) if self.history is not None else 0
+        return len(self._pairs) + len(self._teams) + history_size
+
+    @classmethod
+    def from_user_rows(cls, rows: Iterable[dict]) -> "ExclusionRules":
+        """
+        Build rules from `users` rows with optional `pareja_id` and `equipo` columns.
+        """
+        rules = cls()
+        for row in rows:
+            user_id = row.get('id')
+            if user_id is None:
+                continue
+            if row.get('pareja_id') is not None:
+                rules.add_couple(user_id, row['pareja_id'])
+            if row.get('equipo'):
+                rules.set_team(user_id, row['equipo'])
+        return rules
+
+
+def _repair_by_swaps(friend_of: Dict[int, int], ids: Sequence[int], rules: ExclusionRules,
+                     rng, attempts: int) -> List[int]:
+    """
+    Fix forbidden edges by exchanging receivers between two givers.
+
+    Returns the givers that could not be fixed.
+    """
+    n = len(ids)
+    unresolved = []
+    for giver in ids:
+        if rules.is_allowed(giver, friend_of[giver]):
+            continue
+        fixed = False
+        for _ in range(attempts):
+            other = ids[int(rng.random() * n)]
+            if other == giver:
+                continue
+            a, b = friend_of[giver], friend_of[other]
+            if rules.is_allowed(giver, b) and rules.is_allowed(other, a):
+                friend_of[giver], friend_of[other] = b, a
+                fixed = True
+                break
+        if not fixed:
+            unresolved.append(giver)
+    return unresolved
+
+
+def _team_buckets(receivers: Iterable[int], rules: ExclusionRules) -> Dict[Optional[Hashable], set]:
+    buckets: Dict[Optional[Hashable], set] = {}
+    for receiver in receivers:
+        buckets.setdefault(rules.team_of(receiver), set()).add(receiver)
+    return buckets
+
+
+def _first_allowed(giver: int, buckets: Dict[Optional[Hashable], set], rules: ExclusionRules):
+    """First receiver in `buckets` that `giver` may draw, skipping its own team."""
+    own_team = rules.team_of(giver)
+    if own_team is not None and len(buckets) == 1 and own_team in buckets:
+        return None
+    for team, bucket in buckets.items():
+        if team is not None and team == own_team:
+            continue
+        for receiver in bucket:
+            if rules.is_allowed(giver, receiver):
+                return receiver
+    return None
+
+
+def _augment(start: int, friend_of: Dict[int, int], giver_of: Dict[int, int], rules: ExclusionRules,
+             taken: Dict[Optional[Hashable], set], free: Dict[Optional[Hashable], set]) -> bool:
+    """
+    Find an augmenting path from the free giver `start` (BFS on the allowed graph).
+
+    The allowed graph is the complement of a sparse rule set, so it is never
+    materialized. Taken and free receivers are bucketed by team and a giver
+    skips the bucket of its own team, so a receiver is only examined again
+    when an explicit pair or a past pairing forbids it. Every giver reached
+    is first matched with a free receiver if it can be, so the usual short
+    paths end after a few checks; a search that fails costs O(n) plus the
+    number of pair and history rules.
+    """
+    came_from: Dict[int, int] = {}
+    visited: List[tuple] = []
+
+    def flip(giver: int, receiver: int) -> bool:
+        # Every giver on the path takes the next receiver
+        free_team = rules.team_of(receiver)
+        free[free_team].discard(receiver)
+        if not free[free_team]:
+            del free[free_team]
+        taken.setdefault(free_team, set()).add(receiver)
+        came_from[receiver] = giver
+        while True:
+            g = came_from[receiver]
+            previous = friend_of.get(g)
+            friend_of[g] = receiver
+            giver_of[receiver] = g
+            if g == start:
+                return True
+            receiver = previous
+
+    try:
+        receiver = _first_allowed(start, free, rules)
+        if receiver is not None:
+            return flip(start, receiver)
+        queue = deque([start])
+        while queue:
+            giver = queue.popleft()
+            own_team = rules.team_of(giver)
+            for team in list(taken):
+                if team is not None and team == own_team:
+                    continue
+                bucket = taken[team]
+                reached = []
+                for receiver in bucket:
+                    if not rules.is_allowed(giver, receiver):
+                        continue
+                    came_from[receiver] = giver
+                    child = giver_of[receiver]
+                    target = _first_allowed(child, free, rules)
+                    if target is not None:
+                        return flip(child, target)
+                    reached.append(receiver)
+                    queue.append(child)
+                bucket.difference_update(reached)
+                visited.append((team, reached))
+                if not bucket:
+                    del taken[team]
+        return False
+    finally:
+        # Visited receivers are taken again for the next search
+        for team, reached in visited:
+            taken.setdefault(team, set()).update(reached)
+
+
+def _solve_uniform(ids: Sequence[int], rules: ExclusionRules, rng, attempts: int) -> Dict[int, int]:
+    friend_of = derange(ids, mode=MODE_UNIFORM, rng=rng)
+    unresolved = _repair_by_swaps(friend_of, ids, rules, rng, attempts)
+    if not unresolved:
+        return friend_of
+
+    # Exact fallback: drop the conflicting edges and re-match those givers
+    free_receivers = [friend_of.pop(giver) for giver in unresolved]
+    giver_of = {receiver: giver for giver, receiver in friend_of.items()}
+    taken = _team_buckets(giver_of, rules)
+    free = _team_buckets(free_receivers, rules)
+    for giver in unresolved:
+        if not _augment(giver, friend_of, giver_of, rules, taken, free):
+            raise NoValidAssignmentError(
+                f"No valid assignment exists: user {giver} cannot be matched "
+                "without breaking the exclusion rules."
+            )
+    return friend_of
+
+
+def _try_cycle(ids: Sequence[int], rules: ExclusionRules, rng, attempts: int):
+    """Repair one random ring; return (friend_of, None) or (None, stuck user)."""
+    n = len(ids)
+    p = sattolo_cycle(n, rng)
+    # Walk the cycle to get the gift chain order
+    order = [0] * n
+    current = 0
+    for k in range(n):
+        order[k] = ids[current]
+        current = p[current]
+
+    def edge_ok(k):
+        return rules.is_allowed(order[k % n], order[(k + 1) % n])
+
+    def swap_ok(k, i, j):
+        # Edges after k are repaired later, so only k and the ones already
+        # repaired must hold after the swap
+        return all(edge_ok(e) for e in {(i - 1) % n, i, (j - 1) % n, j} if e <= k)
+
+    for k in range(n):
+        if edge_ok(k):
+            continue
+        fixed = False
+        for _ in range(attempts):
+            # Move a random participant into position k + 1; swapping two
+            # positions of the chain keeps it a single cycle.
+            j = int(rng.random() * n)
+            i = (k + 1) % n
+            if j == i:
+                continue
+            order[i], order[j] = order[j], order[i]
+            if swap_ok(k, i, j):
+                fixed = True
+                break
+            order[i], order[j] = order[j], order[i]
+        if not fixed:
+            return None, order[k]
+    return {order[k]: order[(k + 1) % n] for k in range(n)}, None
+
+
+def _solve_cycle(ids: Sequence[int], rules: ExclusionRules, rng, attempts: int,
+                 restarts: int = DEFAULT_CYCLE_RESTARTS) -> Dict[int, int]:
+    for _ in range(restarts):
+        friend_of, stuck = _try_cycle(ids, rules, rng, attempts)
+        if friend_of is not None:
+            return friend_of
+    raise NoCycleFoundError(
+        f"No single gift ring that respects the exclusion rules was found "
+        f"(stuck at user {stuck}). A draw in 'uniform' mode may still be possible."
+    )
+
+
+def solve_assignment(user_ids: Sequence[int], rules: Optional[ExclusionRules] = None,
+                     mode: str = MODE_UNIFORM, rng: Optional[random.Random] = None,
+                     swap_attempts: int = DEFAULT_SWAP_ATTEMPTS) -> Dict[int, int]:
+    """
+    Draw a secret friend for every user while respecting exclusion rules.
+
+    Starts from a single-pass draw, fixes conflicting pairs with random
+    receiver swaps and, in uniform mode, finishes any leftovers with an exact
+    augmenting-path search. If that search fails, Hall's condition is violated
+    and no valid assignment exists at all. A team with more than half of the
+    participants is reported before any search starts.
+
+    Args:
+        user_ids: Participant ids (at least 2, no duplicates)
+        rules: Exclusion rules (None means only self-assignment is forbidden)
+        mode: "uniform" or "cycle" (see utils/derangement.py)
+        rng: Optional random.Random instance
+        swap_attempts: Random swaps tried per conflicting giver
+
+    Returns:
+        Dictionary mapping each user id to the id of their secret friend
+
+    Raises:
+        NoCycleFoundError: in cycle mode, if no single ring was found
+        NoValidAssignmentError: if the rules cannot be satisfied
+    """
+    ids = list(user_ids)
+    if len(ids) < 2:
+        raise NoValidAssignmentError("A draw needs at least 2 participants")
+    if mode not in DRAW_MODES:
+        raise ValueError(f"Unknown draw mode '{mode}'. Use one of: {', '.join(DRAW_MODES)}")
+    rng = rng or random.Random()
+    if rules is None or len(rules) == 0:
+        return derange(ids, mode=mode, rng=rng)
+    # Hall's condition for teams: every member needs a friend outside the team
+    team, size = rules.largest_team(ids)
+    if size > len(ids) - size:
+        raise NoValidAssignmentError(
+            f"No valid assignment exists: team '{team}' has {size} of the {len(ids)} "
+            "participants, so they cannot all draw someone outside it."
+        )
+    if mode == MODE_CYCLE:
+        return _solve_cycle(ids, rules, rng, swap_attempts)
+    return _solve_uniform(ids, rules, rng, swap_attempts)
+
+
+def solve_with_history_fallback(solve: Callable[[], Any], rules: ExclusionRules,
+                                warnings: Optional[List[str]] = None) -> Any:
+    """
+    Run `solve`; if past pairings make it impossible, retry without them.
+
+    `solve` must read `rules` when called, since the retry clears
+    `rules.history`. The fallback is reported in `warnings`, if given.
+    """
+    try:
+        return solve()
+    except NoValidAssignmentError:
+        if not rules.history:
+            raise
+        # Repeating a past pairing is better than no draw at all
+        if warnings is not None:
+            warnings.append(
+                "No se pueden evitar todas las parejas de años anteriores; se sortea sin el historial."
+            )
+        rules.history = None
+        return solve()
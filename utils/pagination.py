@@ -0,0 +1,75 @@
+"""
+Keyset pagination helpers for Supabase reads.
+PostgREST caps every response at a server-side row limit, so bulk reads are
+streamed page by page ordered by a unique key instead of one big select.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.config_loader import get_page_size
+
+# (method, column, value) applied to every page, e.g. ('eq', 'year', 2025)
+Filter = Tuple[str, str, object]
+
+
+def _column_list(columns: str) -> List[str]:
+    return [c.strip() for c in columns.split(',') if c.strip()]
+
+
+def iter_rows(supabase, table: str, columns: str, key: str = 'id',
+              page_size: Optional[int] = None,
+              filters: Optional[Iterable[Filter]] = None,
+              stats: Optional[Dict[str, int]] = None) -> Iterator[dict]:
+    """
+    Stream rows of `table` ordered by the unique column `key`.
+
+    Each page asks for the rows after the last key seen, so the cost per page
+    stays constant and rows are never skipped or repeated. Paging only stops
+    on an empty page, so a server row limit lower than `page_size` cannot
+    silently cut the result short.
+
+    Args:
+        supabase: Supabase client
+        table: Table name
+        columns: Comma-separated columns to select (`key` is added if missing)
+        key: Unique, sortable column used as the page cursor
+        page_size: Rows per request (defaults to config.json)
+        filters: Optional (method, column, value) filters for every page
+        stats: Optional dictionary whose 'queries' counter is increased per request
+
+    Yields:
+        One dictionary per row
+    """
+    page_size = page_size or get_page_size()
+    filters = list(filters or [])
+    selected = _column_list(columns)
+    if '*' not in selected and key not in selected:
+        selected.append(key)
+    select = ', '.join(selected)
+
+    last_key = None
+    while True:
+        query = supabase.table(table).select(select)
+        for method, column, value in filters:
+            query = getattr(query, method)(column, value)
+        if last_key is not None:
+            query = query.gt(key, last_key)
+        page = query.order(key).limit(page_size).execute().data or []
+        if stats is not None:
+            stats['queries'] = stats.get('queries', 0) + 1
+        if not page:
+            return
+        yield from page
+        last_key = page[-1][key]
+
+
+def iter_user_ids(supabase, page_size: Optional[int] = None) -> Iterator[int]:
+    """Stream the ids of all users."""
+    for row in iter_rows(supabase, 'users', 'id', page_size=page_size):
+        yield row['id']
+
+
+def iter_users(supabase, columns: str, page_size: Optional[int] = None,
+               filters: Optional[Iterable[Filter]] = None,
+               stats: Optional[Dict[str, int]] = None) -> Iterator[dict]:
+    """Stream `users` rows with the given columns."""
+    return iter_rows(supabase, 'users', columns, page_size=page_size, filters=filters, stats=stats)
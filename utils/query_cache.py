@@ -0,0 +1,212 @@
+"""
+Read-through cache for page queries.
+Streamlit reruns the page script on every widget interaction, so the same
+Supabase reads repeat many times per visit. Results are kept in one
+process-wide LRU cache with a TTL per namespace (the "cache" section of
+config.json), and the writes that change them call the invalidation hooks
+at the end of this module. Hits, misses, shared loads, evictions and
+invalidations are counted per namespace (see cache_stats).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from utils.config_loader import get_cache_settings
+
+# Namespaces of the cached queries
+USER_INFO = 'user_info'
+SELECTED_CHARACTERS = 'selected_characters'
+FRIEND_INFO = 'friend_info'
+
+
+class _Flight:
+    """A load in progress that concurrent readers of the same key wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[Exception] = None
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a per-namespace TTL.
+
+    Entries are keyed by (namespace, key). When `max_entries` is reached the
+    least recently used entry is evicted. None results are not cached, so a
+    missing row is looked up again on the next read.
+
+    Concurrent misses on the same key share one load (single flight). Every
+    namespace has a generation that invalidate() bumps: a load that started
+    before an invalidation returns its value but does not cache it.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[Dict[str, float]] = None,
+                 default_ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = dict(ttl or {})
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Tuple[str, Hashable], _Flight] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, namespace: str, counter: str, amount: int = 1) -> None:
+        stats = self._stats.setdefault(namespace, {
+            'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0,
+        })
+        stats[counter] += amount
+
+    def get(self, namespace: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Cached value of (namespace, key), calling `loader` on a miss."""
+        entry_key = (namespace, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(entry_key)
+                    self._count(namespace, 'hits')
+                    return entry[1]
+                del self._entries[entry_key]
+                self._count(namespace, 'expired')
+            flight = self._flights.get(entry_key)
+            leader = flight is None
+            if leader:
+                self._count(namespace, 'misses')
+                flight = self._flights[entry_key] = _Flight()
+                generation = self._generations.get(namespace, 0)
+            else:
+                # Another reader is loading this key: wait for its result
+                self._count(namespace, 'coalesced')
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        # Load outside the lock so slow queries do not block other readers
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(entry_key) is flight:
+                    del self._flights[entry_key]
+                # Not cached if the namespace was invalidated during the load
+                if (flight.error is None and flight.value is not None
+                        and self._generations.get(namespace, 0) == generation):
+                    self._store(entry_key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def _store(self, entry_key: Tuple[str, Hashable], value: Any) -> None:
+        namespace = entry_key[0]
+        self._entries[entry_key] = (time.monotonic() + self.ttl.get(namespace, self.default_ttl), value)
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            (evicted_namespace, _), _ = self._entries.popitem(last=False)
+            self._count(evicted_namespace, 'evictions')
+
+    def invalidate(self, namespace: str, key: Optional[Hashable] = None) -> int:
+        """
+        Drop one entry, or every entry of `namespace` when `key` is None.
+
+        Loads of the namespace already in progress are not cached, and
+        readers arriving later start a new load.
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            if key is not None:
+                dropped = 1 if self._entries.pop((namespace, key), None) is not None else 0
+                self._flights.pop((namespace, key), None)
+            else:
+                stale = [entry_key for entry_key in self._entries if entry_key[0] == namespace]
+                for entry_key in stale:
+                    del self._entries[entry_key]
+                for entry_key in [entry_key for entry_key in self._flights if entry_key[0] == namespace]:
+                    del self._flights[entry_key]
+                dropped = len(stale)
+            self._count(namespace, 'invalidations', dropped)
+            return dropped
+
+    def clear(self) -> None:
+        with self._lock:
+            for namespace in {entry_key[0] for entry_key in list(self._entries) + list(self._flights)}:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            self._entries.clear()
+            self._flights.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-namespace counters plus 'size' (live entries) and 'hit_rate'."""
+        with self._lock:
+            sizes: Dict[str, int] = {}
+            for namespace, _ in self._entries:
+                sizes[namespace] = sizes.get(namespace, 0) + 1
+            report = {}
+            for namespace in set(self._stats) | set(sizes):
+                stats = dict(self._stats.get(namespace, {}))
+                # Readers that waited for another reader's load did not query either
+                served = stats.get('hits', 0) + stats.get('coalesced', 0)
+                lookups = served + stats.get('misses', 0)
+                stats['size'] = sizes.get(namespace, 0)
+                stats['hit_rate'] = served / lookups if lookups else None
+                report[namespace] = stats
+            return report
+
+
+_query_cache: Optional[TTLCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> TTLCache:
+    """Process-wide cache shared by every session, configured from config.json."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                settings = get_cache_settings()
+                _query_cache = TTLCache(settings['max_entries'], {
+                    USER_INFO: settings['user_info_ttl'],
+                    SELECTED_CHARACTERS: settings['selected_characters_ttl'],
+                    FRIEND_INFO: settings['friend_info_ttl'],
+                })
+    return _query_cache
+
+
+def cached_query(namespace: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+    """Read-through lookup in the shared cache."""
+    return get_query_cache().get(namespace, key, loader)
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit/miss metrics of the shared cache, per namespace."""
+    return get_query_cache().stats()
+
+
+# Invalidation hooks, called by the writes that change cached data
+
+def on_user_updated(character_name: str) -> None:
+    """A user edited their profile: their data and the friend cards that show it."""
+    cache = get_query_cache()
+    cache.invalidate(USER_INFO, character_name)
+    # The santa of this user is not known here
+    cache.invalidate(FRIEND_INFO)
+
+
+def on_user_registered() -> None:
+    """A new user took a character."""
+    get_query_cache().invalidate(SELECTED_CHARACTERS)
+
+
+def on_draw() -> None:
+    """Assignments changed: every friend card may be different."""
+    get_query_cache().invalidate(FRIEND_INFO)
@@ -0,0 +1,66 @@
+"""
+Recipient planning for the letter emails.
+Letters bound for the same address (e.g. a family that registered several
+participants with one email) are merged into a single email, and the
+resulting messages are ordered by recipient domain so the bulk mailer can
+drain one provider at a time over each connection.
+"""
+from typing import Any, Dict, List
+
+from utils.letter_template import render_combined_email, render_letter_email
+
+
+def normalize_address(address: str) -> str:
+    """Address used to detect duplicates (trimmed, lower case)."""
+    return (address or '').strip().lower()
+
+
+def email_domain(message: dict) -> str:
+    """Domain of a message recipient, e.g. 'gmail.com'."""
+    return normalize_address(message['to_email']).rpartition('@')[2]
+
+
+def plan_recipients(letters: List[dict]) -> Dict[str, Any]:
+    """
+    Turn letters into the emails to send.
+
+    Args:
+        letters: Rows from utils/letter_data.fetch_letter_data, or stored
+                 letters from utils/rendered_letters.load_stored_letters
+                 (already rendered, reused as they are)
+
+    Returns:
+        Dictionary with:
+        - 'messages': emails ready for the outbox, grouped by domain (largest
+          domain first). Each has 'key' (lowest santa user id of the email),
+          'user_ids', 'to_email', 'subject', 'html_body' and 'text_body'
+        - 'letters': number of letters
+        - 'merged': letters saved by merging shared addresses
+        - 'domains': {domain: number of emails}
+    """
+    by_address: Dict[str, List[dict]] = {}
+    for letter in letters:
+        by_address.setdefault(normalize_address(letter['to_email']), []).append(letter)
+
+    by_domain: Dict[str, List[dict]] = {}
+    for address, group in by_address.items():
+        group.sort(key=lambda letter: letter['user_id'])
+        if len(group) == 1 and 'html_body' in group[0]:
+            message = {field: group[0][field] for field in ('subject', 'html_body', 'text_body')}
+        elif len(group) == 1:
+            message = render_letter_email(group[0]['santa_name'], group[0]['friend_info'])
+        else:
+            message = render_combined_email(group)
+        message['key'] = group[0]['user_id']
+        message['user_ids'] = [letter['user_id'] for letter in group]
+        message['to_email'] = group[0]['to_email'].strip()
+        by_domain.setdefault(address.rpartition('@')[2], []).append(message)
+
+    domains = sorted(by_domain, key=lambda domain: (-len(by_domain[domain]), domain))
+    messages = [message for domain in domains for message in by_domain[domain]]
+    return {
+        'messages': messages,
+        'letters': len(letters),
+        'merged': len(letters) - len(messages),
+        'domains': {domain: len(by_domain[domain]) for domain in domains},
+    }
@@ -0,0 +1,227 @@
+"""
+Pre-rendered wishes letters.
+After each draw every santa's letter is rendered once (subject, HTML and
+text) and stored in the rendered_letters table (see
+utils/rendered_letters.sql) under the draw version. The friend page and
+the letter emails serve the stored letter instead of rebuilding it from
+live queries. Editing wishes (or the email or character of the santa or
+the friend) marks the letters that show them as stale, and stale letters
+are rendered again the next time they are read. A stored letter is only
+served while it matches the santa's current assignment, so a draw that
+has not been rendered yet never shows the friend of the previous one.
+"""
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from utils.assignment_store import iter_batches
+from utils.letter_data import LETTER_USER_COLUMNS, build_friend_info, fetch_letter_data
+from utils.letter_template import render_letter_email
+from utils.pagination import iter_rows
+
+RENDERED_TABLE = 'rendered_letters'
+
+# Rows per upsert request
+RENDER_BATCH_SIZE = 500
+
+LETTER_COLUMNS = (
+    'user_id, friend_id, draw_version, to_email, santa_name, friend_name, '
+    'subject, html_body, text_body, stale'
+)
+
+
+def _letter_row(letter: dict, draw_version: str, rendered_at: str) -> Dict[str, Any]:
+    """Render a fetch_letter_data row into a rendered_letters row."""
+    message = render_letter_email(letter['santa_name'], letter['friend_info'])
+    return {
+        'user_id': letter['user_id'],
+        'friend_id': letter['friend_id'],
+        'draw_version': draw_version,
+        'to_email': letter.get('to_email'),
+        'santa_name': letter['santa_name'],
+        'friend_name': letter['friend_info'].get('friend_character_name', ''),
+        'subject': message['subject'],
+        'html_body': message['html_body'],
+        'text_body': message['text_body'],
+        'stale': False,
+        'rendered_at': rendered_at,
+    }
+
+
+def _store(supabase, rows: List[dict]) -> None:
+    for batch in iter_batches(rows, RENDER_BATCH_SIZE):
+        supabase.table(RENDERED_TABLE).upsert(batch, on_conflict='user_id').execute()
+
+
+def render_all_letters(supabase, draw_version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Render and store the letter of every santa of the current draw.
+
+    Letters of santas that are no longer in the draw are removed.
+
+    Args:
+        supabase: Supabase client
+        draw_version: Draw the letters belong to (a new UUID by default)
+
+    Returns:
+        Dictionary with 'draw_version', 'rendered', 'removed', 'skipped',
+        'queries' and 'seconds'
+    """
+    start = time.perf_counter()
+    draw_version = draw_version or str(uuid.uuid4())
+    data = fetch_letter_data(supabase)
+    rendered_at = datetime.now(timezone.utc).isoformat()
+    rows = [_letter_row(letter, draw_version, rendered_at) for letter in data['letters']]
+    _store(supabase, rows)
+    removed = supabase.table(RENDERED_TABLE).delete().neq('draw_version', draw_version).execute()
+    return {
+        'draw_version': draw_version,
+        'rendered': len(rows),
+        'removed': len(removed.data or []),
+        'skipped': data['skipped'],
+        'queries': data['queries'],
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def render_changed_letters(supabase, plan: Dict[str, list],
+                           draw_version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Render and store only the letters an incremental draw changed.
+
+    Santas in plan['upserts'] get the letter of their new friend and the
+    letters of the users in plan['deletes'] are removed; every other stored
+    letter is kept as it is.
+
+    Args:
+        supabase: Supabase client
+        plan: Plan of utils/incremental_draw.plan_incremental_draw
+        draw_version: Draw the new letters belong to (a new UUID by default)
+
+    Returns:
+        Same dictionary as render_all_letters
+    """
+    start = time.perf_counter()
+    draw_version = draw_version or str(uuid.uuid4())
+    queries = 0
+    removed = 0
+    deletes = plan.get('deletes', [])
+    for batch in iter_batches(deletes, RENDER_BATCH_SIZE):
+        response = supabase.table(RENDERED_TABLE).delete().in_('user_id', batch).execute()
+        removed += len(response.data or [])
+        queries += 1
+
+    changed = [
+        {'user_id': row['user_id'], 'friend_id': row['id_secret_friend'], 'draw_version': draw_version}
+        for row in plan.get('upserts', [])
+    ]
+    rendered = 0
+    for batch in iter_batches(changed, RENDER_BATCH_SIZE):
+        rendered += len(_rerender(supabase, batch))
+        queries += 2
+    return {
+        'draw_version': draw_version,
+        'rendered': rendered,
+        'removed': removed,
+        'skipped': len(changed) - rendered,
+        'queries': queries,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def mark_letters_stale(supabase, friend_id: int) -> None:
+    """Flag the stored letters that show the wishes of `friend_id`."""
+    supabase.table(RENDERED_TABLE).update({'stale': True}).eq('friend_id', friend_id).execute()
+
+
+def _rerender(supabase, rows: List[dict]) -> List[dict]:
+    """Render stale letters again from the current santa and friend rows and store them."""
+    user_ids = list({row['friend_id'] for row in rows} | {row['user_id'] for row in rows})
+    response = supabase.table('users').select(LETTER_USER_COLUMNS).in_('id', user_ids).execute()
+    users = {user['id']: user for user in response.data or []}
+    rendered_at = datetime.now(timezone.utc).isoformat()
+    fresh = []
+    for row in rows:
+        santa = users.get(row['user_id'])
+        friend = users.get(row['friend_id'])
+        if santa is None or friend is None:
+            continue
+        letter = {
+            'user_id': row['user_id'],
+            'friend_id': row['friend_id'],
+            'to_email': santa.get('email'),
+            'santa_name': santa.get('character_name') or santa.get('nombre', ''),
+            'friend_info': build_friend_info(friend),
+        }
+        fresh.append(_letter_row(letter, row['draw_version'], rendered_at))
+    _store(supabase, fresh)
+    return fresh
+
+
+def get_letter(supabase, santa_id: int, friend_id: Optional[int] = None) -> Optional[dict]:
+    """
+    Stored letter of a santa, rendered again first if it is stale.
+
+    Args:
+        supabase: Supabase client
+        santa_id: Santa whose letter is read
+        friend_id: Current friend of the santa; a letter for another friend
+                   (from a previous draw) is not returned
+
+    Returns:
+        rendered_letters row, or None if no letter for the current
+        assignment has been rendered
+    """
+    response = supabase.table(RENDERED_TABLE).select(LETTER_COLUMNS).eq('user_id', santa_id).execute()
+    if not response.data:
+        return None
+    row = response.data[0]
+    if friend_id is not None and row['friend_id'] != friend_id:
+        return None
+    if row.get('stale'):
+        fresh = _rerender(supabase, [row])
+        return fresh[0] if fresh else None
+    return row
+
+
+def load_stored_letters(supabase) -> Dict[str, Any]:
+    """
+    Load every stored letter for mailing, refreshing the stale ones.
+
+    The letters are checked against secret_friends: stored letters whose
+    santa now has another friend (or none) are counted in 'outdated' and
+    left out, so the caller can build the letters from the assignments
+    instead.
+
+    Returns:
+        Same shape as utils/letter_data.fetch_letter_data, where each letter
+        also carries its 'subject', 'html_body' and 'text_body' (see
+        utils/recipient_plan.plan_recipients), plus 'refreshed' and 'outdated'
+    """
+    start = time.perf_counter()
+    stats = {'queries': 0}
+    assignments = {
+        row['user_id']: row['id_secret_friend']
+        for row in iter_rows(supabase, 'secret_friends', 'user_id, id_secret_friend', key='user_id', stats=stats)
+    }
+    stored = list(iter_rows(supabase, RENDERED_TABLE, LETTER_COLUMNS, key='user_id', stats=stats))
+    rows = [row for row in stored if assignments.get(row['user_id']) == row['friend_id']]
+    outdated = len(stored) - len(rows)
+    stale = [row for row in rows if row.get('stale')]
+    if stale:
+        fresh = {}
+        for batch in iter_batches(stale, RENDER_BATCH_SIZE):
+            fresh.update((row['user_id'], row) for row in _rerender(supabase, batch))
+            stats['queries'] += 2
+        rows = [fresh.get(row['user_id'], row) for row in rows]
+
+    letters = [row for row in rows if row.get('to_email')]
+    return {
+        'letters': letters,
+        'skipped': len(rows) - len(letters),
+        'refreshed': len(stale),
+        'outdated': outdated,
+        'queries': stats['queries'],
+        'seconds': time.perf_counter() - start,
+    }
@@ -0,0 +1,53 @@
+-- Pre-rendered wishes letters
+-- Every santa's letter (subject, HTML and text) is rendered once after the
+-- draw and stored under the draw version that produced it. The friend page
+-- and the letter emails read it from here. When the friend edits their
+-- wishes the letter is marked stale and rendered again on its next read.
+CREATE TABLE IF NOT EXISTS "secret-santa".rendered_letters (
+    user_id INT PRIMARY KEY,
+    friend_id INT NOT NULL,
+    draw_version VARCHAR(64) NOT NULL,
+    to_email VARCHAR(255),
+    santa_name VARCHAR(255) NOT NULL,
+    friend_name VARCHAR(255),
+    subject TEXT NOT NULL,
+    html_body TEXT NOT NULL,
+    text_body TEXT,
+    stale BOOLEAN NOT NULL DEFAULT FALSE,
+    rendered_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS rendered_letters_friend_idx
+    ON "secret-santa".rendered_letters (friend_id);
+
+ALTER TABLE "secret-santa".rendered_letters ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable all access for service role" ON "secret-santa".rendered_letters
+    FOR ALL USING (true);
+
+
+-- Letters also go stale when the santa or the friend changes outside the
+-- profile page (email, character or photo edited in the dashboard), so
+-- the next read renders them with the new values.
+CREATE OR REPLACE FUNCTION "secret-santa".mark_rendered_letters_stale()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE "secret-santa".rendered_letters
+    SET stale = TRUE
+    WHERE (user_id = NEW.id OR friend_id = NEW.id) AND NOT stale;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS users_mark_letters_stale ON "secret-santa".users;
+
+CREATE TRIGGER users_mark_letters_stale
+    AFTER UPDATE OF email, nombre, character_name, character_photo_url ON "secret-santa".users
+    FOR EACH ROW
+    WHEN (OLD.email IS DISTINCT FROM NEW.email
+          OR OLD.nombre IS DISTINCT FROM NEW.nombre
+          OR OLD.character_name IS DISTINCT FROM NEW.character_name
+          OR OLD.character_photo_url IS DISTINCT FROM NEW.character_photo_url)
+    EXECUTE FUNCTION "secret-santa".mark_rendered_letters_stale();
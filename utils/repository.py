@@ -0,0 +1,421 @@
+"""
+Data access for the pages.
+Every query the pages issue (login, registration, profile, password
+recovery, friend reveal, wishes lock, admin counters) goes through a repository, so the
+same page code can run on the Supabase project or on a local SQLite
+database with the schema of utils/supabase_setup.sql. The SQLite backend
+needs no network or credentials, which makes offline benchmarks and load
+tests possible (see utils/benchmark_repository.py).
+
+The backend is chosen with DATA_BACKEND ("supabase" or "sqlite") and, for
+SQLite, SQLITE_PATH (":memory:" by default).
+"""
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.assignment_store import save_assignments_atomic
+from utils.event_settings import SETTINGS_CACHE_TTL, is_wishes_locked, set_wishes_locked
+from utils.friend_lookup import FRIEND_COLUMNS, build_friend_card, lookup_friend
+from utils.pagination import iter_users
+from utils.rendered_letters import get_letter, mark_letters_stale
+from utils.stats_service import read_stats
+
+BACKEND_SUPABASE = "supabase"
+BACKEND_SQLITE = "sqlite"
+
+PROFILE_COLUMNS = (
+    'id, character_name, character_photo_url, deseo1, link_deseo1, deseo2, link_deseo2, '
+    'deseo3, link_deseo3, comentarios_generales'
+)
+
+# Columns a user may change from the profile page
+WISH_COLUMNS = (
+    'deseo1', 'link_deseo1', 'deseo2', 'link_deseo2', 'deseo3', 'link_deseo3', 'comentarios_generales',
+)
+
+
+class Repository(ABC):
+    """Queries issued by the pages. Rows are plain dictionaries."""
+
+    backend = None
+
+    @abstractmethod
+    def find_admin(self, username: str, password: str) -> Optional[dict]:
+        """Admin row matching the credentials."""
+
+    @abstractmethod
+    def find_user_login(self, character_name: str, password: str) -> Optional[dict]:
+        """User row matching the credentials (character name is case-insensitive)."""
+
+    @abstractmethod
+    def find_user_id(self, character_name: str, email: str) -> Optional[int]:
+        """Id of the user with this character (case-insensitive) and email."""
+
+    @abstractmethod
+    def set_password(self, user_id: int, password: str) -> None:
+        ...
+
+    @abstractmethod
+    def find_character_by_email(self, email: str) -> Optional[dict]:
+        """character_name and character_photo_url of the user with this email."""
+
+    @abstractmethod
+    def character_names(self) -> List[str]:
+        """Characters already taken."""
+
+    @abstractmethod
+    def insert_user(self, user: Dict[str, Any]) -> Optional[dict]:
+        """Register a user and return the stored row."""
+
+    @abstractmethod
+    def get_profile(self, character_name: str) -> Optional[dict]:
+        """PROFILE_COLUMNS of a user."""
+
+    @abstractmethod
+    def update_wishes(self, character_name: str, wishes: Dict[str, Any]) -> Optional[dict]:
+        """Change the given WISH_COLUMNS of a user and return the updated row."""
+
+    @abstractmethod
+    def is_wishes_locked(self, max_age: float = SETTINGS_CACHE_TTL) -> bool:
+        """Whether wishes editing is locked; max_age=0 skips the shared cache."""
+
+    @abstractmethod
+    def set_wishes_locked(self, lock: bool) -> None:
+        ...
+
+    @abstractmethod
+    def friend_card(self, character_name: str) -> Optional[dict]:
+        """Friend card of a santa (see utils/friend_lookup.build_friend_card)."""
+
+    @abstractmethod
+    def stored_letter(self, santa_id: int, friend_id: Optional[int] = None) -> Optional[dict]:
+        """
+        Letter rendered after the draw (utils/rendered_letters.py), if any
+        and, when `friend_id` is given, only if it is still for that friend.
+        """
+
+    @abstractmethod
+    def count_users(self) -> int:
+        ...
+
+    @abstractmethod
+    def count_assignments(self) -> int:
+        ...
+
+    @abstractmethod
+    def event_stats(self) -> Dict[str, Any]:
+        """
+        Admin counters: 'total_users', 'total_assignments' and
+        'wishes_locked' (cached by utils/stats_service.get_stats).
+        """
+
+    @abstractmethod
+    def replace_assignments(self, assignments: List[dict]) -> None:
+        """Store a whole draw: rows {"user_id", "id_secret_friend"}."""
+
+
+class SupabaseRepository(Repository):
+    """Repository on the Supabase client (the production backend)."""
+
+    backend = BACKEND_SUPABASE
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def _first(self, response) -> Optional[dict]:
+        return response.data[0] if response.data else None
+
+    def find_admin(self, username, password):
+        return self._first(self.supabase.table('admin').select('*').eq('username', username)
+                           .eq('password', password).execute())
+
+    def find_user_login(self, character_name, password):
+        return self._first(self.supabase.table('users').select('*').ilike('character_name', character_name)
+                           .eq('password', password).execute())
+
+    def find_user_id(self, character_name, email):
+        user = self._first(self.supabase.table('users').select('id').ilike('character_name', character_name)
+                           .eq('email', email).execute())
+        return user['id'] if user else None
+
+    def set_password(self, user_id, password):
+        self.supabase.table('users').update({'password': password}).eq('id', user_id).execute()
+
+    def find_character_by_email(self, email):
+        return self._first(self.supabase.table('users').select('character_name, character_photo_url')
+                           .eq('email', email).execute())
+
+    def character_names(self):
+        return [user['character_name'] for user in iter_users(self.supabase, 'character_name')]
+
+    def insert_user(self, user):
+        return self._first(self.supabase.table('users').insert(user).execute())
+
+    def get_profile(self, character_name):
+        return self._first(self.supabase.table('users').select(PROFILE_COLUMNS)
+                           .eq('character_name', character_name).execute())
+
+    def update_wishes(self, character_name, wishes):
+        values = {column: wishes[column] for column in WISH_COLUMNS if column in wishes}
+        if not values:
+            # Nothing this page may change
+            return self.get_profile(character_name)
+        user = self._first(self.supabase.table('users').update(values)
+                           .eq('character_name', character_name).execute())
+        if user:
+            try:
+                # The letter of this user's santa shows the old wishes
+                mark_letters_stale(self.supabase, user['id'])
+            except Exception:
+                # rendered_letters not migrated yet (utils/rendered_letters.sql)
+                pass
+        return user
+
+    def is_wishes_locked(self, max_age=SETTINGS_CACHE_TTL):
+        return is_wishes_locked(self.supabase, max_age)
+
+    def set_wishes_locked(self, lock):
+        set_wishes_locked(self.supabase, lock)
+
+    def friend_card(self, character_name):
+        return lookup_friend(self.supabase, character_name)
+
+    def stored_letter(self, santa_id, friend_id=None):
+        try:
+            return get_letter(self.supabase, santa_id, friend_id)
+        except Exception:
+            # rendered_letters not migrated yet (utils/rendered_letters.sql)
+            return None
+
+    def count_users(self):
+        return self.supabase.table('users').select('id', count='exact', head=True).execute().count or 0
+
+    def count_assignments(self):
+        return self.supabase.table('secret_friends').select('user_id', count='exact', head=True).execute().count or 0
+
+    def event_stats(self):
+        return read_stats(self.supabase)
+
+    def replace_assignments(self, assignments):
+        save_assignments_atomic(self.supabase, assignments)
+
+
+# utils/supabase_setup.sql (plus the comentarios_generales column and the
+# event_settings table) in SQLite syntax
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre VARCHAR(100) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    deseo1 TEXT NOT NULL,
+    link_deseo1 TEXT,
+    imagen_deseo1 TEXT,
+    deseo2 TEXT NOT NULL,
+    link_deseo2 TEXT,
+    imagen_deseo2 TEXT,
+    deseo3 TEXT,
+    link_deseo3 TEXT,
+    imagen_deseo3 TEXT,
+    comentarios_generales TEXT,
+    character_name VARCHAR(100) NOT NULL UNIQUE,
+    character_photo_url TEXT,
+    password VARCHAR(255) NOT NULL,
+    wishes_locked BOOLEAN DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS secret_friends (
+    user_id INT NOT NULL UNIQUE,
+    id_secret_friend INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (id_secret_friend) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS admin (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(100) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS event_settings (
+    key VARCHAR(100) PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_users_character_name ON users(character_name);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_secret_friends_user_id ON secret_friends(user_id);
+CREATE INDEX IF NOT EXISTS idx_secret_friends_friend_id ON secret_friends(id_secret_friend);
+"""
+
+_FRIEND_CARD_SQL = (
+    "SELECT santa.id AS santa_id, friend.id AS friend_id, "
+    + ", ".join(f"friend.{column.strip()}" for column in FRIEND_COLUMNS.split(','))
+    + " FROM users santa"
+    " JOIN secret_friends sf ON sf.user_id = santa.id"
+    " JOIN users friend ON friend.id = sf.id_secret_friend"
+    " WHERE santa.character_name = ? LIMIT 1"
+)
+
+
+class SQLiteRepository(Repository):
+    """
+    Repository on a local SQLite database (a file or ":memory:").
+
+    One connection is shared by all threads behind a lock, like a small
+    connection-limited database server.
+    """
+
+    backend = BACKEND_SQLITE
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self._lock:
+            self.connection.execute("PRAGMA foreign_keys = ON")
+            self.connection.executescript(SQLITE_SCHEMA)
+
+    def _one(self, sql: str, params: Iterable[Any] = ()) -> Optional[dict]:
+        with self._lock:
+            row = self.connection.execute(sql, tuple(params)).fetchone()
+        return dict(row) if row is not None else None
+
+    def _write(self, sql: str, params: Iterable[Any] = ()) -> sqlite3.Cursor:
+        with self._lock, self.connection:
+            return self.connection.execute(sql, tuple(params))
+
+    def find_admin(self, username, password):
+        return self._one("SELECT * FROM admin WHERE username = ? AND password = ?", (username, password))
+
+    def find_user_login(self, character_name, password):
+        return self._one("SELECT * FROM users WHERE character_name = ? COLLATE NOCASE AND password = ?",
+                         (character_name, password))
+
+    def find_user_id(self, character_name, email):
+        user = self._one("SELECT id FROM users WHERE character_name = ? COLLATE NOCASE AND email = ?",
+                         (character_name, email))
+        return user['id'] if user else None
+
+    def set_password(self, user_id, password):
+        self._write("UPDATE users SET password = ? WHERE id = ?", (password, user_id))
+
+    def find_character_by_email(self, email):
+        return self._one("SELECT character_name, character_photo_url FROM users WHERE email = ? LIMIT 1", (email,))
+
+    def character_names(self):
+        with self._lock:
+            rows = self.connection.execute("SELECT character_name FROM users ORDER BY id").fetchall()
+        return [row[0] for row in rows]
+
+    def insert_user(self, user):
+        columns = list(user)
+        cursor = self._write(
+            f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [user[column] for column in columns],
+        )
+        return self._one("SELECT * FROM users WHERE id = ?", (cursor.lastrowid,))
+
+    def get_profile(self, character_name):
+        return self._one(f"SELECT {PROFILE_COLUMNS} FROM users WHERE character_name = ?", (character_name,))
+
+    def update_wishes(self, character_name, wishes):
+        columns = [column for column in WISH_COLUMNS if column in wishes]
+        if not columns:
+            # Nothing this page may change
+            return self.get_profile(character_name)
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        cursor = self._write(f"UPDATE users SET {assignments} WHERE character_name = ?",
+                             [wishes[column] for column in columns] + [character_name])
+        if not cursor.rowcount:
+            return None
+        return self.get_profile(character_name)
+
+    def is_wishes_locked(self, max_age=SETTINGS_CACHE_TTL):
+        # Read from the database every time, there is no cache to skip
+        row = self._one("SELECT value FROM event_settings WHERE key = 'wishes_locked'")
+        return row is not None and row['value'] == 'true'
+
+    def set_wishes_locked(self, lock):
+        self._write(
+            "INSERT INTO event_settings (key, value) VALUES ('wishes_locked', ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = CURRENT_TIMESTAMP",
+            ('true' if lock else 'false',),
+        )
+
+    def friend_card(self, character_name):
+        row = self._one(_FRIEND_CARD_SQL, (character_name,))
+        return build_friend_card(row['santa_id'], row['friend_id'], row) if row else None
+
+    def stored_letter(self, santa_id, friend_id=None):
+        # Letters are not stored locally, the friend page renders them
+        return None
+
+    def count_users(self):
+        return self._one("SELECT COUNT(*) AS total FROM users")['total']
+
+    def count_assignments(self):
+        return self._one("SELECT COUNT(*) AS total FROM secret_friends")['total']
+
+    def event_stats(self):
+        return {
+            'total_users': self.count_users(),
+            'total_assignments': self.count_assignments(),
+            'wishes_locked': self.is_wishes_locked(),
+        }
+
+    def replace_assignments(self, assignments):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM secret_friends")
+            self.connection.executemany(
+                "INSERT INTO secret_friends (user_id, id_secret_friend) VALUES (?, ?)",
+                [(a['user_id'], a['id_secret_friend']) for a in assignments],
+            )
+
+    def insert_users(self, users: List[Dict[str, Any]]) -> None:
+        """Bulk-load users (benchmarks and tests)."""
+        if not users:
+            return
+        columns = list(users[0])
+        with self._lock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO users ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [[user[column] for column in columns] for user in users],
+            )
+
+
+_repository: Optional[Repository] = None
+_repository_lock = threading.Lock()
+
+
+def create_repository(backend: Optional[str] = None, sqlite_path: Optional[str] = None) -> Repository:
+    """
+    New repository for `backend` (defaults to DATA_BACKEND, then "supabase").
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    backend = (backend or os.getenv('DATA_BACKEND') or BACKEND_SUPABASE).lower()
+    if backend == BACKEND_SUPABASE:
+        from utils.supabase_client import get_supabase_client
+        return SupabaseRepository(get_supabase_client())
+    if backend == BACKEND_SQLITE:
+        return SQLiteRepository(sqlite_path or os.getenv('SQLITE_PATH') or ":memory:")
+    raise ValueError(f"Unknown data backend: {backend}")
+
+
+def get_repository() -> Repository:
+    """Repository shared by the pages (see create_repository)."""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = create_repository()
+    return _repository
@@ -0,0 +1,46 @@
+-- Staging area and atomic swap for Secret Santa draws
+-- The app writes a new draw in batches into secret_friends_staging under a
+-- draw_id, then calls swap_secret_friends(draw_id), which replaces the
+-- contents of secret_friends in a single transaction. A failure while
+-- staging leaves the current draw untouched.
+
+CREATE TABLE IF NOT EXISTS "secret-santa".secret_friends_staging (
+    draw_id UUID NOT NULL,
+    user_id INT NOT NULL,
+    id_secret_friend INT NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (draw_id, user_id)
+);
+
+ALTER TABLE "secret-santa".secret_friends_staging ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Enable all access for service role" ON "secret-santa".secret_friends_staging
+    FOR ALL USING (true);
+
+CREATE OR REPLACE FUNCTION "secret-santa".swap_secret_friends(p_draw_id UUID, p_expected_rows INT DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    staged_rows INT;
+BEGIN
+    SELECT count(*) INTO staged_rows
+    FROM "secret-santa".secret_friends_staging
+    WHERE draw_id = p_draw_id;
+
+    IF p_expected_rows IS NOT NULL AND staged_rows <> p_expected_rows THEN
+        RAISE EXCEPTION 'Draw % has % staged rows, expected %', p_draw_id, staged_rows, p_expected_rows;
+    END IF;
+
+    DELETE FROM "secret-santa".secret_friends WHERE user_id IS NOT NULL;
+
+    INSERT INTO "secret-santa".secret_friends (user_id, id_secret_friend)
+    SELECT user_id, id_secret_friend
+    FROM "secret-santa".secret_friends_staging
+    WHERE draw_id = p_draw_id;
+
+    DELETE FROM "secret-santa".secret_friends_staging WHERE draw_id = p_draw_id;
+
+    RETURN staged_rows;
+END;
+$$;
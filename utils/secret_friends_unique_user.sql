@@ -0,0 +1,11 @@
+-- One assignment row per user in secret_friends
+-- Needed by the incremental draw, which upserts only the changed rows.
+
+-- Remove duplicated rows (keep the newest one per user)
+DELETE FROM "secret-santa".secret_friends a
+USING "secret-santa".secret_friends b
+WHERE a.user_id = b.user_id
+  AND a.ctid < b.ctid;
+
+ALTER TABLE "secret-santa".secret_friends
+ADD CONSTRAINT secret_friends_user_id_key UNIQUE (user_id);
@@ -0,0 +1,250 @@
+"""
+Seeded, stateless Secret Santa draw.
+A draw is stored as a per-year seed plus the ordered list of participants.
+A keyed Feistel permutation of the participant list defines a gift ring,
+so anyone's secret friend is computed in O(1) without reading
+secret_friends, and the draw can be reproduced and audited from the seed.
+With exclusion rules the ring is solved first (a single cycle that respects
+them) and the participant list is stored in the order the seed maps onto
+that ring. The friend page does not read the seed: the secret_friend_cards
+view (utils/friend_lookup.sql) returns the friend in one request, which the
+seed cannot beat since the santa and friend rows are needed anyway.
+"""
+import hashlib
+import secrets
+import time
+from typing import Dict, List, Optional, Sequence
+
+from utils.derangement import MODE_CYCLE
+from utils.matching import solve_assignment
+
+MODE_SEEDED = "seeded"
+SEEDS_TABLE = 'draw_seeds'
+FEISTEL_ROUNDS = 4
+# Seconds a loaded draw is reused before checking the seed again
+SEED_CACHE_TTL = 60
+
+_seed_cache: Dict[int, tuple] = {}
+
+
+class FeistelPermutation:
+    """
+    Keyed pseudo-random permutation of range(n).
+
+    A balanced Feistel network over the smallest even number of bits that
+    covers n, with keyed BLAKE2b as round function. Values that land outside
+    range(n) are fed through again (cycle walking); since the network domain
+    is less than 4n, that takes fewer than 4 rounds on average.
+    """
+
+    def __init__(self, n: int, key: bytes, rounds: int = FEISTEL_ROUNDS):
+        if n < 1:
+            raise ValueError("n must be at least 1")
+        self.n = n
+        self.rounds = rounds
+        half_bits = max(1, ((n - 1).bit_length() + 1) // 2)
+        self._half_bits = half_bits
+        self._half_mask = (1 << half_bits) - 1
+        self._round_keys = [
+            hashlib.blake2b(f"round-{r}".encode(), key=key[:64], digest_size=32).digest()
+            for r in range(rounds)
+        ]
+
+    def _f(self, r: int, value: int) -> int:
+        digest = hashlib.blake2b(value.to_bytes(8, 'big'), key=self._round_keys[r], digest_size=8).digest()
+        return int.from_bytes(digest, 'big') & self._half_mask
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self._half_bits, x & self._half_mask
+        for r in range(self.rounds):
+            left, right = right, left ^ self._f(r, right)
+        return (left << self._half_bits) | right
+
+    def _decrypt(self, y: int) -> int:
+        left, right = y >> self._half_bits, y & self._half_mask
+        for r in reversed(range(self.rounds)):
+            left, right = right ^ self._f(r, left), left
+        return (left << self._half_bits) | right
+
+    def forward(self, x: int) -> int:
+        """Image of x in range(n)."""
+        y = self._encrypt(x)
+        while y >= self.n:
+            y = self._encrypt(y)
+        return y
+
+    def inverse(self, y: int) -> int:
+        """Preimage of y in range(n)."""
+        x = self._decrypt(y)
+        while x >= self.n:
+            x = self._decrypt(x)
+        return x
+
+
+class SeededDraw:
+    """
+    Secret Santa draw defined by a seed and an ordered participant list.
+
+    The permutation orders the participants in a ring and everyone gives a
+    gift to the next person in it. A single ring through everyone can never
+    map a person to themselves, so the draw is always a derangement.
+    """
+
+    def __init__(self, seed: str, participants: Sequence[int]):
+        if len(participants) < 2:
+            raise ValueError("A draw needs at least 2 participants")
+        self.seed = seed
+        self.participants = list(participants)
+        self._index = {user_id: i for i, user_id in enumerate(self.participants)}
+        if len(self._index) != len(self.participants):
+            raise ValueError("Participants must not contain duplicates")
+        self._perm = FeistelPermutation(len(self.participants), seed.encode())
+
+    @classmethod
+    def from_ring(cls, seed: str, ring: Sequence[int]) -> "SeededDraw":
+        """
+        Seeded draw whose gift ring is `ring`.
+
+        The participant list is ordered so that the permutation of `seed`
+        walks it in ring order, which makes ring() return `ring` back.
+        """
+        perm = FeistelPermutation(len(ring), seed.encode())
+        return cls(seed, [ring[perm.inverse(i)] for i in range(len(ring))])
+
+    def __len__(self) -> int:
+        return len(self.participants)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._index
+
+    def friend_of(self, user_id: int) -> Optional[int]:
+        """Secret friend of `user_id`, or None if they are not in the draw."""
+        i = self._index.get(user_id)
+        if i is None:
+            return None
+        n = len(self.participants)
+        position = self._perm.inverse(i)
+        return self.participants[self._perm.forward((position + 1) % n)]
+
+    def positions(self) -> List[int]:
+        """Index in the participant list of each ring position (the permutation images)."""
+        return [self._perm.forward(k) for k in range(len(self.participants))]
+
+    def ring(self) -> List[int]:
+        """Participants in gift order."""
+        return [self.participants[i] for i in self.positions()]
+
+    def assignments(self) -> List[dict]:
+        """Rows {"user_id", "id_secret_friend"} for the whole draw."""
+        ring = self.ring()
+        n = len(ring)
+        return [{"user_id": ring[k], "id_secret_friend": ring[(k + 1) % n]} for k in range(n)]
+
+
+def verify_seeded_draw(draw: SeededDraw, rules=None) -> Dict[str, object]:
+    """
+    Check that a seeded draw is a valid assignment.
+
+    Recomputes the whole permutation and checks that it is a bijection of
+    the participant list without fixed points and, if `rules` are given,
+    without forbidden pairs. The per-user lookup is cross-checked against
+    the full ring as well.
+
+    Returns:
+        Dictionary with 'ok', 'participants', 'duplicates', 'fixed_points',
+        'forbidden_pairs' and 'lookup_mismatches'
+    """
+    n = len(draw.participants)
+    images = draw.positions()
+    duplicates = n - len(set(images))
+    out_of_range = sum(1 for y in images if not 0 <= y < n)
+    fixed_points = 0
+    forbidden = 0
+    mismatches = 0
+    for row in draw.assignments():
+        giver, receiver = row["user_id"], row["id_secret_friend"]
+        if giver == receiver:
+            fixed_points += 1
+        if rules is not None and not rules.is_allowed(giver, receiver):
+            forbidden += 1
+        if draw.friend_of(giver) != receiver:
+            mismatches += 1
+    return {
+        'ok': duplicates == 0 and out_of_range == 0 and fixed_points == 0
+              and forbidden == 0 and mismatches == 0,
+        'participants': n,
+        'duplicates': duplicates + out_of_range,
+        'fixed_points': fixed_points,
+        'forbidden_pairs': forbidden,
+        'lookup_mismatches': mismatches,
+    }
+
+
+def new_seeded_draw(user_ids: Sequence[int], rules=None) -> SeededDraw:
+    """
+    Create a seeded draw for `user_ids` with a fresh seed.
+
+    Without exclusion rules the seed alone defines the ring. With rules, a
+    single gift ring that respects them is solved first (see
+    utils/matching.solve_assignment, cycle mode) and stored through the
+    participant order, so the draw never depends on a lucky seed.
+
+    Raises:
+        NoValidAssignmentError: if no single ring respects the rules
+    """
+    participants = sorted(user_ids)
+    seed = secrets.token_hex(16)
+    if rules is None or not len(rules):
+        return SeededDraw(seed, participants)
+    friend_of = solve_assignment(participants, rules, mode=MODE_CYCLE)
+    ring = [participants[0]]
+    while len(ring) < len(participants):
+        ring.append(friend_of[ring[-1]])
+    return SeededDraw.from_ring(seed, ring)
+
+
+def save_seeded_draw(supabase, year: int, draw: SeededDraw) -> None:
+    """Store the seed and participant list of `year`."""
+    supabase.table(SEEDS_TABLE).upsert({
+        'year': year,
+        'seed': draw.seed,
+        'participants': draw.participants,
+    }, on_conflict='year').execute()
+    _seed_cache.pop(year, None)
+
+
+def clear_seeded_draw(supabase, year: int) -> None:
+    """Forget the seed of `year` (the draw is no longer seed-based)."""
+    supabase.table(SEEDS_TABLE).delete().eq('year', year).execute()
+    _seed_cache.pop(year, None)
+
+
+def load_seeded_draw(supabase, year: int) -> Optional[SeededDraw]:
+    """
+    Load the seeded draw of `year`, or None if the draw is not seed-based.
+
+    The draw is kept in memory for SEED_CACHE_TTL seconds; after that only
+    the seed is re-read, and the participant list is reloaded only if the
+    seed changed.
+    """
+    now = time.monotonic()
+    cached = _seed_cache.get(year)
+    if cached and now - cached[0] < SEED_CACHE_TTL:
+        return cached[1]
+
+    response = supabase.table(SEEDS_TABLE).select('seed').eq('year', year).execute()
+    if not response.data:
+        _seed_cache[year] = (now, None)
+        return None
+    seed = response.data[0]['seed']
+    if cached and cached[1] is not None and cached[1].seed == seed:
+        draw = cached[1]
+    else:
+        response = supabase.table(SEEDS_TABLE).select('seed, participants').eq('year', year).execute()
+        if not response.data:
+            _seed_cache[year] = (now, None)
+            return None
+        row = response.data[0]
+        draw = SeededDraw(row['seed'], row['participants'])
+    _seed_cache[year] = (now, draw)
+    return draw
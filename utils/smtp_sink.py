@@ -0,0 +1,167 @@
+"""
+In-process SMTP sink for benchmarks.
+A small threaded SMTP server that accepts (and discards) every message,
+with optional injected latency, transient failures and dropped
+connections, so the mail pipeline can be measured without a provider.
+Supports EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP and QUIT,
+with SMTPUTF8 addresses (no STARTTLS: connect with SMTP_USE_TLS=false).
+"""
+import random
+import socketserver
+import threading
+import time
+from typing import Dict, Optional
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """One SMTP conversation."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def readline(self) -> Optional[str]:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        return line.decode("utf-8", "replace").rstrip("\r\n")
+
+    def handle(self) -> None:
+        sink = self.server.sink
+        sink._count('connections')
+        self.reply("220 secret-santa-sink ESMTP")
+        while True:
+            line = self.readline()
+            if line is None:
+                return
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                self.wfile.write(b"250-secret-santa-sink\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n")
+            elif command == "AUTH":
+                if line.upper().startswith("AUTH LOGIN"):
+                    # Username and password prompts (base64 "Username:" / "Password:")
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.readline()
+                self.reply("235 2.7.0 Authentication successful")
+            elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                while True:
+                    data = self.rfile.readline()
+                    if not data:
+                        return
+                    if data in (b".\r\n", b".\n"):
+                        break
+                    size += len(data)
+                outcome = sink._outcome()
+                if outcome == "drop":
+                    sink._count('dropped')
+                    return
+                if outcome == "fail":
+                    sink._count('failed')
+                    self.reply("451 4.3.0 Temporary failure (injected)")
+                    continue
+                sink._count('messages')
+                sink._count('bytes', size)
+                self.reply("250 OK queued")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """
+    Local SMTP server running in a background thread.
+
+    Usage::
+
+        with SMTPSink(latency=0.05, failure_rate=0.01) as sink:
+            config = sink.smtp_config()
+            ...
+            print(sink.stats())
+
+    :param latency: Seconds to wait before answering each DATA
+    :param jitter: Extra random latency, uniform in [0, jitter]
+    :param failure_rate: Share of messages answered with a 451 temporary error
+    :param drop_rate: Share of messages whose connection is closed without reply
+    :param seed: Seed of the injected failures
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0,
+                 drop_rate: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.drop_rate = drop_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {}
+        self._server = _Server((host, port), _SMTPHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "SMTPSink":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + amount
+
+    def _outcome(self) -> str:
+        with self._lock:
+            roll = self._rng.random()
+            delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if roll < self.drop_rate:
+            return "drop"
+        if roll < self.drop_rate + self.failure_rate:
+            return "fail"
+        return "ok"
+
+    def stats(self) -> Dict[str, int]:
+        """Counters: 'connections', 'messages', 'failed', 'dropped', 'bytes'."""
+        with self._lock:
+            stats = {'connections': 0, 'messages': 0, 'failed': 0, 'dropped': 0, 'bytes': 0}
+            stats.update(self._stats)
+            return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {}
+
+    def smtp_config(self, max_messages_per_connection: int = 100) -> dict:
+        """SMTP configuration (as read by utils.email_sender) pointing at this sink."""
+        return {
+            "host": self.host,
+            "port": self.port,
+            "user": "benchmark",
+            "password": "benchmark",
+            "from_email": "santa@secret-santa.local",
+            "use_tls": False,
+            "max_messages_per_connection": max_messages_per_connection,
+        }
@@ -0,0 +1,83 @@
+"""
+Admin dashboard statistics.
+The counters come from the event_stats function (see
+utils/event_stats.sql) in one request, or from head-only count requests
+until it is created, so no user rows are downloaded just to count them.
+Results are shared by every session for STATS_CACHE_TTL seconds, so
+several admins refreshing the dashboard do not rescan the tables. The
+dashboard reads them through its repository (Repository.event_stats in
+utils/repository.py), so it also runs on the SQLite backend.
+"""
+import time
+from typing import Any, Dict, Optional
+
+from utils.event_settings import is_missing_table, is_wishes_locked
+
+STATS_FUNCTION = 'event_stats'
+# PostgREST and Postgres codes of a function that does not exist
+MISSING_FUNCTION_CODES = {'PGRST202', '42883'}
+# Seconds the dashboard counters are reused before asking again
+STATS_CACHE_TTL = 5
+
+# (loaded_at, stats)
+_stats_cache: Optional[tuple] = None
+
+
+def invalidate_stats() -> None:
+    """Forget the cached counters (after a draw or a lock change)."""
+    global _stats_cache
+    _stats_cache = None
+
+
+def _count(supabase, table: str, column: str) -> int:
+    """Exact row count without downloading any row."""
+    response = supabase.table(table).select(column, count='exact', head=True).execute()
+    return response.count or 0
+
+
+def _is_missing_function(error: Exception) -> bool:
+    # event_stats itself, or a table it reads, does not exist yet
+    return getattr(error, 'code', None) in MISSING_FUNCTION_CODES or is_missing_table(error)
+
+
+def read_stats(supabase) -> Dict[str, Any]:
+    """Read the counters from Supabase, without the cache."""
+    try:
+        response = supabase.rpc(STATS_FUNCTION).execute()
+        row = response.data[0] if isinstance(response.data, list) else response.data
+        return {
+            'total_users': row['total_users'],
+            'total_assignments': row['total_assignments'],
+            'wishes_locked': bool(row['wishes_locked']),
+        }
+    except Exception as e:
+        if not _is_missing_function(e):
+            raise
+        # event_stats not created yet (utils/event_stats.sql)
+
+    return {
+        'total_users': _count(supabase, 'users', 'id'),
+        'total_assignments': _count(supabase, 'secret_friends', 'user_id'),
+        'wishes_locked': is_wishes_locked(supabase),
+    }
+
+
+def get_stats(repo, max_age: float = STATS_CACHE_TTL) -> Dict[str, Any]:
+    """
+    Users, assignments and wishes lock for the admin dashboard.
+
+    Args:
+        repo: Repository of the pages (utils/repository.py)
+        max_age: Seconds a cached result may be reused (0 to always ask)
+
+    Returns:
+        Dictionary with 'total_users', 'total_assignments', 'wishes_locked'
+        and 'age' (seconds since the counters were read)
+    """
+    global _stats_cache
+    now = time.monotonic()
+    cached = _stats_cache
+    if cached is None or now - cached[0] >= max_age:
+        cached = (now, repo.event_stats())
+        _stats_cache = cached
+    return dict(cached[1], age=now - cached[0])